@@ -8,12 +8,22 @@ from flask_login import LoginManager
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS, cross_origin
 from config import config
+from .cache import GraphCache
+from .credentials import CredentialCache
+from .identity import IdentityCache
+from .jobs import JobQueue
+from .uploads import UploadStore
 
 
 moment = Moment()
 db = SQLAlchemy()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
+job_queue = JobQueue()
+upload_store = UploadStore()
+graph_cache = GraphCache()
+credential_cache = CredentialCache()
+identity_cache = IdentityCache()
 
 # application factory
 def create_app(config_name):
@@ -39,6 +49,11 @@ def create_app(config_name):
     # db.create_all()
     db.init_app(app)
     login_manager.init_app(app)
+    job_queue.init_app(app)
+    upload_store.init_app(app)
+    graph_cache.init_app(app)
+    credential_cache.init_app(app)
+    identity_cache.init_app(app)
 
     # attach routes and custom error pages here
     from .api import api as api_blueprint
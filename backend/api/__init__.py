@@ -3,4 +3,4 @@ from flask import Blueprint
 api = Blueprint('api', __name__)
 
 from . import authentication
-from . import activity, workout
\ No newline at end of file
+from . import activity, workout, jobs, caching, uploads
\ No newline at end of file
@@ -1,56 +1,66 @@
 '''
-Contains functions for filtering and aggregating data, as well as retrieving
-activity data from the database for graphs
+Contains the activity graph endpoints, the metrics module does the filtering
+and aggregating of the activity data
 '''
 
 from . import api
+from . import metrics
 from . import users
-from ..models import ActivityData, User, db
-import pandas as pd
-from flask import request
-from sqlalchemy.sql import select
+from .aggregate import current_period
+from .authentication import auth
+from .caching import batch_json, batch_request, graph_request, \
+    graph_response, graph_user_id
+from .metrics import ACTIVITY
+from ..models import ActivityData
+from flask import current_app
 
 
-@api.route('/activity_current', methods=['POST'])
+@api.route('/activity_current', methods=['GET', 'POST'])
+@auth.login_required
 def pull_activity_current():
     '''
     Formats data for graphing most recent data (current day/week/month/year)
     (Requirement 3.4.1)
 
+    Graphs the authenticated user's data
+
     Parameters
     ----------
-        user_id: int
-            user id to graph
         agg: string
             aggregate level for data - date, week_start, month, and year are options
         kind: string
             type of exercise (move, exercise, stand)
     '''
-    data = request.get_json()
-    user_id = data['user_id']
+    data = graph_request()
+    user_id = graph_user_id()
     recent = 1
     agg = data['agg']
     kind = data['kind']
 
-    # original defaults
-    s = select([ActivityData]).where(ActivityData.user_id==user_id)
-
-    df = pd.read_sql(s, con=db.engine, parse_dates=['date'])
-    graph = activity_summary(df, recent, agg, kind)
-    graph = graph[graph['date'] == graph['date'].max()]
-    # convert to json
-    return graph.to_json(date_format='iso', index=False, orient='table')
-
-@api.route('/activity_trend', methods=['POST'])
+    def render():
+        if current_app.config.get('GRAPH_ROLLUPS', True):
+            # the newest rollup is the current period
+            period = None
+        else:
+            # only read the rows of the latest day/week/month/year
+            period = current_period(ActivityData, user_id, agg)
+        graph = activity_graph(user_id, recent, agg, kind, period)
+        # convert to json
+        return graph.to_json(date_format='iso', index=False, orient='table')
+
+    return graph_response('activity_current', user_id, (agg, kind), render)
+
+@api.route('/activity_trend', methods=['GET', 'POST'])
+@auth.login_required
 def pull_activity_trend():
     '''
     Formats data for graphing trend data.
     (Requirement 3.4.2)
 
+    Graphs the authenticated user's data
+
     Parameters
     ----------
-        user_id: int
-            user id to graph
         recent: int
             number of data points to go back for graphs
         agg: string
@@ -58,154 +68,68 @@ def pull_activity_trend():
         kind: string
             type of exercise (move, exercise, stand)
     '''
-    data = request.get_json()
-    user_id = data['user_id']
+    data = graph_request()
+    user_id = graph_user_id()
     recent = data['recent']
     agg = data['agg']
     kind = data['kind']
 
-    # original defaults
-    s = select([ActivityData]).where(ActivityData.user_id==user_id)
+    def render():
+        graph = activity_graph(user_id, recent, agg, kind)
+        # convert to json
+        return graph.to_json(date_format='iso', index=False, orient='table')
 
-    df = pd.read_sql(s, con=db.engine, parse_dates=['date'])
-    graph = activity_summary(df, recent, agg, kind)
-    # convert to json
-    return graph.to_json(date_format='iso', index=False, orient='table')
+    return graph_response('activity_trend', user_id, (agg, kind, recent),
+                          render)
 
-
-def activity_summary(df, recent, agg, kind):
+@api.route('/activity_batch', methods=['GET', 'POST'])
+@auth.login_required
+def pull_activity_batch():
     '''
-    This function performs the data wrangling to return activity data for graphs
-    (Requirement 3.2.2)
+    Several activity graphs in one response, e.g. a whole dashboard.  Each
+    aggregation level is read once and shared by all kinds asking for it.
+
+    Graphs the authenticated user's data
 
     Parameters
     ----------
-    df : dataframe
-        Source data to summarize
-    recent : int
-        how many data points to go back for goal data
-    agg : string
-        Aggregation level.  Values can be date, week_start, month, and year
-    kind : string
-        Exercise type.  Values can be move, exercise, or stand
+        graphs: list
+            [agg, kind, recent] of each graph, as for activity_trend (a
+            recent of 1 is the current period)
     '''
-    # pull totals
-    if agg == 'week_start':
-        activity = agg_week(df)
-    elif agg == 'month':
-        activity = agg_month(df)
-    elif agg == 'year':
-        activity = agg_year(df)
-    elif agg == 'date':
-        activity = agg_day(df)
-    else:
-        print('Invalid aggregate.  Defaulting to day view.')
-        activity = agg_day(df)
-
-    # check df length
-    recent = check_data_limit(df, recent)
-    # var_recent = check_data_limit(df, var_recent)
-
-    # plot (for testing purposes)
-    if kind == 'move':
-        # energy
-        # create energy line graph with actual/goal
-        energy_goal = activity[['date', 'energy_burned',
-                                'energy_burned_goal']]
-        graph = energy_goal.tail(recent)
-        
-    elif kind == 'exercise':
-        # exercise
-        # create exercise line graph with actual/goal
-        exercise_goal = activity[['date', 'exercise_time',
-                                  'exercise_time_goal']]
-        graph = exercise_goal.tail(recent)
-
-    elif kind == 'stand':
-        # stand
-        # create stand line graph with actual/goal
-        stand_goal = activity[['date', 'stand_hours', 'stand_hours_goal']]
-        graph = stand_goal.tail(recent)
-
-    else:
-        d = {'Error': ['No data']}
-        graph = pd.DataFrame(data=d)
-
-    return graph
-
-def agg_day(df):
-    '''
-    Returns df with daily goal difference and variance%
-    (Requirements 3.4.1.1 and 3.4.2.1)
-    '''
-    df = calc_var(df)
-    return df
+    user_id = graph_user_id()
+    specs = batch_request()
 
+    def render():
+        return batch_json(specs, activity_graphs(user_id, specs))
 
-def agg_week(df):
-    '''
-    Returns df with weekly totals, calculates goal differance and variance
-    (Requirements 3.4.1.2 and 3.4.2.2)
-    '''
-    df['week_start'] = (df['date'] - pd.to_timedelta
-                        (df['date'].dt.dayofweek, unit='d'))
-    df = df.groupby(['week_start'], as_index=False).sum()
-    df = calc_var(df)
-    df['date'] = df['week_start']
-    return df
+    return graph_response('activity_batch', user_id, specs, render)
 
 
-def agg_month(df):
-    '''
-    Returns df with monthly totals, calculates goal differance and variance
-    (Requirements 3.4.1.3 and 3.4.2.3)
+def activity_graph(user_id, recent, agg, kind, period=None):
     '''
-    # modify date to be first date of month
-    df['month'] = pd.to_datetime(df['date'].dt.strftime('%Y-%m') + '-01')
-    df = df.groupby(['month'], as_index=False).sum()
-    df = calc_var(df)
-    df['date'] = df['month']
-    return df
+    Returns the last `recent` data points of a user's activity graph
+    (Requirements 3.4.1 and 3.4.2)
 
-
-def agg_year(df):
-    '''
-    Returns df with yearly totals, calculates goal differance and variance
-    (Requirements 3.4.1.4 and 3.4.2.4)
+    Parameters
+    ----------
+    user_id : int
+        user id to graph
+    recent : int
+        how many data points to go back
+    agg : string
+        Aggregation level.  Values can be date, week_start, month, and year
+    kind : string
+        Exercise type.  Values can be move, exercise, or stand
+    period : (date, date), optional
+        Date range to read, see aggregate.current_period
     '''
-    # modify date to be January 1st of year
-    df['year'] = pd.to_datetime(df['date'].dt.strftime('%Y') + '-01-01')
-    df = df.groupby(['year'], as_index=False).sum()
-    df = calc_var(df)
-    df['date'] = df['year']
-    return df
+    return metrics.graph(ACTIVITY, user_id, recent, agg, kind, period)
 
 
-def calc_var(df):
-    '''
-    Calculates variances for aggregated dataframes
-    (Requirement 3.2.2)
-    '''
-    df['energy_var#'] = df['energy_burned'] - df['energy_burned_goal']
-    df['energy_var%'] = ((df['energy_burned'] - df['energy_burned_goal']) /
-                         df['energy_burned_goal'])
-    df['exercise_var#'] = df['exercise_time'] - df['exercise_time_goal']
-    df['exercise_var%'] = ((df['exercise_time'] - df['exercise_time_goal'])
-                           / df['exercise_time_goal'])
-    df['stand_var#'] = df['stand_hours'] - df['stand_hours_goal']
-    df['stand_var%'] = ((df['stand_hours'] - df['stand_hours_goal']) /
-                        df['stand_hours_goal'])
-    return df
-
-
-def check_data_limit(df, data_size):
+def activity_graphs(user_id, specs):
     '''
-    Used to check if size specified is supported by data
-    
-    returns
-    -------
-        original data limit if acceptable, dataframe count if not
+    Returns the activity graph of every (agg, kind, recent) spec, see
+    metrics.graphs
     '''
-    if data_size > len(df.index):
-        data_size = len(df.index)
-    return data_size
+    return metrics.graphs(ACTIVITY, user_id, specs)
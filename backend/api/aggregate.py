@@ -0,0 +1,271 @@
+'''
+Builds the per user queries behind the graph endpoints: reads of the
+precomputed rollups table, or GROUP BY queries over the raw rows, so only
+one row per bucket and only the columns a graph needs leave the database
+'''
+
+from datetime import date, timedelta
+
+import pandas as pd
+from sqlalchemy import Date, Integer, Interval, and_, cast, func, \
+    literal_column
+from sqlalchemy.sql import select
+
+from .buckets import MONDAY, week_start
+from .. import db
+from ..models import Rollup
+
+
+AGGREGATES = ('date', 'week_start', 'month', 'year')
+
+
+def sqlite_bucket(column, agg):
+    # 'weekday N' moves forward to the last day of the week (sqlite counts
+    # from Sunday, so that is N for weeks starting on pandas weekday N), six
+    # days back is the first day
+    modifiers = {
+        'week_start': ('weekday %d' % week_start(), '-6 days'),
+        'month': ('start of month',),
+        'year': ('start of year',),
+    }
+    return func.date(column, *modifiers[agg])
+
+
+def postgresql_bucket(column, agg):
+    # date_trunc weeks start on Monday like pandas' dayofweek, other starts
+    # shift the dates back before truncating and forward again.  The field
+    # is inlined, a bound parameter in both SELECT and GROUP BY would count
+    # as two different expressions.
+    field = {'week_start': 'week', 'month': 'month', 'year': 'year'}[agg]
+    start = week_start() if agg == 'week_start' else MONDAY
+    if start == MONDAY:
+        return cast(func.date_trunc(literal_column("'%s'" % field), column),
+                    Date)
+    shift = literal_column("interval '%d days'" % start, Interval)
+    return cast(func.date_trunc(literal_column("'week'"), column - shift) +
+                shift, Date)
+
+
+BUCKETS = {
+    'sqlite': sqlite_bucket,
+    'postgresql': postgresql_bucket,
+}
+
+
+def bucket_expression(column, agg, dialect):
+    '''
+    SQL expression truncating a date column to the start of its
+    week/month/year
+
+    Parameters
+    ----------
+    column : sqlalchemy column
+        Date column to bucket
+    agg : string
+        Aggregation level.  Values can be week_start, month, and year
+    dialect : string
+        Name of the database dialect (sqlite, postgresql)
+
+    Returns
+    -------
+        SQL expression, or None if the dialect has no bucket expression
+    '''
+    bucket = BUCKETS.get(dialect)
+    if bucket is None:
+        return None
+    return bucket(column, agg)
+
+
+def period_bounds(day, agg):
+    '''
+    First day of the day/week/month/year holding `day` and the first day of
+    the next one, weeks start on GRAPH_WEEK_START
+
+    Returns
+    -------
+        (start, end) dates, end is exclusive
+    '''
+    if agg == 'week_start':
+        start = day - timedelta(days=(day.weekday() - week_start()) % 7)
+        return start, start + timedelta(days=7)
+    if agg == 'month':
+        start = day.replace(day=1)
+        if start.month == 12:
+            return start, date(start.year + 1, 1, 1)
+        return start, start.replace(month=start.month + 1)
+    if agg == 'year':
+        return date(day.year, 1, 1), date(day.year + 1, 1, 1)
+    return day, day + timedelta(days=1)
+
+
+def current_period(model, user_id, agg):
+    '''
+    Bounds of the user's most recent bucket.  The latest date comes from the
+    (user_id, date) index, so this costs the same however much history the
+    user has.
+
+    Returns
+    -------
+        (start, end) dates, or None if the user has no data
+    '''
+    latest = db.session.query(func.max(model.date)).\
+        filter(model.user_id==user_id).scalar()
+    if latest is None:
+        return None
+    return period_bounds(latest, agg)
+
+
+def aggregate_query(model, user_id, agg, columns, recent, dialect,
+                    period=None, by=()):
+    '''
+    Query returning the most recent `recent` buckets of one user, newest
+    first, with columns summed per bucket
+
+    Parameters
+    ----------
+    model : db.Model
+        Table to read, needs user_id and date columns
+    user_id : int
+        user id to graph
+    agg : string
+        Aggregation level.  Values can be date, week_start, month, and year
+    columns : list of str
+        Columns to return next to date
+    recent : int
+        how many data points to go back
+    dialect : string
+        Name of the database dialect
+    period : (date, date), optional
+        Only read rows from start up to (excluding) end, see current_period
+    by : list of str, optional
+        Columns to break every bucket down by, one row per bucket and group
+
+    Returns
+    -------
+        select statement with a date column followed by by and columns, or
+        None if agg needs a bucket expression the dialect doesn't have
+    '''
+    table = model.__table__
+    if agg == 'date':
+        # several rows of a day (workouts) still make one bucket
+        bucket = table.c.date
+    else:
+        bucket = bucket_expression(table.c.date, agg, dialect)
+        if bucket is None:
+            return None
+    groups = [table.c[column] for column in by]
+    selected = [func.sum(table.c[column]).label(column)
+                for column in columns]
+    conditions = [table.c.user_id == user_id]
+    if period is not None:
+        conditions += [table.c.date >= period[0], table.c.date < period[1]]
+    if not groups:
+        return select([bucket.label('date')] + selected).\
+            where(and_(*conditions)).group_by(bucket).\
+            order_by(bucket.desc()).limit(recent)
+    # the newest `recent` buckets of any group, then every group in them
+    latest = select([bucket.label('date')]).where(and_(*conditions)).\
+        group_by(bucket).order_by(bucket.desc()).limit(recent).subquery()
+    oldest = select([func.min(latest.c.date)]).scalar_subquery()
+    return select([bucket.label('date')] + groups + selected).\
+        where(and_(*conditions)).where(table.c.date >= oldest).\
+        group_by(bucket, *groups).\
+        order_by(bucket.desc(), *[group.desc() for group in groups])
+
+
+def rollup_frame(model, user_id, agg, metrics, recent):
+    '''
+    Reads the last `recent` buckets of several metrics of a source table
+    from the rollups table in one query
+
+    Parameters
+    ----------
+    model : db.Model
+        Source table of the rollups
+    user_id : int
+        user id to graph
+    agg : string
+        Aggregation level.  Values can be date, week_start, month, and year
+    metrics : list of lists of str
+        [actual] or [actual, goal] column names of the source table
+    recent : int
+        how many data points to go back
+
+    Returns
+    -------
+    frame : dataframe
+        date followed by the columns of every metric, oldest to newest
+    '''
+    table = model.__table__
+    goals = {metric[0]: metric[1:] for metric in metrics}
+    # every bucket has one row per metric, so the newest recent * metrics
+    # rows are the newest `recent` buckets of all of them
+    s = select([Rollup.date, Rollup.metric, Rollup.actual, Rollup.goal]).\
+        where(Rollup.user_id == user_id).\
+        where(Rollup.source == table.name).\
+        where(Rollup.agg == agg).\
+        where(Rollup.metric.in_(list(goals))).\
+        order_by(Rollup.date.desc(), Rollup.metric).\
+        limit(recent * len(goals))
+    with db.engine.connect() as conn:
+        rows = conn.execute(s).fetchall()
+    # a few dozen rows, pivoted in python rather than through pandas
+    buckets = {}
+    for day, metric, actual, goal in rows:
+        buckets.setdefault(day, {})[metric] = (actual, goal)
+    dates = sorted(buckets)
+    frame = pd.DataFrame({'date': pd.to_datetime(dates)})
+    for actual, goal in goals.items():
+        values = [buckets[day].get(actual, (None, None)) for day in dates]
+        frame[actual] = pd.Series([value[0] for value in values],
+                                  dtype='float64')
+        for column in goal:
+            frame[column] = pd.Series([value[1] for value in values],
+                                      dtype='float64')
+    # rollups are floats, integer columns of the source graph as integers
+    for column in frame.columns[1:]:
+        if isinstance(table.c[column].type, Integer) and \
+                not frame[column].isna().any():
+            frame[column] = frame[column].astype('int64')
+    return frame
+
+
+def batch_plan(specs, kind_columns):
+    '''
+    Groups the (agg, kind, recent) specs of a batch request by aggregation
+    level, unknown levels fall back to date like the single graphs do
+
+    Returns
+    -------
+        {agg: (recent, metrics)}, the largest recent asking for the level
+        and the distinct kind_columns lists needed from it
+    '''
+    plan = {}
+    for agg, kind, recent in specs:
+        if kind not in kind_columns:
+            continue
+        agg = agg if agg in AGGREGATES else 'date'
+        depth, metrics = plan.get(agg, (0, []))
+        if kind_columns[kind] not in metrics:
+            metrics = metrics + [kind_columns[kind]]
+        plan[agg] = (max(depth, recent), metrics)
+    return plan
+
+
+def batch_graphs(specs, frames, kind_columns):
+    '''
+    Cuts the graph of every spec out of the per level frames of batch_plan
+
+    Returns
+    -------
+        list of dataframes in the order of specs
+    '''
+    graphs = []
+    for agg, kind, recent in specs:
+        if kind not in kind_columns:
+            graphs.append(pd.DataFrame(data={'Error': ['No data']}))
+            continue
+        frame = frames[agg if agg in AGGREGATES else 'date']
+        graph = frame[['date'] + kind_columns[kind]].tail(recent)
+        graphs.append(graph.reset_index(drop=True))
+    return graphs
@@ -1,7 +1,10 @@
-from flask import g, jsonify, request
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
 from flask_httpauth import HTTPBasicAuth
 from ..models import User
 from . import api
+from .. import credential_cache
 from .errors import unauthorized, forbidden
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -16,7 +19,7 @@ def verify_password(email_or_token, password):
         g.current_user = User.verify_auth_token(email_or_token)
         g.token_used = True
         return g.current_user is not None
-    user = User.query.filter_by(email=email_or_token).first()
+    user = User.lookup(email_or_token)
     if not user:
         return False
     g.current_user = user
@@ -27,3 +30,50 @@ def verify_password(email_or_token, password):
 @auth.error_handler
 def auth_error():
     return unauthorized('Invalid credentials')
+
+
+def admin_required(f):
+    '''
+    auth.login_required for admin tooling, the authenticated user's id has
+    to be listed in ADMIN_USERS (no one by default)
+    '''
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if g.current_user.id not in current_app.config.get('ADMIN_USERS', ()):
+            return forbidden('Admin only')
+        return f(*args, **kwargs)
+    return auth.login_required(decorated)
+
+
+@api.route('/auth/cache/stats', methods=['GET'])
+@admin_required
+def get_credential_cache_stats():
+    '''
+    Verified-credential cache counters of this process, for admins
+    (ADMIN_USERS)
+
+    returns
+    -------
+        hits, misses, sets, evictions, expirations, invalidations, entries,
+        hit_rate, enabled
+    '''
+    return jsonify(credential_cache.stats())
+
+
+@api.route('/tokens', methods=['POST'])
+@auth.login_required
+def get_token():
+    '''
+    Issues an auth token for the email and password of the request, to be
+    sent as the basic auth username with an empty password.  Tokens can't
+    be renewed with a token.
+
+    returns
+    -------
+        token, expiration (seconds)
+    '''
+    if g.token_used:
+        return unauthorized('Invalid credentials')
+    expiration = current_app.config.get('AUTH_TOKEN_TTL', 3600)
+    return jsonify({'token': g.current_user.generate_auth_token(expiration),
+                    'expiration': expiration})
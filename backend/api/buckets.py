@@ -0,0 +1,59 @@
+'''
+Calendar buckets of date columns computed with datetime64 arithmetic.  Dates
+become whole days since the epoch and the week/month/year keys are derived
+from those integers, without formatting and parsing a string per row.
+
+Config
+------
+GRAPH_WEEK_START : first day of week_start weeks, 0 (Monday, default) to 6
+    (Sunday).  Rollups built with another start show up as drift in
+    `flask check-rollups` and are rebuilt by --fix, shared graph caches
+    (filesystem, sqlite) need clearing.
+'''
+
+from flask import current_app, has_app_context
+
+
+MONDAY = 0
+# weekday of 1970-01-01, day 0 of datetime64[D]
+EPOCH_WEEKDAY = 3
+UNITS = {'date': 'D', 'month': 'M', 'year': 'Y'}
+
+
+def week_start():
+    '''
+    Configured first day of the week, Monday outside an app context
+    '''
+    if not has_app_context():
+        return MONDAY
+    return current_app.config.get('GRAPH_WEEK_START', MONDAY)
+
+
+def bucket_days(days, agg, start=None):
+    '''
+    Start of the day/week/month/year holding each date
+
+    Parameters
+    ----------
+    days : int32 array
+        Dates as days since the epoch
+    agg : string
+        Aggregation level.  Values can be date, week_start, month, and year
+    start : int, optional
+        First day of week_start weeks, 0 (Monday) to 6 (Sunday), defaults to
+        GRAPH_WEEK_START
+
+    Returns
+    -------
+    keys : int32 array
+        First day of each date's bucket, as days since the epoch
+    '''
+    if agg == 'week_start':
+        start = week_start() if start is None else start
+        return (days - (days + EPOCH_WEEKDAY - start) % 7).astype('int32')
+    if agg == 'date':
+        return days
+    if agg not in UNITS:
+        raise ValueError('Unknown aggregation level: %r' % agg)
+    keys = days.astype('datetime64[D]').astype('datetime64[%s]' % UNITS[agg])
+    return keys.astype('datetime64[D]').astype('int32')
@@ -0,0 +1,158 @@
+import json
+
+from flask import g, jsonify, make_response, request
+from . import api
+from .authentication import admin_required
+from .. import graph_cache
+from ..exceptions import ValidationError
+from ..models import User, db
+
+
+def data_version(user_id):
+    '''
+    Current data_version of the user, None for unknown users.  Read from the
+    graph cache's version store, the users table is only queried the first
+    time a user is seen.
+    '''
+    return graph_cache.versions.get(user_id, User.load_data_version)
+
+
+def graph_user_id():
+    '''
+    Id of the authenticated user, graphs are only ever served for them (the
+    endpoints are behind auth.login_required)
+    '''
+    return g.current_user.id
+
+
+# most buckets one graph may ask for, ten years of days
+MAX_RECENT = 3660
+# most graphs one batch request may ask for
+MAX_BATCH_GRAPHS = 64
+
+
+def recent_value(recent):
+    '''
+    recent as an int from 1 to MAX_RECENT.  Anything else is refused, the
+    database and pandas would each read a zero or negative count their own
+    way (no limit, an error, dropped rows).
+    '''
+    try:
+        recent = int(recent)
+    except (TypeError, ValueError):
+        raise ValidationError('recent must be an integer')
+    if recent < 1:
+        raise ValidationError('recent must be a positive integer')
+    if recent > MAX_RECENT:
+        raise ValidationError('recent is at most %d' % MAX_RECENT)
+    return recent
+
+
+def graph_request():
+    '''
+    Parameters of a graph request, from the JSON body of a POST or the query
+    string of a GET (agg=month&kind=move&recent=12).  A user_id sent by
+    older clients is ignored, see graph_user_id.
+    '''
+    if request.method == 'POST':
+        data = request.get_json()
+        if not isinstance(data, dict):
+            raise ValidationError('expected a JSON object')
+    else:
+        data = request.args.to_dict()
+    if 'recent' in data:
+        data['recent'] = recent_value(data['recent'])
+    return data
+
+
+def batch_request():
+    '''
+    Graphs of a batch graph request, as [agg, kind, recent] lists or
+    {"agg", "kind", "recent"} objects in the JSON body of a POST, or
+    repeated graph=agg,kind,recent arguments of a GET
+
+    Returns
+    -------
+    specs : tuple
+        (agg, kind, recent) tuples, at most MAX_BATCH_GRAPHS of them with
+        recent up to MAX_RECENT each
+    '''
+    data = graph_request()
+    if request.method == 'POST':
+        graphs = data.get('graphs')
+    else:
+        graphs = [graph.split(',') for graph in request.args.getlist('graph')]
+    if not isinstance(graphs, list) or not graphs:
+        raise ValidationError('graphs must be a non-empty list')
+    if len(graphs) > MAX_BATCH_GRAPHS:
+        raise ValidationError('at most %d graphs per request'
+                              % MAX_BATCH_GRAPHS)
+    specs = []
+    for graph in graphs:
+        if isinstance(graph, dict):
+            graph = [graph.get(name) for name in ('agg', 'kind', 'recent')]
+        try:
+            agg, kind, recent = graph
+        except (TypeError, ValueError):
+            raise ValidationError('graphs must be (agg, kind, recent)')
+        specs.append((str(agg), str(kind), recent_value(recent)))
+    return tuple(specs)
+
+
+def batch_json(specs, graphs):
+    '''
+    One JSON document with the graph of every spec, in request order
+    '''
+    items = []
+    for (agg, kind, recent), graph in zip(specs, graphs):
+        # the graphs are already JSON, only the envelope is built here
+        items.append('{"agg": %s, "kind": %s, "recent": %d, "graph": %s}' % (
+            json.dumps(agg), json.dumps(kind), recent,
+            graph.to_json(date_format='iso', index=False, orient='table')))
+    return '{"graphs": [%s]}' % ', '.join(items)
+
+
+def graph_response(endpoint, user_id, params, render):
+    '''
+    Response with the graph JSON of an endpoint, served from the graph cache
+    and rendered on a miss.  The cache key doubles as a strong ETag, so a GET
+    whose If-None-Match still matches is answered with 304 without touching
+    the database (the data_version comes from the version store, see
+    backend.cache) or pandas.  Only GET and HEAD are conditional, clients
+    polling with POST always get the full body.
+
+    Parameters
+    ----------
+    endpoint : str
+        Name of the graph endpoint
+    user_id : int
+        user id to graph
+    params : tuple
+        The other request parameters (agg, kind, recent)
+    render : function
+        Builds the JSON body without arguments
+    '''
+    etag = graph_cache.key(endpoint, user_id, data_version(user_id), params)
+    if request.method in ('GET', 'HEAD') and \
+            request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(graph_cache.fetch(etag, render))
+    response.set_etag(etag)
+    # clients may keep the body but have to revalidate before using it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@api.route('/cache/stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    '''
+    Graph cache counters of this process, for admins (ADMIN_USERS)
+
+    returns
+    -------
+        hits, misses, sets, evictions, expirations, hit_rate, entries,
+        backend
+    '''
+    return jsonify(graph_cache.stats())
@@ -0,0 +1,185 @@
+'''
+Struct of arrays aggregation core.  Raw rows of a graph are held as an
+int32 array of days since the epoch, one float64 array per summed column and
+an int32 code array per breakdown column, with nothing else of the row kept.
+Bucket sums run np.add.reduceat over the runs of date ordered rows, or
+np.bincount over combined bucket/group keys otherwise.
+
+Values stay float64, float32 would change the digits of the sums the graphs
+return next to the SQL and rollups paths.
+'''
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Integer, String, type_coerce
+from sqlalchemy.sql import select
+
+from .buckets import bucket_days
+from .. import db
+
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def epoch_dates(dates):
+    '''
+    datetime64[D] array of the dates a driver returned, ISO strings (parsed
+    by NumPy) or date objects, None becomes NaT
+    '''
+    sample = next((day for day in dates if day is not None), None)
+    if sample is None or isinstance(sample, str):
+        return np.array(dates, dtype='datetime64[D]')
+    # toordinal is much cheaper than NumPy converting date objects
+    ordinals = np.array([0 if day is None else day.toordinal()
+                         for day in dates], dtype='int64')
+    days = (ordinals - EPOCH_ORDINAL).astype('datetime64[D]')
+    days[ordinals == 0] = np.datetime64('NaT')
+    return days
+
+
+def select_rows(table, columns, by=()):
+    '''
+    Select of the date, by and columns of a table in date order, for
+    Columns.read.  The date skips SQLAlchemy's conversion to date objects
+    and comes as the driver returns it.
+    '''
+    return select([type_coerce(table.c.date, String).label('date')] +
+                  [table.c[column] for column in list(by) + list(columns)]).\
+        order_by(table.c.date)
+
+
+class Columns():
+    '''
+    Raw rows of one user reduced to the arrays an aggregation needs
+
+    Parameters
+    ----------
+    days : int32 array
+        Date of every row as days since the epoch
+    values : dict
+        {column: float64 array} of the columns to sum, missing values are 0
+        like in a pandas sum
+    groups : dict, optional
+        {column: (int32 codes, labels)} of the breakdown columns, labels
+        sorted so buckets come out in label order
+    integer : set of str, optional
+        Columns whose sums are returned as int64
+    '''
+    def __init__(self, days, values, groups=None, integer=()):
+        self.days = days
+        self.values = values
+        self.groups = groups or {}
+        self.integer = set(integer)
+
+    def __len__(self):
+        return len(self.days)
+
+    @classmethod
+    def from_arrays(cls, dates, values, groups=(), integer=()):
+        '''
+        Builds Columns from a date array, {column: values} and
+        {column: labels}, dropping rows without a date or a group label
+        '''
+        days = np.asarray(dates, dtype='datetime64[D]')
+        keep = ~np.isnat(days)
+        factorized = {}
+        for column, labels in dict(groups).items():
+            codes, uniques = pd.factorize(np.asarray(labels, dtype=object),
+                                          sort=True)
+            keep &= codes >= 0
+            factorized[column] = (codes.astype('int32'),
+                                  np.asarray(uniques, dtype=object))
+        arrays = {}
+        for column, value in values.items():
+            array = np.asarray(value, dtype='float64')
+            if not keep.all():
+                array = array[keep]
+            missing = np.isnan(array)
+            if missing.any():
+                array = np.where(missing, 0, array)
+            arrays[column] = array
+        if not keep.all():
+            days = days[keep]
+            factorized = {column: (codes[keep], labels)
+                          for column, (codes, labels) in factorized.items()}
+        return cls(days.astype('int32'), arrays, factorized, integer)
+
+    @classmethod
+    def read(cls, s, by=()):
+        '''
+        Runs a select of date, the by columns and the columns to sum (see
+        select_rows), without building a dataframe
+        '''
+        selected = list(s.selected_columns)
+        with db.engine.connect() as conn:
+            rows = conn.execute(s).fetchall()
+        fields = list(zip(*rows)) if rows else [()] * len(selected)
+        groups = {column: fields[i + 1] for i, column in enumerate(by)}
+        values = {}
+        integer = []
+        for column, field in zip(selected[1 + len(by):],
+                                 fields[1 + len(by):]):
+            # None becomes NaN, which is summed as 0
+            values[column.name] = np.array(field, dtype='float64')
+            if isinstance(column.type, Integer):
+                integer.append(column.name)
+        return cls.from_arrays(epoch_dates(fields[0]), values, groups,
+                               integer)
+
+    def sums(self, agg, start=None):
+        '''
+        Sums every column per bucket (and group)
+
+        Parameters
+        ----------
+        agg : string
+            Aggregation level.  Values can be date, week_start, month, and
+            year
+        start : int, optional
+            First day of week_start weeks, see buckets.bucket_days
+
+        Returns
+        -------
+            (keys, codes, sums), the int32 first day of every bucket, the
+            {column: codes} of its groups and {column: sums}, ordered by
+            bucket and group
+        '''
+        keys = bucket_days(self.days, agg, start)
+        if not self.groups and (len(keys) < 2 or
+                                (keys[1:] >= keys[:-1]).all()):
+            # date ordered rows: every bucket is one run of rows
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) \
+                if len(keys) else keys
+            sums = {column: np.add.reduceat(value, starts) if len(value)
+                    else value for column, value in self.values.items()}
+            return keys[starts], {}, sums
+        # one int64 key per bucket and group combination
+        combined = keys.astype('int64')
+        for codes, labels in self.groups.values():
+            combined = combined * len(labels) + codes
+        unique, inverse = np.unique(combined, return_inverse=True)
+        sums = {column: np.bincount(inverse, weights=value,
+                                    minlength=len(unique))
+                for column, value in self.values.items()}
+        codes = {}
+        for column, (_, labels) in reversed(list(self.groups.items())):
+            codes[column] = (unique % len(labels)).astype('int32')
+            unique = unique // len(labels)
+        return unique.astype('int32'), codes, sums
+
+    def frame(self, agg, start=None):
+        '''
+        The sums as a dataframe of date, the by columns and the summed
+        columns, oldest to newest
+        '''
+        keys, codes, sums = self.sums(agg, start)
+        frame = pd.DataFrame({'date': keys.astype('datetime64[D]').
+                              astype('datetime64[ns]')})
+        for column, (_, labels) in self.groups.items():
+            frame[column] = labels[codes[column]]
+        for column, value in sums.items():
+            frame[column] = value.astype('int64') \
+                if column in self.integer else value
+        return frame
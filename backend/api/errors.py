@@ -15,6 +15,19 @@ def unauthorized(message):
     return response
 
 
+def not_found(message):
+    response = jsonify({'error': 'not found', 'message': message})
+    response.status_code = 404
+    return response
+
+
+def conflict(message, **fields):
+    response = jsonify(dict({'error': 'conflict', 'message': message},
+                            **fields))
+    response.status_code = 409
+    return response
+
+
 def forbidden(message):
     response = jsonify({'error': 'forbidden', 'message': message})
     response.status_code = 403
@@ -0,0 +1,24 @@
+from flask import g, jsonify
+from . import api
+from .authentication import auth
+from .errors import not_found
+from .. import job_queue
+
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+@auth.login_required
+def get_job(job_id):
+    '''
+    Status of a background upload job of the authenticated user
+    (see backend.jobs)
+
+    returns
+    -------
+        id, user_id, status (queued, running, done, failed), stage,
+        progress_bytes, total_bytes, rows_loaded, timings, error,
+        created_at, updated_at
+    '''
+    job = job_queue.get(job_id)
+    if job is None or job['user_id'] != g.current_user.id:
+        return not_found('Unknown job')
+    return jsonify(job)
@@ -0,0 +1,240 @@
+'''
+Metric definitions of the graphed tables and the one aggregation path behind
+the activity and workout graphs.  Each source table declares the metrics it
+graphs (an actual column and optionally a goal, the variances derive from
+both) and the columns its graphs may be broken down by.  Graphs read the
+rollups table, or sum per bucket in SQL, or for databases without a bucket
+expression sum the raw rows with the columnar core.
+'''
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+
+from .aggregate import AGGREGATES, aggregate_query, batch_graphs, \
+    batch_plan, rollup_frame
+from .columnar import Columns, select_rows
+from .. import db
+from ..exceptions import ValidationError
+from ..models import ActivityData, WorkoutData
+
+
+class Metric():
+    '''
+    One graphed quantity of a source table, summed per bucket
+
+    Parameters
+    ----------
+    kind : str
+        Name of the graph in requests (move, exercise, ...)
+    actual : str
+        Column holding the achieved value
+    goal : str, optional
+        Column holding the goal of the same period
+    '''
+    def __init__(self, kind, actual, goal=None):
+        self.kind = kind
+        self.actual = actual
+        self.goal = goal
+
+    def __repr__(self):
+        return '<Metric %r>' % self.kind
+
+    @property
+    def columns(self):
+        '''
+        [actual] or [actual, goal], the columns of the metric's graph
+        '''
+        return [self.actual] + ([self.goal] if self.goal else [])
+
+    @staticmethod
+    def variance(actual, goal):
+        '''
+        Difference to the goal and that difference relative to the goal,
+        NaN where there is no goal or it is zero
+        '''
+        actual = np.asarray(actual, dtype=float)
+        goal = np.asarray(goal, dtype=float)
+        var_num = actual - goal
+        with np.errstate(divide='ignore', invalid='ignore'):
+            var_pct = var_num / goal
+        var_pct[~np.isfinite(var_pct)] = np.nan
+        return var_num, var_pct
+
+
+class Source():
+    '''
+    A table graphed per user and date
+
+    Parameters
+    ----------
+    model : db.Model
+        Table to read, needs user_id and date columns
+    metrics : list of Metric
+        Graphs of the table
+    groups : list of str
+        Columns the graphs may be broken down by
+    '''
+    def __init__(self, model, metrics, groups=()):
+        self.model = model
+        self.name = model.__tablename__
+        self.metrics = {metric.kind: metric for metric in metrics}
+        self.groups = tuple(groups)
+
+    def __repr__(self):
+        return '<Source %r>' % self.name
+
+    @property
+    def kind_columns(self):
+        return {kind: metric.columns for kind, metric in self.metrics.items()}
+
+
+ACTIVITY = Source(ActivityData, [
+    Metric('move', 'energy_burned', 'energy_burned_goal'),
+    Metric('exercise', 'exercise_time', 'exercise_time_goal'),
+    Metric('stand', 'stand_hours', 'stand_hours_goal'),
+])
+WORKOUT = Source(WorkoutData, [
+    Metric('move', 'total_energy_burned'),
+    Metric('exercise', 'duration'),
+    Metric('distance', 'total_distance'),
+], groups=['activity', 'gadget'])
+SOURCES = {source.name: source for source in (ACTIVITY, WORKOUT)}
+
+
+def no_data():
+    return pd.DataFrame(data={'Error': ['No data']})
+
+
+def last_buckets(frame, recent):
+    '''
+    Rows of the newest `recent` dates of a frame sorted by date
+    '''
+    dates = frame['date'].drop_duplicates()
+    if len(dates.index) > recent:
+        frame = frame[frame['date'] >= dates.iloc[-recent]]
+    return frame.reset_index(drop=True)
+
+
+def columnar_frame(source, user_id, agg, columns, recent, period=None,
+                   by=()):
+    '''
+    read_frame summed by the columnar core from the user's raw rows, only
+    the date, by and columns are read
+    '''
+    model = source.model
+    s = select_rows(model.__table__, columns, by).\
+        where(model.user_id==user_id)
+    if period is not None:
+        s = s.where(model.date >= period[0]).where(model.date < period[1])
+    rows = Columns.read(s, by)
+    return last_buckets(rows.frame(agg), recent)
+
+
+def read_frame(source, user_id, agg, metrics, recent, period=None, by=()):
+    '''
+    The newest `recent` buckets of several metrics of one user, from the
+    rollups table when GRAPH_ROLLUPS is on (and nothing is broken down),
+    else summed in the database or, lacking a bucket expression, in NumPy.
+    Users without rollups (data loaded before the rollups table existed)
+    are summed from their raw rows until their next upload builds them.
+
+    Parameters
+    ----------
+    source : Source
+        Table to graph
+    user_id : int
+        user id to graph
+    agg : string
+        Aggregation level.  Values can be date, week_start, month, and year
+    metrics : list of lists of str
+        Column lists of the metrics (Metric.columns)
+    recent : int
+        how many data points to go back
+    period : (date, date), optional
+        Only read rows from start up to (excluding) end, see current_period.
+        The rollups path ignores it, its newest bucket is the current one.
+    by : list of str, optional
+        Columns of source.groups to break every bucket down by
+
+    Returns
+    -------
+    frame : dataframe
+        date, by and the metrics' columns, oldest to newest
+    '''
+    model = source.model
+    by = list(by)
+    if not by and current_app.config.get('GRAPH_ROLLUPS', True):
+        frame = rollup_frame(model, user_id, agg, metrics, recent)
+        if not frame.empty:
+            return frame
+    columns = [column for metric in metrics for column in metric]
+    s = aggregate_query(model, user_id, agg, columns, recent,
+                        db.engine.dialect.name, period, by)
+    if s is None:
+        # no bucket expression for this database, sum the rows in NumPy
+        return columnar_frame(source, user_id, agg, columns, recent, period,
+                              by)
+    df = pd.read_sql(s, con=db.engine, parse_dates=['date'])
+    # newest first from the database, graphs run oldest to newest
+    return df.iloc[::-1].reset_index(drop=True)
+
+
+def graph(source, user_id, recent, agg, kind, period=None, by=None):
+    '''
+    Returns the last `recent` data points of one graph
+    (Requirements 3.4.1 and 3.4.2)
+
+    Parameters
+    ----------
+    source : Source
+        Table to graph
+    user_id : int
+        user id to graph
+    recent : int
+        how many data points to go back
+    agg : string
+        Aggregation level.  Values can be date, week_start, month, and year
+    kind : string
+        One of source.metrics
+    period : (date, date), optional
+        Date range to read, see aggregate.current_period
+    by : string, optional
+        One of source.groups, a row per bucket and value of that column
+    '''
+    metric = source.metrics.get(kind)
+    if metric is None:
+        return no_data()
+    if agg not in AGGREGATES:
+        print('Invalid aggregate.  Defaulting to day view.')
+        agg = 'date'
+    if by is not None and by not in source.groups:
+        raise ValidationError('by must be one of %s'
+                              % ', '.join(source.groups))
+    return read_frame(source, user_id, agg, [metric.columns], recent, period,
+                      [by] if by else [])
+
+
+def graphs(source, user_id, specs):
+    '''
+    Returns the graph of every (agg, kind, recent) spec with one read per
+    aggregation level, deep enough for the largest recent asking for it
+
+    Parameters
+    ----------
+    source : Source
+        Table to graph
+    user_id : int
+        user id to graph
+    specs : list of (agg, kind, recent)
+        Graphs to build, see graph
+
+    Returns
+    -------
+        list of dataframes in the order of specs
+    '''
+    kind_columns = source.kind_columns
+    frames = {}
+    for agg, (recent, metrics) in batch_plan(specs, kind_columns).items():
+        frames[agg] = read_frame(source, user_id, agg, metrics, recent)
+    return batch_graphs(specs, frames, kind_columns)
@@ -0,0 +1,159 @@
+'''
+Chunked, resumable upload endpoints for large export.zip files (see
+backend.uploads).  A client opens an upload, PUTs chunks at the offset the
+server reports and completes it with the file's SHA-256, which queues the
+parse like /auth/upload does.
+
+    POST   /uploads                 {size, sha256?, filename?}
+    PUT    /uploads/<id>?offset=n   chunk bytes (or an Upload-Offset header)
+    GET    /uploads/<id>            offset to resume from after a disconnect
+    POST   /uploads/<id>/complete   {sha256?}
+    DELETE /uploads/<id>
+'''
+
+import os
+
+from flask import current_app, g, jsonify, request
+from . import api
+from .authentication import auth
+from .errors import conflict, not_found
+from .. import job_queue, upload_store
+from ..exceptions import ValidationError
+from ..models import AppleParser
+from ..uploads import UploadConflict
+
+
+def owned_upload(upload_id):
+    '''
+    The upload if it belongs to the authenticated user, else None
+    '''
+    upload = upload_store.get(upload_id)
+    if upload is None or upload['user_id'] != g.current_user.id:
+        return None
+    return upload
+
+
+@api.route('/uploads', methods=['POST'])
+@auth.login_required
+def create_upload():
+    '''
+    Opens a chunked upload of an export.zip
+
+    parameters
+    ----------
+    size: total bytes of the file
+    sha256: hex digest of the file, optional until completion
+    filename: name of the file, optional
+
+    returns
+    -------
+        id, size, offset, status and chunk_size (largest chunk accepted)
+    '''
+    data = request.get_json() or {}
+    filename = data.get('filename')
+    if filename is not None and (not isinstance(filename, str) or not
+            AppleParser(None, g.current_user.id).allowed_file(filename)):
+        raise ValidationError('only zip files can be uploaded')
+    upload = upload_store.create(g.current_user.id, data.get('size'),
+                                 data.get('sha256'))
+    upload['chunk_size'] = upload_store.chunk_size
+    response = jsonify(upload)
+    response.status_code = 201
+    return response
+
+
+@api.route('/uploads/<upload_id>', methods=['GET'])
+@auth.login_required
+def get_upload(upload_id):
+    '''
+    Status of an upload, offset is where the next chunk starts
+
+    returns
+    -------
+        id, user_id, size, sha256, offset, status (uploading, verifying,
+        complete), job_id, created_at, updated_at
+    '''
+    upload = owned_upload(upload_id)
+    if upload is None:
+        return not_found('Unknown upload')
+    return jsonify(upload)
+
+
+@api.route('/uploads/<upload_id>', methods=['PUT'])
+@auth.login_required
+def put_chunk(upload_id):
+    '''
+    Appends the request body at offset, which has to be the upload's
+    current offset.  A wrong offset gets 409 with the current one.
+
+    returns
+    -------
+        offset after the chunk
+    '''
+    if owned_upload(upload_id) is None:
+        return not_found('Unknown upload')
+    offset = request.args.get('offset', request.headers.get('Upload-Offset'))
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        raise ValidationError('offset must be an integer')
+    try:
+        # the body is read as a stream, never parsed or spooled
+        offset = upload_store.append(upload_id, offset, request.stream,
+                                     request.content_length)
+    except UploadConflict as e:
+        return conflict(e.args[0], offset=e.offset)
+    return jsonify({'offset': offset})
+
+
+@api.route('/uploads/<upload_id>/complete', methods=['POST'])
+@auth.login_required
+def complete_upload(upload_id):
+    '''
+    Checks the size and SHA-256 of a finished upload and parses it, in a
+    background job unless ASYNC_UPLOADS is off.  A hash mismatch discards
+    the upload.
+
+    parameters
+    ----------
+    sha256: hex digest of the file, if not given when opening the upload
+
+    returns
+    -------
+        status and job_id (poll /api/v1/jobs/<job_id>)
+    '''
+    upload = owned_upload(upload_id)
+    if upload is None:
+        return not_found('Unknown upload')
+    data = request.get_json(silent=True) or {}
+    try:
+        path = upload_store.complete(upload_id, data.get('sha256'))
+    except UploadConflict as e:
+        return conflict(e.args[0], offset=e.offset)
+    user_id = upload['user_id']
+    if current_app.config.get('ASYNC_UPLOADS', True):
+        job_id = job_queue.enqueue(user_id, path)
+        upload_store.set_job(upload_id, job_id)
+        return jsonify({'status': 'Queued', 'job_id': job_id})
+    try:
+        AppleParser(path, user_id).parse_activity()
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return jsonify({'status': 'Database updated', 'job_id': None})
+
+
+@api.route('/uploads/<upload_id>', methods=['DELETE'])
+@auth.login_required
+def delete_upload(upload_id):
+    '''
+    Abandons an unfinished upload and removes what was received
+    '''
+    upload = owned_upload(upload_id)
+    if upload is None:
+        return not_found('Unknown upload')
+    if upload['status'] != 'uploading':
+        # the file belongs to the parse job now
+        raise ValidationError('upload is %s' % upload['status'])
+    upload_store.delete(upload_id)
+    return jsonify({'status': 'Deleted'})
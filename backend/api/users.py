@@ -1,7 +1,13 @@
 from flask import jsonify, request, current_app, url_for
 from . import api
+from .authentication import admin_required
+from .. import identity_cache
+from ..exceptions import ValidationError
 from ..models import User
 
+# most emails one lookup request may resolve
+MAX_LOOKUP_EMAILS = 1000
+
 @api.route('/users/get_user', methods=['POST'])
 def get_user():
     '''
@@ -13,7 +19,7 @@ def get_user():
     email = data['email']
     # password = data['password']
 
-    user = User.query.filter_by(email=email).first()
+    user = User.lookup(email)
     if user is not None:
         response = jsonify({'username': user.username})
         response.status_code = 200
@@ -31,9 +37,51 @@ def get_id():
     data = request.get_json()
     email = data['email']
 
-    user = User.query.filter_by(email=email).first()
+    user = User.lookup(email)
     if user is not None:
         response = jsonify({'user_id': user.id})
         response.status_code = 200
         return response
     return jsonify({'user_id': 'False'})
+
+
+@api.route('/users/lookup', methods=['POST'])
+@admin_required
+def lookup_users():
+    '''
+    Resolves many emails in one request, for admin tooling (ADMIN_USERS)
+
+    parameters
+    ----------
+    emails: list of user emails
+
+    returns
+    -------
+        users, {email: {user_id, username}} with null for unknown emails
+    '''
+    emails = (request.get_json() or {}).get('emails')
+    if not isinstance(emails, list) or \
+            not all(isinstance(email, str) for email in emails):
+        raise ValidationError('emails must be a list of strings')
+    if len(emails) > MAX_LOOKUP_EMAILS:
+        raise ValidationError('at most %d emails per request'
+                              % MAX_LOOKUP_EMAILS)
+    users = {}
+    for email, identity in User.lookup_many(emails).items():
+        users[email] = None if identity is None else {
+            'user_id': identity.id, 'username': identity.username}
+    return jsonify({'users': users})
+
+
+@api.route('/users/cache/stats', methods=['GET'])
+@admin_required
+def get_identity_cache_stats():
+    '''
+    Identity cache counters of this process, for admins (ADMIN_USERS)
+
+    returns
+    -------
+        hits, misses, evictions, expirations, invalidations, entries,
+        hit_rate, enabled
+    '''
+    return jsonify(identity_cache.stats())
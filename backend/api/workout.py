@@ -1,208 +1,139 @@
 from . import api
+from . import metrics
 from . import users
-from ..models import WorkoutData, User, db
-import pandas as pd
-from flask import request
-from sqlalchemy.sql import select
+from .aggregate import current_period
+from .authentication import auth
+from .caching import batch_json, batch_request, graph_request, \
+    graph_response, graph_user_id
+from .metrics import WORKOUT
+from ..models import WorkoutData
+from flask import current_app
 
 
-@api.route('/workout_current', methods=['POST'])
+@api.route('/workout_current', methods=['GET', 'POST'])
+@auth.login_required
 def pull_workout_current():
     '''
     Formats data for graphing most recent data (current day/week/month/year)
     (Requirement 3.4.1)
     
+    Graphs the authenticated user's data
+
     Parameters
     ----------
-        user_id: int
-            user id to graph
         agg: string
             aggregate level for data - date, week_start, month, and year are options
         kind: string
-            type of exercise (move, exercise, stand)
+            workout total (move, exercise, distance)
+        by: string, optional
+            break the total down by activity or gadget
     '''
-    data = request.get_json()
-    user_id = data['user_id']
+    data = graph_request()
+    user_id = graph_user_id()
     recent = 1
     agg = data['agg']
     kind = data['kind']
-
-    # original defaults
-    s = select([WorkoutData]).where(WorkoutData.user_id==user_id)
-
-    df = pd.read_sql(s, con=db.engine, parse_dates=['date'])
-    graph = workout_summary(df, recent, agg, kind)
-    graph = graph[graph['date'] == graph['date'].max()]
-    # convert to json
-    return graph.to_json(date_format='iso', index=False, orient='table')
-
-@api.route('/workout_trend', methods=['POST'])
+    by = data.get('by')
+
+    def render():
+        if current_app.config.get('GRAPH_ROLLUPS', True) and by is None:
+            # the newest rollup is the current period
+            period = None
+        else:
+            # only read the rows of the latest day/week/month/year
+            period = current_period(WorkoutData, user_id, agg)
+        graph = workout_graph(user_id, recent, agg, kind, period, by)
+        # convert to json
+        return graph.to_json(date_format='iso', index=False, orient='table')
+
+    return graph_response('workout_current', user_id, (agg, kind, by),
+                          render)
+
+@api.route('/workout_trend', methods=['GET', 'POST'])
+@auth.login_required
 def pull_workout_trend():
     '''
     Formats data for graphing trend data.
     (Requirement 3.4.2)
     
+    Graphs the authenticated user's data
+
     Parameters
     ----------
-        user_id: int
-            user id to graph
         recent: int
             number of data points to go back for graphs
         agg: string
             aggregate level for data - date, week_start, month, and year are options
         kind: string
-            type of exercise (move, exercise, stand)
+            workout total (move, exercise, distance)
+        by: string, optional
+            break the totals down by activity or gadget
     '''
-    data = request.get_json()
-    user_id = data['user_id']
+    data = graph_request()
+    user_id = graph_user_id()
     recent = data['recent']
     agg = data['agg']
     kind = data['kind']
+    by = data.get('by')
 
-    # original defaults
-    s = select([WorkoutData]).where(WorkoutData.user_id==user_id)
-
-    df = pd.read_sql(s, con=db.engine, parse_dates=['date'])
-    graph = workout_summary(df, recent, agg, kind)
-    # convert to json
-    return graph.to_json(date_format='iso', index=False, orient='table')
+    def render():
+        graph = workout_graph(user_id, recent, agg, kind, by=by)
+        # convert to json
+        return graph.to_json(date_format='iso', index=False, orient='table')
 
+    return graph_response('workout_trend', user_id, (agg, kind, recent, by),
+                          render)
 
-def workout_summary(df, recent, agg, kind):
+@api.route('/workout_batch', methods=['GET', 'POST'])
+@auth.login_required
+def pull_workout_batch():
     '''
-    This function performs the data wrangling to return activity data for graphs
-    (Requirement 3.2.5)
+    Several workout graphs in one response, each aggregation level is read
+    once and shared by all kinds asking for it
+
+    Graphs the authenticated user's data
 
     Parameters
     ----------
-    df : dataframe
-        Source data to summarize
-    recent : int
-        how many data points to go back for goal data
-    var_recent : int
-        how many data points to go back for actual data
-    agg : string
-        Aggregation level.  Values can be date, week_start, month, and year
-    kind : string
-        Exercise type.  Values can be move, exercise, or stand
-    '''
-    # pull totals
-    if agg == 'week_start':
-        activity = agg_week(df)
-    elif agg == 'month':
-        activity = agg_month(df)
-    elif agg == 'year':
-        activity = agg_year(df)
-    elif agg == 'date':
-        activity = agg_day(df)
-    else:
-        print('Invalid aggregate.  Defaulting to year view.')
-        activity = agg_day(df)
-
-    # check df length
-    recent = check_data_limit(df, recent)
-    # var_recent = check_data_limit(df, var_recent)
-
-    # plot (for testing purposes)
-    if kind == 'move':
-        # energy
-        # create energy line graph with actual/goal
-        energy_goal = activity[['date', 'energy_burned',
-                                'energy_burned_goal']]
-        graph = energy_goal.tail(recent)
-        
-    elif kind == 'exercise':
-        # exercise
-        # create exercise line graph with actual/goal
-        exercise_goal = activity[['date', 'exercise_time',
-                                  'exercise_time_goal']]
-        graph = exercise_goal.tail(recent)
-
-    elif kind == 'stand':
-        # stand
-        # create stand line graph with actual/goal
-        stand_goal = activity[['date', 'stand_hours', 'stand_hours_goal']]
-        graph = stand_goal.tail(recent)
-
-    else:
-        d = {'Error': ['No data']}
-        graph = pd.DataFrame(data=d)
-
-    return graph
-
-def agg_day(df):
+        graphs: list
+            [agg, kind, recent] of each graph, as for workout_trend
     '''
-    returns df with daily goal difference and variance%
-    (Requirements 3.4.1.1 and 3.4.2.1)
-    '''
-    df = calc_var(df)
-    return df
+    user_id = graph_user_id()
+    specs = batch_request()
 
+    def render():
+        return batch_json(specs, workout_graphs(user_id, specs))
 
-def agg_week(df):
-    '''
-    returns df with weekly totals, calculates goal differance and variance
-    (Requirements 3.4.1.2 and 3.4.2.2)
-    '''
-    df['week_start'] = (df['date'] - pd.to_timedelta
-                        (df['date'].dt.dayofweek, unit='d'))
-    df = df.groupby(['week_start'], as_index=False).sum()
-    df = calc_var(df)
-    df['date'] = df['week_start']
-    return df
+    return graph_response('workout_batch', user_id, specs, render)
 
 
-def agg_month(df):
+def workout_graph(user_id, recent, agg, kind, period=None, by=None):
     '''
-    returns df with monthly totals, calculates goal differance and variance
-    (Requirements 3.4.1.3 and 3.4.2.3)
-    '''
-    # modify date to be first date of month
-    df['month'] = pd.to_datetime(df['date'].dt.strftime('%Y-%m') + '-01')
-    df = df.groupby(['month'], as_index=False).sum()
-    df = calc_var(df)
-    df['date'] = df['month']
-    return df
-
+    Returns the last `recent` data points of a user's workout totals
+    (Requirements 3.4.1 and 3.4.2)
 
-def agg_year(df):
-    '''
-    returns df with yearly totals, calculates goal differance and variance
-    (Requirements 3.4.1.4 and 3.4.2.4)
+    Parameters
+    ----------
+    user_id : int
+        user id to graph
+    recent : int
+        how many data points to go back
+    agg : string
+        Aggregation level.  Values can be date, week_start, month, and year
+    kind : string
+        Workout total.  Values can be move (energy), exercise (duration),
+        or distance
+    period : (date, date), optional
+        Date range to read, see aggregate.current_period
+    by : string, optional
+        activity or gadget, one row per bucket and value of that column
     '''
-    # modify date to be January 1st of year
-    df['year'] = pd.to_datetime(df['date'].dt.strftime('%Y') + '-01-01')
-    df = df.groupby(['year'], as_index=False).sum()
-    df = calc_var(df)
-    df['date'] = df['year']
-    return df
+    return metrics.graph(WORKOUT, user_id, recent, agg, kind, period, by)
 
 
-def calc_var(df):
+def workout_graphs(user_id, specs):
     '''
-    calculates variances for aggregated dataframes
-    (Requirements 3.4.1 and 3.4.2)
-    '''
-    df['energy_var#'] = df['energy_burned'] - df['energy_burned_goal']
-    df['energy_var%'] = ((df['energy_burned'] - df['energy_burned_goal']) /
-                         df['energy_burned_goal'])
-    df['exercise_var#'] = df['exercise_time'] - df['exercise_time_goal']
-    df['exercise_var%'] = ((df['exercise_time'] - df['exercise_time_goal'])
-                           / df['exercise_time_goal'])
-    df['stand_var#'] = df['stand_hours'] - df['stand_hours_goal']
-    df['stand_var%'] = ((df['stand_hours'] - df['stand_hours_goal']) /
-                        df['stand_hours_goal'])
-    return df
-
-
-def check_data_limit(df, data_size):
-    '''
-    used to check if size specified is supported by data
-
-    returns
-    -------
-    original data limit if acceptable, dataframe count if not
+    Returns the workout graph of every (agg, kind, recent) spec, see
+    metrics.graphs
     '''
-    if data_size > len(df.index):
-        data_size = len(df.index)
-    return data_size
+    return metrics.graphs(WORKOUT, user_id, specs)
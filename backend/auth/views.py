@@ -1,9 +1,10 @@
-from flask import render_template, redirect, request, url_for, flash, jsonify
+from flask import render_template, redirect, request, url_for, flash, jsonify, \
+    current_app
 # from flask_login import login_user, login_required, logout_user, current_user
 from . import auth
 from ..models import User, AppleParser
 from .forms import LoginForm, RegistrationForm
-from .. import db
+from .. import db, identity_cache, job_queue
 
 
 @auth.route('/login', methods=['POST'])
@@ -12,9 +13,13 @@ def login():
     email = data['email']
     password = data['password']
 
-    user = User.query.filter_by(email=email).first()
+    user = User.lookup(email)
     if user is not None and user.verify_password(password):
-        return jsonify(registered=True, username=user.username)
+        # the token replaces email and password on later API calls
+        expiration = current_app.config.get('AUTH_TOKEN_TTL', 3600)
+        return jsonify(registered=True, username=user.username,
+                       token=user.generate_auth_token(expiration),
+                       expiration=expiration)
     return jsonify(registered=False, username='')
 
 
@@ -35,6 +40,7 @@ def register():
             if existing_user is None:
                 db.session.add(user)
                 db.session.commit()  # TODO: this is crashing
+                identity_cache.invalidate(email)
                 return jsonify(registered=True, username=user.username)
             else:
                 return jsonify(registered=False, username='User already exists')
@@ -54,7 +60,7 @@ def process_file():
 
     # take email and password, and return user id
     email = request.values.get('email')
-    user = User.query.filter_by(email=email).first()
+    user = User.lookup(email)
 
     if user is not None:
         user_id = user.id
@@ -66,6 +72,10 @@ def process_file():
     if user_id is not None:
         parser = AppleParser(file, user_id)
         if file and parser.allowed_file(file.filename):
+            if current_app.config.get('ASYNC_UPLOADS', True):
+                # parse in the background, poll /api/v1/jobs/<job_id>
+                job_id = job_queue.submit(file, user_id)
+                return jsonify({'status': 'Queued', 'job_id': job_id})
             parser.parse_activity()
             return jsonify({'status': 'Database updated'})
     else:
@@ -0,0 +1,409 @@
+'''
+Response cache for the graph endpoints.  Entries are keyed on the request
+parameters plus the user's data_version, which AppleParser bumps after every
+load, so an upload makes the user's old entries unreachable and they age out
+through the LRU/TTL bounds instead of being deleted one by one.
+
+Config
+------
+GRAPH_CACHE_BACKEND : memory (default), filesystem, sqlite or none
+GRAPH_CACHE_SIZE : maximum number of entries, defaults to 4096
+GRAPH_CACHE_BYTES : maximum total size of the memory backend, defaults to
+    64 MB
+GRAPH_CACHE_TTL : seconds an entry stays valid, defaults to 3600
+GRAPH_CACHE_PATH : directory (filesystem) or file (sqlite) of the shared
+    backends, defaults to <UPLOAD_FOLDER>/graph_cache[.sqlite]
+GRAPH_VERSION_PATH : SQLite file the users' data_version is shared in by the
+    processes of the host, defaults to <UPLOAD_FOLDER>/graph_versions.sqlite
+GRAPH_VERSION_TTL : seconds a user's data_version is reused without reading
+    that file, defaults to 2.  Bumps in this process are seen at once, other
+    processes see them within the TTL.  0 reads it every request.
+'''
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import time
+
+
+class MemoryBackend():
+    '''
+    In-process LRU bounded by entry count and total size
+    '''
+    def __init__(self, max_entries=4096, max_bytes=64 << 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        '''
+        Returns (expires, value) or None, marking the entry as recently used
+        '''
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires):
+        '''
+        Stores value and returns the number of entries evicted for room
+        '''
+        evicted = 0
+        with self.lock:
+            self.delete_entry(key)
+            self.entries[key] = (expires, value)
+            self.size += len(value)
+            while self.entries and (len(self.entries) > self.max_entries or
+                                    self.size > self.max_bytes):
+                self.delete_entry(next(iter(self.entries)))
+                evicted += 1
+        return evicted
+
+    def delete(self, key):
+        with self.lock:
+            self.delete_entry(key)
+
+    def delete_entry(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class FileSystemBackend():
+    '''
+    One file per entry in a directory shared by all processes, the least
+    recently read files are removed beyond max_entries, down to 7/8 of it.
+    The directory is only listed once this process' estimate of the entries
+    crosses the bound, or after max_entries / 8 writes to notice the other
+    processes' ones.
+    '''
+    def __init__(self, directory, max_entries=4096):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.scan_every = max(1, max_entries // 8)
+        # entries at the last listing plus the files added since, None
+        # before the first listing
+        self.entries = None
+        self.writes = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        try:
+            with open(self.path(key), 'rb') as f:
+                expires = float(f.readline())
+                value = f.read().decode('utf-8')
+            # the modification time tracks use for the LRU
+            os.utime(self.path(key))
+        except (OSError, ValueError):
+            # also when another process evicted the file meanwhile
+            return None
+        return expires, value
+
+    def set(self, key, value, expires):
+        added = not os.path.exists(self.path(key))
+        # write and rename, readers never see half a file
+        temp = self.path(key) + '.%d.tmp' % threading.get_ident()
+        with open(temp, 'wb') as f:
+            f.write(b'%r\n' % expires)
+            f.write(value.encode('utf-8'))
+        os.replace(temp, self.path(key))
+        with self.lock:
+            self.writes += 1
+            if self.entries is not None:
+                self.entries += added
+            scan = self.entries is None or \
+                self.entries > self.max_entries or \
+                self.writes >= self.scan_every
+            if scan:
+                self.writes = 0
+        return self.evict() if scan else 0
+
+    def evict(self):
+        entries = [entry for entry in os.scandir(self.directory)
+                   if not entry.name.endswith('.tmp')]
+        excess = 0
+        if len(entries) > self.max_entries:
+            excess = min(len(entries),
+                         len(entries) - self.max_entries + self.scan_every)
+            entries.sort(key=self.used)
+            for entry in entries[:excess]:
+                self.delete(entry.name)
+        with self.lock:
+            self.entries = len(entries) - excess
+        return excess
+
+    @staticmethod
+    def used(entry):
+        try:
+            return entry.stat().st_mtime
+        except OSError:
+            return 0
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            self.delete(name)
+        with self.lock:
+            self.entries = 0
+
+    def __len__(self):
+        return sum(not name.endswith('.tmp')
+                   for name in os.listdir(self.directory))
+
+
+class SQLiteBackend():
+    '''
+    Entries in a local SQLite file shared by all processes
+    '''
+    def __init__(self, path, max_entries=4096):
+        self.path = path
+        self.max_entries = max_entries
+        with self.connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS graph_cache ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                         'expires REAL NOT NULL, used REAL NOT NULL)')
+
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        with self.connect() as conn:
+            row = conn.execute('SELECT expires, value FROM graph_cache '
+                               'WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE graph_cache SET used = ? WHERE key = ?',
+                             (time(), key))
+        return row
+
+    def set(self, key, value, expires):
+        with self.connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO graph_cache '
+                         '(key, value, expires, used) VALUES (?, ?, ?, ?)',
+                         (key, value, expires, time()))
+            return conn.execute(
+                'DELETE FROM graph_cache WHERE key IN (SELECT key FROM '
+                'graph_cache ORDER BY used DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)).rowcount
+
+    def delete(self, key):
+        with self.connect() as conn:
+            conn.execute('DELETE FROM graph_cache WHERE key = ?', (key,))
+
+    def clear(self):
+        with self.connect() as conn:
+            conn.execute('DELETE FROM graph_cache')
+
+    def __len__(self):
+        with self.connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM graph_cache').\
+                fetchone()[0]
+
+
+class VersionStore():
+    '''
+    The users' data_version in a SQLite file shared by all processes, which
+    every bump writes into, with a short lived in-process copy in front.
+    Conditional requests are answered without querying the users table,
+    only users the file doesn't know yet are loaded from it.
+    '''
+    def __init__(self, path=None, ttl=2.0, max_entries=4096):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.versions = OrderedDict()
+        self.lock = threading.Lock()
+        if path is not None:
+            with self.connect() as conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS graph_versions ('
+                             'user_id INTEGER PRIMARY KEY, '
+                             'version INTEGER NOT NULL)')
+
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, user_id, load):
+        '''
+        Returns the user's version, calling load(user_id) when the shared
+        file doesn't have it
+        '''
+        now = time()
+        with self.lock:
+            entry = self.versions.get(user_id)
+            if entry is not None and entry[1] > now:
+                self.versions.move_to_end(user_id)
+                return entry[0]
+        version = self.shared(user_id)
+        if version is None:
+            version = load(user_id)
+            if version is not None and self.path is not None:
+                # a bump that raced the load has already written the newer
+                # version, keep that one
+                with self.connect() as conn:
+                    conn.execute('INSERT OR IGNORE INTO graph_versions '
+                                 '(user_id, version) VALUES (?, ?)',
+                                 (user_id, version))
+        self.remember(user_id, version, now)
+        return version
+
+    def shared(self, user_id):
+        if self.path is None:
+            return None
+        with self.connect() as conn:
+            row = conn.execute('SELECT version FROM graph_versions '
+                               'WHERE user_id = ?', (user_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def remember(self, user_id, version, now):
+        with self.lock:
+            self.versions[user_id] = (version, now + self.ttl)
+            self.versions.move_to_end(user_id)
+            while len(self.versions) > self.max_entries:
+                self.versions.popitem(last=False)
+
+    def set(self, user_id, version):
+        '''
+        Records a bumped version, for this process at once and for the
+        others within the TTL
+        '''
+        if self.path is not None:
+            with self.connect() as conn:
+                conn.execute('INSERT OR REPLACE INTO graph_versions '
+                             '(user_id, version) VALUES (?, ?)',
+                             (user_id, version))
+        self.remember(user_id, version, time())
+
+
+class GraphCache():
+    '''
+    TTL cache of rendered graph responses on top of one of the backends,
+    with hit/miss/eviction counters for this process
+    '''
+    COUNTERS = ('hits', 'misses', 'sets', 'evictions', 'expirations')
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 3600
+        self.versions = VersionStore()
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        name = config.get('GRAPH_CACHE_BACKEND', 'memory')
+        size = config.get('GRAPH_CACHE_SIZE', 4096)
+        self.ttl = config.get('GRAPH_CACHE_TTL', 3600)
+        self.versions = VersionStore(
+            config.get('GRAPH_VERSION_PATH') or os.path.join(
+                config['UPLOAD_FOLDER'], 'graph_versions.sqlite'),
+            config.get('GRAPH_VERSION_TTL', 2.0), size)
+        default_path = os.path.join(config['UPLOAD_FOLDER'], 'graph_cache')
+        if name == 'memory':
+            self.backend = MemoryBackend(
+                size, config.get('GRAPH_CACHE_BYTES', 64 << 20))
+        elif name == 'filesystem':
+            self.backend = FileSystemBackend(
+                config.get('GRAPH_CACHE_PATH') or default_path, size)
+        elif name == 'sqlite':
+            self.backend = SQLiteBackend(
+                config.get('GRAPH_CACHE_PATH') or default_path + '.sqlite',
+                size)
+        elif name == 'none':
+            self.backend = None
+        else:
+            raise ValueError('Unknown graph cache backend: %r' % name)
+
+    @staticmethod
+    def key(*parts):
+        '''
+        Fixed length key for any tuple of request parameters
+        '''
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def count(self, counter, n=1):
+        with self.lock:
+            self.counters[counter] += n
+
+    def get(self, key):
+        if self.backend is None:
+            return None
+        entry = self.backend.get(key)
+        if entry is None:
+            self.count('misses')
+            return None
+        expires, value = entry
+        if expires < time():
+            self.backend.delete(key)
+            self.count('expirations')
+            self.count('misses')
+            return None
+        self.count('hits')
+        return value
+
+    def set(self, key, value):
+        if self.backend is None:
+            return
+        evicted = self.backend.set(key, value, time() + self.ttl)
+        self.count('sets')
+        if evicted:
+            self.count('evictions', evicted)
+
+    def fetch(self, key, render):
+        '''
+        Returns the cached value of key, or renders, stores and returns it
+        '''
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else None
+        if self.backend is None:
+            stats.update(entries=0, backend=None)
+        else:
+            stats.update(entries=len(self.backend),
+                         backend=type(self.backend).__name__)
+        return stats
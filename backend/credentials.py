@@ -0,0 +1,123 @@
+'''
+Cache of recently verified passwords, so clients polling with basic auth
+don't pay for a PBKDF2 check (werkzeug's check_password_hash) on every
+request.  Entries are keyed on an HMAC of (email, password, password_hash)
+under a random per-process key, no password is ever kept.  The stored hash
+is part of the key, so a password change makes old entries unreachable in
+every process, the process changing it also drops them at once.  Only
+successful checks are cached, wrong passwords always pay the full cost.
+
+Config
+------
+AUTH_CACHE : cache verified passwords, defaults to True
+AUTH_CACHE_SIZE : maximum number of entries, defaults to 1024
+AUTH_CACHE_TTL : seconds a verified password is trusted, defaults to 300
+'''
+
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+from time import time
+
+
+class CredentialCache():
+    '''
+    In-process LRU of verified credentials with a TTL, with hit/miss/
+    eviction counters for this process
+    '''
+    COUNTERS = ('hits', 'misses', 'sets', 'evictions', 'expirations',
+                'invalidations')
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.ttl = 300
+        self.max_entries = 1024
+        self.secret = os.urandom(32)
+        # key -> (email, expires)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('AUTH_CACHE', True)
+        self.ttl = config.get('AUTH_CACHE_TTL', 300)
+        self.max_entries = config.get('AUTH_CACHE_SIZE', 1024)
+        self.clear()
+
+    def key(self, email, password, password_hash):
+        parts = (email or '', password, password_hash or '')
+        message = '\0'.join(parts).encode('utf-8')
+        return hmac.new(self.secret, message, hashlib.sha256).digest()
+
+    def verify(self, email, password, password_hash, check):
+        '''
+        Checks a password, answering from the cache when the same
+        credentials were verified within the TTL
+
+        Parameters
+        ----------
+        email : str
+            Email of the user
+        password : str
+            Password to check
+        password_hash : str
+            The user's stored hash
+        check : function
+            check(password_hash, password), the uncached check
+
+        Returns
+        -------
+            True if the password matches
+        '''
+        if not self.enabled or password_hash is None:
+            return check(password_hash, password)
+        key = self.key(email, password, password_hash)
+        now = time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self.entries.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return True
+                del self.entries[key]
+                self.counters['expirations'] += 1
+            self.counters['misses'] += 1
+        if not check(password_hash, password):
+            return False
+        with self.lock:
+            self.entries[key] = (email, now + self.ttl)
+            self.counters['sets'] += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+        return True
+
+    def invalidate(self, email):
+        '''
+        Drops every verified password of a user, after a password change
+        '''
+        with self.lock:
+            keys = [key for key, (owner, _) in self.entries.items()
+                    if owner == email]
+            for key in keys:
+                del self.entries[key]
+            self.counters['invalidations'] += len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self.entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else None
+        stats['enabled'] = self.enabled
+        return stats
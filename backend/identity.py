@@ -0,0 +1,199 @@
+'''
+In-process cache of user identities (id, email, username and password
+hash), so the endpoints resolving an email or id to a user don't query the
+users table on every request.  Registrations and password changes in this
+process invalidate at once, other processes see them within the TTL.
+Unknown emails are not cached, a registration elsewhere is seen at once.
+
+Config
+------
+IDENTITY_CACHE : cache identities, defaults to True
+IDENTITY_CACHE_SIZE : maximum number of users, defaults to 4096
+IDENTITY_CACHE_TTL : seconds an identity is reused without asking the
+    database, defaults to 60
+'''
+
+import threading
+from collections import OrderedDict, namedtuple
+from time import time
+
+
+Identity = namedtuple('Identity', ['id', 'email', 'username',
+                                   'password_hash'])
+
+
+class IdentityCache():
+    '''
+    LRU of identities by email with a TTL and an index by id, with
+    hit/miss/eviction counters for this process
+    '''
+    COUNTERS = ('hits', 'misses', 'evictions', 'expirations',
+                'invalidations')
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.ttl = 60
+        self.max_entries = 4096
+        # email -> (identity, expires)
+        self.entries = OrderedDict()
+        # id -> email
+        self.emails = {}
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('IDENTITY_CACHE', True)
+        self.ttl = config.get('IDENTITY_CACHE_TTL', 60)
+        self.max_entries = config.get('IDENTITY_CACHE_SIZE', 4096)
+        self.clear()
+
+    def cached(self, email, now):
+        '''
+        Identity of email if cached and fresh, counting the lookup.  Call
+        with the lock held.
+        '''
+        entry = self.entries.get(email)
+        if entry is not None:
+            if entry[1] > now:
+                self.entries.move_to_end(email)
+                self.counters['hits'] += 1
+                return entry[0]
+            self.remove(email)
+            self.counters['expirations'] += 1
+        self.counters['misses'] += 1
+        return None
+
+    def store(self, identity, now):
+        '''
+        Adds an identity, evicting the least recently used beyond
+        max_entries.  Call with the lock held.
+        '''
+        self.remove(identity.email)
+        old = self.emails.get(identity.id)
+        if old is not None:
+            self.remove(old)
+        self.entries[identity.email] = (identity, now + self.ttl)
+        self.emails[identity.id] = identity.email
+        while len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+            self.counters['evictions'] += 1
+
+    def remove(self, email):
+        entry = self.entries.pop(email, None)
+        if entry is not None:
+            self.emails.pop(entry[0].id, None)
+        return entry is not None
+
+    def get(self, email, load):
+        '''
+        Identity of an email, calling load(email) on a miss
+
+        Parameters
+        ----------
+        email : str
+            Email to resolve
+        load : function
+            load(email) returning an Identity or None
+
+        Returns
+        -------
+            Identity or None for unknown emails
+        '''
+        if not self.enabled:
+            return load(email)
+        now = time()
+        with self.lock:
+            identity = self.cached(email, now)
+        if identity is not None:
+            return identity
+        identity = load(email)
+        if identity is not None:
+            with self.lock:
+                self.store(identity, now)
+        return identity
+
+    def get_id(self, user_id, load):
+        '''
+        Identity of a user id, calling load(user_id) on a miss
+        '''
+        if not self.enabled:
+            return load(user_id)
+        now = time()
+        with self.lock:
+            email = self.emails.get(user_id)
+            identity = self.cached(email, now) if email is not None \
+                else None
+            if email is None:
+                self.counters['misses'] += 1
+        if identity is not None:
+            return identity
+        identity = load(user_id)
+        if identity is not None:
+            with self.lock:
+                self.store(identity, now)
+        return identity
+
+    def get_many(self, emails, load_many):
+        '''
+        Identities of several emails, with one load_many(emails) call for
+        all the missing ones
+
+        Parameters
+        ----------
+        emails : list of str
+            Emails to resolve
+        load_many : function
+            load_many(emails) returning a list of the Identities found
+
+        Returns
+        -------
+            {email: Identity or None}
+        '''
+        found = {}
+        missing = []
+        now = time()
+        if self.enabled:
+            with self.lock:
+                for email in emails:
+                    identity = self.cached(email, now)
+                    if identity is None:
+                        missing.append(email)
+                    else:
+                        found[email] = identity
+        else:
+            missing = list(emails)
+        if missing:
+            loaded = load_many(missing)
+            if self.enabled:
+                with self.lock:
+                    for identity in loaded:
+                        self.store(identity, now)
+            found.update((identity.email, identity) for identity in loaded)
+        return {email: found.get(email) for email in emails}
+
+    def invalidate(self, email=None, user_id=None):
+        '''
+        Forgets a user by email or id, after a registration or a change
+        '''
+        with self.lock:
+            if email is None:
+                email = self.emails.get(user_id)
+            if email is not None and self.remove(email):
+                self.counters['invalidations'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.emails.clear()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self.entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else None
+        stats['enabled'] = self.enabled
+        return stats
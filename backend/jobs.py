@@ -0,0 +1,260 @@
+'''
+Background processing of uploads.  Jobs are queued in a local SQLite file so
+no external broker is needed, and a pool of worker threads in each web
+process runs AppleParser on them while recording stage, progress and
+timings for the /api/v1/jobs/<id> endpoint.
+
+Config
+------
+JOB_DATABASE : path of the queue, defaults to <UPLOAD_FOLDER>/jobs.sqlite
+JOB_WORKERS : worker threads per process, defaults to 2
+JOB_LEASE : seconds without a heartbeat after which a running job counts as
+    lost (its worker crashed or restarted) and is failed, defaults to 300
+'''
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from time import time
+
+
+# seconds an idle worker waits before checking the queue again, jobs queued
+# by other processes are only seen on this poll
+POLL_INTERVAL = 2.0
+# bytes of export.xml read between two progress updates
+PROGRESS_STEP = 16 << 20
+# seconds between two heartbeats of a running job, well below JOB_LEASE
+HEARTBEAT_INTERVAL = 30.0
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress_bytes INTEGER NOT NULL DEFAULT 0,
+    total_bytes INTEGER,
+    rows_loaded INTEGER NOT NULL DEFAULT 0,
+    timings TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+'''
+FIELDS = ('id', 'user_id', 'status', 'stage', 'progress_bytes', 'total_bytes',
+          'rows_loaded', 'timings', 'error', 'created_at', 'updated_at')
+
+
+class JobQueue():
+    '''
+    SQLite backed queue of upload parse jobs with a worker thread pool
+    '''
+    def __init__(self, app=None):
+        self.app = None
+        self.path = None
+        self.lease = 300
+        self.folder = None
+        self.workers = []
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        upload_folder = app.config['UPLOAD_FOLDER']
+        self.folder = os.path.join(upload_folder, 'jobs')
+        os.makedirs(self.folder, exist_ok=True)
+        self.path = app.config.get('JOB_DATABASE') or \
+            os.path.join(upload_folder, 'jobs.sqlite')
+        self.lease = app.config.get('JOB_LEASE', 300)
+        with self.connect() as conn:
+            conn.execute(SCHEMA)
+            self.fail_lost(conn)
+
+    @contextmanager
+    def connect(self):
+        # autocommit, transactions are opened explicitly where needed
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, file, user_id):
+        '''
+        Stores an uploaded export.zip and queues it for parsing
+
+        Parameters
+        ----------
+        file : FileStorage
+            The uploaded file
+        user_id : int
+            Owner of the data
+
+        Returns
+        -------
+        job_id : str
+        '''
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.folder, job_id + '.zip')
+        file.save(path)
+        return self.enqueue(user_id, path, job_id)
+
+    def enqueue(self, user_id, path, job_id=None):
+        '''
+        Queues an export.zip already stored at path
+        '''
+        job_id = job_id or uuid.uuid4().hex
+        now = time()
+        with self.connect() as conn:
+            conn.execute('INSERT INTO jobs (id, user_id, path, status, stage, '
+                         'created_at, updated_at) '
+                         "VALUES (?, ?, ?, 'queued', 'queued', ?, ?)",
+                         (job_id, user_id, path, now, now))
+        self.start_workers()
+        self.wake.set()
+        return job_id
+
+    def get(self, job_id):
+        '''
+        Returns the job as a dict, or None if it does not exist
+        '''
+        with self.connect() as conn:
+            row = conn.execute('SELECT %s FROM jobs WHERE id = ?'
+                               % ', '.join(FIELDS), (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['timings'] = json.loads(job['timings'] or '{}')
+        return job
+
+    def update(self, job_id, **fields):
+        if 'timings' in fields:
+            fields['timings'] = json.dumps(fields['timings'])
+        fields['updated_at'] = time()
+        with self.connect() as conn:
+            conn.execute('UPDATE jobs SET %s WHERE id = ?'
+                         % ', '.join('%s = ?' % name for name in fields),
+                         list(fields.values()) + [job_id])
+
+    def fail_lost(self, conn):
+        '''
+        Fails running jobs without a heartbeat for longer than JOB_LEASE,
+        their worker is gone and they would block the user's later jobs.
+        They are not retried, a job that crashed its worker would do so
+        again; the user uploads again.
+        '''
+        now = time()
+        lost = conn.execute("SELECT id, path FROM jobs WHERE status = "
+                            "'running' AND updated_at < ?",
+                            (now - self.lease,)).fetchall()
+        for row in lost:
+            conn.execute("UPDATE jobs SET status = 'failed', error = ?, "
+                         "updated_at = ? WHERE id = ? AND status = 'running'",
+                         ('worker lost', now, row['id']))
+            if os.path.exists(row['path']):
+                os.remove(row['path'])
+
+    def claim(self):
+        '''
+        Marks the oldest queued job as running and returns it.  Jobs of a user
+        that already has a running job wait, so one user's imports never
+        overlap.  Lost jobs are failed first, see fail_lost.
+        '''
+        with self.connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            self.fail_lost(conn)
+            row = conn.execute(
+                "SELECT id, user_id, path FROM jobs WHERE status = 'queued' "
+                'AND user_id NOT IN '
+                "(SELECT user_id FROM jobs WHERE status = 'running') "
+                'ORDER BY created_at LIMIT 1').fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', "
+                             "stage = 'starting', updated_at = ? WHERE id = ?",
+                             (time(), row['id']))
+            conn.execute('COMMIT')
+        return dict(row) if row is not None else None
+
+    def start_workers(self):
+        with self.lock:
+            self.workers = [worker for worker in self.workers
+                            if worker.is_alive()]
+            for _ in range(self.app.config.get('JOB_WORKERS', 2) -
+                           len(self.workers)):
+                worker = threading.Thread(target=self.work, daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def work(self):
+        while True:
+            job = self.claim()
+            if job is None:
+                self.wake.wait(POLL_INTERVAL)
+                self.wake.clear()
+                continue
+            self.run(job)
+
+    def run(self, job):
+        '''
+        Parses and loads one job inside an app context
+        '''
+        # imported here, models imports the package this queue lives in
+        from .models import AppleParser
+        from . import db
+
+        job_id = job['id']
+        stop = threading.Event()
+        threading.Thread(target=self.heartbeat, args=(job_id, stop),
+                         daemon=True).start()
+        with self.app.app_context():
+            parser = AppleParser(job['path'], job['user_id'])
+            parser.progress = lambda **fields: self.update(job_id, **fields)
+            try:
+                parser.parse_activity()
+            except Exception as e:
+                self.update(job_id, status='failed', error=repr(e),
+                            timings=parser.timings)
+            else:
+                self.update(job_id, status='done', stage='done',
+                            rows_loaded=sum(parser.rows_loaded.values()),
+                            timings=parser.timings)
+            finally:
+                stop.set()
+                db.session.remove()
+                if os.path.exists(job['path']):
+                    os.remove(job['path'])
+
+    def heartbeat(self, job_id, stop):
+        '''
+        Refreshes updated_at of a running job until stop is set, long stages
+        without progress reports (load, rollup) keep the job alive
+        '''
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            self.update(job_id)
+
+
+class ProgressReader():
+    '''
+    Wraps a file object and reports the number of bytes read so far
+    '''
+    def __init__(self, file, callback, step=PROGRESS_STEP):
+        self.file = file
+        self.callback = callback
+        self.step = step
+        self.bytes_read = 0
+        self.reported = 0
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.bytes_read += len(data)
+        if not data or self.bytes_read - self.reported >= self.step:
+            self.reported = self.bytes_read
+            self.callback(self.bytes_read)
+        return data
@@ -0,0 +1,138 @@
+'''
+Bulk loading of parsed tables into the database.  Each dialect gets its
+fastest path: COPY FROM STDIN on PostgreSQL, one tuned executemany
+transaction on SQLite and a plain executemany transaction elsewhere.
+'''
+
+import io
+from pandas.api.types import is_datetime64_any_dtype
+
+from . import db
+
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def bulk_insert(model, df, batch_size=None, engine=None):
+    '''
+    Appends the rows of df to the table of model
+
+    Parameters
+    ----------
+    model : db.Model
+        Target table (ActivityData, WorkoutData, ExerciseTime, HeartRate)
+    df : dataframe
+        Rows to insert, columns that are not in the table are ignored
+    batch_size : int, optional
+        Rows sent to the database per executemany/COPY call
+    engine : sqlalchemy engine, optional
+        Defaults to the app's engine
+
+    Returns
+    -------
+    rows : int
+        Number of rows inserted
+    '''
+    if df.empty:
+        return 0
+    engine = engine or db.engine
+    table = model.__table__
+    df = df[[column for column in df.columns if column in table.c]]
+    loader = LOADERS.get(engine.dialect.name, load_executemany)
+    loader(engine, table, df, batch_size or DEFAULT_BATCH_SIZE)
+    return len(df.index)
+
+
+def load_postgresql(engine, table, df, batch_size):
+    '''
+    COPY FROM STDIN in csv format, one COPY per batch in a single transaction
+    '''
+    quote = engine.dialect.identifier_preparer.quote
+    sql = 'COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (
+        quote(table.name), ', '.join(quote(column) for column in df.columns))
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        for batch in batches(df, batch_size):
+            buf = io.StringIO()
+            # missing values are written unquoted and empty, which COPY reads as NULL
+            batch.to_csv(buf, header=False, index=False)
+            buf.seek(0)
+            cursor.copy_expert(sql, buf)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def load_sqlite(engine, table, df, batch_size):
+    '''
+    sqlite3 executemany inside one transaction with fsync turned off for
+    the load
+    '''
+    conn = engine.raw_connection()
+    cursor = conn.cursor()
+    synchronous = cursor.execute('PRAGMA synchronous').fetchone()[0]
+    cursor.execute('PRAGMA synchronous = OFF')
+    cursor.execute('PRAGMA temp_store = MEMORY')
+    # negative cache size is in KiB
+    cursor.execute('PRAGMA cache_size = -65536')
+    try:
+        insert_batches(engine, cursor, table, df, batch_size)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute('PRAGMA synchronous = %d' % synchronous)
+        conn.close()
+
+
+def load_executemany(engine, table, df, batch_size):
+    '''
+    Generic fallback: SQLAlchemy executemany inside one transaction
+    '''
+    columns = list(df.columns)
+    with engine.begin() as conn:
+        for batch in batches(df, batch_size):
+            conn.execute(table.insert(), [dict(zip(columns, row))
+                                          for row in records(batch)])
+
+
+def insert_batches(engine, cursor, table, df, batch_size):
+    quote = engine.dialect.identifier_preparer.quote
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        quote(table.name), ', '.join(quote(column) for column in df.columns),
+        ', '.join(['?'] * len(df.columns)))
+    for batch in batches(df, batch_size):
+        cursor.executemany(sql, records(batch))
+
+
+def batches(df, batch_size):
+    for start in range(0, len(df.index), batch_size):
+        yield df.iloc[start:start + batch_size]
+
+
+def records(df):
+    '''
+    Converts a dataframe into DB-API parameter tuples: numpy scalars become
+    Python numbers, timestamps become datetimes and NaN/NaT become None
+    '''
+    columns = []
+    for column in df.columns:
+        series = df[column]
+        if is_datetime64_any_dtype(series):
+            values = series.dt.to_pydatetime()
+        else:
+            values = series.astype(object).to_numpy()
+        values[series.isna().to_numpy()] = None
+        columns.append(values)
+    return list(zip(*columns))
+
+
+LOADERS = {
+    'postgresql': load_postgresql,
+    'sqlite': load_sqlite,
+}
@@ -5,21 +5,33 @@ parse the XML data uploaded from user's phones.
 
 import os
 import zipfile, tempfile
+from contextlib import contextmanager
 from datetime import datetime
 from time import time
 import hashlib
 import shutil
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
-import xml.etree.ElementTree as ET
-from flask import current_app, request, url_for
+from itsdangerous import BadSignature, \
+    TimedJSONWebSignatureSerializer as Serializer
+from flask import current_app, has_app_context, request, url_for
 from flask_login import UserMixin, AnonymousUserMixin
 import numpy as np
 import pandas as pd
+from sqlalchemy import func
 
 from backend.exceptions import ValidationError
-from . import db, login_manager
+from backend.jobs import ProgressReader
+from backend.loader import bulk_insert
+from backend.parsing import EXPORT_SPECS, extract, extract_parallel, \
+    to_frames
+from backend.identity import Identity
+from . import credential_cache, db, graph_cache, identity_cache, \
+    login_manager
+
+
+# location of the health data inside Apple's export.zip
+EXPORT_XML = 'apple_health_export/export.xml'
 
 
 class User(UserMixin, db.Model):
@@ -31,6 +43,9 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(64), unique=True, index=True)
     username = db.Column(db.String(64), unique=True, index=True)
     password_hash = db.Column(db.String(128))
+    # bumped after each upload, cached graphs are keyed on it
+    data_version = db.Column(db.Integer, nullable=False, default=0,
+                             server_default='0')
 
     @property
     def password(self):
@@ -39,20 +54,149 @@ class User(UserMixin, db.Model):
     @password.setter
     def password(self, password):
         self.password_hash = generate_password_hash(password)
+        # the old hash is part of the cache key already, this frees them
+        credential_cache.invalidate(self.email)
+        identity_cache.invalidate(self.email)
 
     def verify_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        # recently verified passwords skip the PBKDF2 check, see
+        # backend.credentials
+        return credential_cache.verify(self.email, password,
+                                       self.password_hash, check_password_hash)
+
+    @classmethod
+    def load_identities(cls, *criteria):
+        '''
+        Identities of the users matching the filter criteria, read without
+        loading User objects
+        '''
+        rows = db.session.query(cls.id, cls.email, cls.username,
+                                cls.password_hash).filter(*criteria).all()
+        return [Identity(*row) for row in rows]
+
+    @classmethod
+    def from_identity(cls, identity):
+        '''
+        Transient User of a cached identity, enough to check a password
+        but not attached to the session
+        '''
+        if identity is None:
+            return None
+        return cls(id=identity.id, email=identity.email,
+                   username=identity.username,
+                   password_hash=identity.password_hash)
+
+    @classmethod
+    def lookup(cls, email):
+        '''
+        User of an email through the identity cache (see backend.identity),
+        None for unknown emails
+        '''
+        def load(email):
+            identities = cls.load_identities(cls.email==email)
+            return identities[0] if identities else None
+        return cls.from_identity(identity_cache.get(email, load))
+
+    @classmethod
+    def lookup_id(cls, user_id):
+        '''
+        User of an id through the identity cache, None for unknown ids
+        '''
+        def load(user_id):
+            identities = cls.load_identities(cls.id==user_id)
+            return identities[0] if identities else None
+        return cls.from_identity(identity_cache.get_id(user_id, load))
+
+    @classmethod
+    def lookup_many(cls, emails):
+        '''
+        {email: Identity or None} of several emails, with one query for
+        all those not cached
+        '''
+        return identity_cache.get_many(
+            emails, lambda emails: cls.load_identities(cls.email.in_(emails)))
+
+    @staticmethod
+    def token_serializer(expiration=None):
+        '''
+        Serializer of auth tokens.  AUTH_TOKEN_KEYS lists the signing keys
+        oldest first, tokens are signed with the last one and accepted with
+        any, so a new key is rolled out by appending it and the old one
+        retired (revoking its tokens) by removing it.  Defaults to
+        SECRET_KEY.
+        '''
+        config = current_app.config
+        keys = config.get('AUTH_TOKEN_KEYS') or [config['SECRET_KEY']]
+        return Serializer(list(keys), expires_in=expiration)
+
+    @classmethod
+    def load_data_version(cls, user_id):
+        return db.session.query(cls.data_version).\
+            filter(cls.id==user_id).scalar()
+
+    def generate_auth_token(self, expiration=None):
+        '''
+        Signed token carrying the user's id and username
+
+        Parameters
+        ----------
+        expiration : int, optional
+            Seconds until the token expires, defaults to AUTH_TOKEN_TTL
+            (3600)
+
+        Returns
+        -------
+        token : str
+        '''
+        if expiration is None:
+            expiration = current_app.config.get('AUTH_TOKEN_TTL', 3600)
+        s = self.token_serializer(expiration)
+        return s.dumps({'id': self.id, 'username': self.username}).\
+            decode('utf-8')
+
+    @classmethod
+    def verify_auth_token(cls, token):
+        '''
+        User of a valid, unexpired token, None otherwise.  Built from the
+        token's claims without a database query, so it is not attached to
+        the session.
+        '''
+        try:
+            data = cls.token_serializer().loads(token)
+        except BadSignature:
+            return None
+        return cls(id=data['id'], username=data['username'])
+
+    @classmethod
+    def bump_data_version(cls, user_id):
+        '''
+        Marks the user's data as changed, which retires every cached graph
+        of the user (see backend.cache)
+        '''
+        cls.query.filter_by(id=user_id).update(
+            {cls.data_version: cls.data_version + 1},
+            synchronize_session=False)
+        db.session.commit()
+        graph_cache.versions.set(user_id, cls.load_data_version(user_id))
 
     def __repr__(self):
         return '<User %r>' % self.username
 
 
+# The tables loaded from exports below are indexed on (user_id, date): graph
+# and metric queries read one user's date range, and AppleParser.db_load
+# deletes a user's rows from the high-water mark on before inserting.
+
+
 class ActivityData(db.Model):
     '''
     Contains activity data from Apple Watch
     (Requirements 3.2.2, 3.4.1, and 3.4.2)
     '''
     __tablename__ = 'activity_data'
+    __table_args__ = (
+        db.Index('ix_activity_data_user_id_date', 'user_id', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer)
     date = db.Column(db.Date)
@@ -74,6 +218,11 @@ class WorkoutData(db.Model):
     (Requirements 3.2.3, 3.2.5, 3.4.1, and 3.4.2)
     '''
     __tablename__ = 'workout_data'
+    __table_args__ = (
+        db.Index('ix_workout_data_user_id_date', 'user_id', 'date'),
+        db.Index('ix_workout_data_user_id_start_date', 'user_id',
+                 'start_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer)
     date = db.Column(db.Date)
@@ -98,6 +247,9 @@ class ExerciseTime(db.Model):
     (Requirements 3.2.1, 3.4.1, and 3.4.2)
     '''
     __tablename__ = 'exercise_time'
+    __table_args__ = (
+        db.Index('ix_exercise_time_user_id_date', 'user_id', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer)
     date = db.Column(db.Date)
@@ -115,6 +267,9 @@ class HeartRate(db.Model):
     (Requirements 3.2.4, 3.4.1, and 3.4.2)
     '''
     __tablename__ = 'heart_rate'
+    __table_args__ = (
+        db.Index('ix_heart_rate_user_id_date', 'user_id', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer)
     date = db.Column(db.Date)
@@ -127,6 +282,33 @@ class HeartRate(db.Model):
     last_updated_by = db.Column(db.String(32))
 
 
+class Rollup(db.Model):
+    '''
+    Graph totals per user, source table, aggregation level and metric,
+    maintained by AppleParser after each load (see backend.rollups)
+    '''
+    __tablename__ = 'rollups'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer)
+    source = db.Column(db.String(32))
+    agg = db.Column(db.String(10))
+    date = db.Column(db.Date)
+    metric = db.Column(db.String(32))
+    actual = db.Column(db.Float)
+    goal = db.Column(db.Float)
+    var_num = db.Column(db.Float)
+    var_pct = db.Column(db.Float)
+    # graphs read the newest buckets of one user/source/agg/metric
+    __table_args__ = (
+        db.Index('ix_rollups_user_id_source_agg_metric_date', 'user_id',
+                 'source', 'agg', 'metric', 'date'),
+    )
+
+
+# tables filled by AppleParser, in load order
+LOADED_MODELS = (ActivityData, WorkoutData, ExerciseTime, HeartRate)
+
+
 class AppleParser():
     '''
     contains functions for reading Apple's xml format for health data
@@ -135,21 +317,159 @@ class AppleParser():
     def __init__(self, file, user_id):
         self.file = file
         self.user_id = user_id
+        # seconds spent per stage of the last upload, see stage()
+        self.timings = {}
+        # {table: first date to import}, tables missing here are fully replaced
+        self.since = {}
+        # {table: rows inserted} of the last upload
+        self.rows_loaded = {}
+        # optional callback(**fields) receiving stage, progress_bytes,
+        # total_bytes and rows_loaded updates (see backend.jobs)
+        self.progress = None
 
     def parse_activity(self):
         '''
-        The full upload and parse process for placing user data in database
+        The full upload and parse process for placing user data in database.
+        Uses the streaming ingest unless STREAM_UPLOADS is turned off in config.
+        Parsed tables are handed to the loader in memory, csv files are only
+        written when EXPORT_CSV is set (for debugging).
+        '''
+        if self.config('IMPORT_MODE', 'incremental') == 'incremental':
+            with self.stage('plan'):
+                self.since = self.high_water_marks(self.user_id)
+        if self.config('STREAM_UPLOADS', True):
+            self.parse_activity_stream()
+            return
+        with self.stage('upload'):
+            filepath = self.upload_file(self.file)
+        with self.stage('unzip'):
+            self.unzip_file(filepath)
+        with self.stage('parse'):
+            frames = self.activity_summary(filepath)
+        self.load_frames(filepath, frames)
+
+    def parse_activity_stream(self):
+        '''
+        Streaming upload and parse process.  export.xml is read as a member
+        stream of the uploaded zip, so the archive is never saved or extracted
+        '''
+        filepath = self.upload_folder()
+        if self.config('PARSE_WORKERS', 1) > 1:
+            # workers seek into the file, so only export.xml is unpacked
+            with self.stage('unzip'):
+                export_path = self.extract_export(self.file, filepath)
+            with self.stage('parse'):
+                frames = self.activity_summary(filepath, export_path)
+        else:
+            with self.stage('parse'):
+                with self.open_export(self.file) as export:
+                    frames = self.activity_summary(filepath, self.track(export))
+        self.load_frames(filepath, frames)
+
+    def load_frames(self, filepath, frames):
         '''
-        print('Uploading file...')
-        filepath = self.upload_file(self.file)
-        print('Unzipping...')
-        self.unzip_file(filepath)
-        print('Creating csv data...')
-        self.create_csv_data(filepath)
-        print('Loading database...')
-        self.db_load_csv(self.user_id, filepath)
+        Final steps shared by both upload processes: optional csv export,
+        database load and removal of the upload folder
+        '''
+        if self.config('EXPORT_CSV', False):
+            with self.stage('csv'):
+                self.create_csv_data(filepath, frames)
+        with self.stage('load'):
+            self.db_load(self.user_id, frames)
+        with self.stage('rollup'):
+            self.update_rollups(self.user_id)
+        # only after the rollups, graphs cached in between would be stale
+        User.bump_data_version(self.user_id)
         print(f'Removing temp folder ({filepath})...')
         shutil.rmtree(filepath)
+        print('Stage times: ' + ', '.join(f'{name} {seconds:.2f}s'
+                                          for name, seconds in self.timings.items()))
+
+    @contextmanager
+    def stage(self, name):
+        '''
+        Times one stage of the upload process into self.timings
+        '''
+        print(f'Starting {name}...')
+        self.report(stage=name)
+        start = time()
+        try:
+            yield
+        finally:
+            self.timings[name] = time() - start
+            self.report(timings=self.timings)
+
+    def report(self, **fields):
+        '''
+        Passes progress to the progress callback, if there is one
+        '''
+        if self.progress is not None:
+            self.progress(**fields)
+
+    def track(self, export):
+        '''
+        Wraps the export.xml stream so bytes read are reported as progress
+        '''
+        if self.progress is None:
+            return export
+        return ProgressReader(export, lambda read: self.report(progress_bytes=read))
+
+    def open_export(self, file):
+        '''
+        Opens export.xml inside the uploaded zip as a read-only stream
+
+        Parameters
+        ----------
+        file : FileStorage, file-like object or str
+            The uploaded export.zip.  werkzeug spools large uploads to a
+            temp file, so the stream can be seeked to the zip directory.
+
+        Returns
+        -------
+        export : file-like object
+            Decompressing stream of export.xml
+        '''
+        stream = getattr(file, 'stream', file)
+        with zipfile.ZipFile(stream, 'r') as zip_ref:
+            name = self.export_member(zip_ref)
+            self.report(total_bytes=zip_ref.getinfo(name).file_size)
+            return zip_ref.open(name)
+
+    def extract_export(self, file, filepath):
+        '''
+        Extracts only export.xml from the uploaded zip into filepath
+
+        Returns
+        -------
+        export_path : str
+            Path of the extracted export.xml
+        '''
+        export_path = os.path.join(filepath, 'export.xml')
+        with self.open_export(file) as export, open(export_path, 'wb') as out:
+            shutil.copyfileobj(self.track(export), out, 1 << 20)
+        return export_path
+
+    def export_member(self, zip_ref):
+        '''
+        Finds the name of export.xml in the zip, which is usually nested in
+        the apple_health_export folder
+        '''
+        names = zip_ref.namelist()
+        if EXPORT_XML in names:
+            return EXPORT_XML
+        for name in names:
+            if name.rsplit('/', 1)[-1] == 'export.xml':
+                return name
+        raise ValidationError('export.xml not found in upload')
+
+    def config(self, key, default=None):
+        '''
+        Reads an app config setting, falling back to default when the parser
+        is used outside of an app context (scripts, benchmarks)
+        '''
+        if has_app_context():
+            return current_app.config.get(key, default)
+        return default
 
     def allowed_file(self, filename):
         '''
@@ -162,8 +482,20 @@ class AppleParser():
         '''
         Simple upload script for Apple health data
         '''
-        start = time()
+        filepath = self.upload_folder()
+        if isinstance(file, str):
+            # already stored by the job queue, just move it into place
+            shutil.move(file, os.path.join(filepath, 'export.zip'))
+            return filepath
         filename = secure_filename(file.filename)
+        filepath_file = os.path.join(filepath, filename)
+        file.save(filepath_file)
+        return filepath
+    
+    def upload_folder(self):
+        '''
+        Creates (if needed) and returns the user's upload folder
+        '''
         # modify filepath to include username to prevent conflict with multiple users
         filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], str(self.user_id))
         # TODO: enable the following line once you've implemented all parsing methods
@@ -171,266 +503,126 @@ class AppleParser():
         # create folder
         if not os.path.exists(filepath):
             os.makedirs(filepath)
-        filepath_file = os.path.join(filepath, filename)
-        file.save(filepath_file)
-        print('Upload time:')
-        print(time() - start)
         return filepath
-    
+
     def unzip_file(self, filepath):
         '''
         Unzips export.zip and then deletes it
         '''
-        start = time()
         filepath_file = os.path.join(filepath, 'export.zip')
         zip_ref = zipfile.ZipFile(filepath_file, 'r')
         zip_ref.extractall(filepath)
         zip_ref.close()
         os.remove(filepath_file)
-        print('Unzip time:')
-        print(time() - start)
-    
-    def create_csv_data(self, filepath):
+
+    def create_csv_data(self, filepath, frames):
         '''
-        Creates individual csv files for each table to import into db
+        Writes each parsed table to a csv file next to the upload folder,
+        only used for debugging (EXPORT_CSV)
         '''
-        start = time()
-        print('Parsing activity data...')
-        data = self.activity_summary(filepath)
-        print('Cleaning up XML files...')
-        # delete folder with XML files
-        xml_folder = os.path.join(filepath, 'apple_health_export')
-        shutil.rmtree(xml_folder)
-        print('XML parse time:')
-        print(time() - start)
-    
-    def db_load_csv(self, user_id, filepath):
+        for table, frame in frames.items():
+            frame.to_csv(filepath + table + '.csv', index=False)
+
+    def high_water_marks(self, user_id):
         '''
-        Loads csv data into database
+        Latest date already loaded for the user in each table (the start day
+        for workouts).  Used for incremental imports, where only rows from
+        this date on are parsed and replaced.
+
+        Returns
+        -------
+        since : dict
+            {table name: datetime.date}, tables without rows are left out
+        '''
+        since = {}
+        for model in LOADED_MODELS:
+            latest = db.session.query(func.max(model.date)).\
+                filter(model.user_id==user_id).scalar()
+            if latest is not None:
+                since[model.__tablename__] = latest
+        return since
+
+    def db_load(self, user_id, frames):
+        '''
+        Loads the parsed tables into the database.  Tables with a high-water
+        mark in self.since only have that day onwards replaced (the last day
+        loaded may have been partial), the rest are replaced completely.
+
+        Parameters
+        ----------
+        user_id : int
+            Owner of the data
+        frames : dict
+            {table name: DataFrame} as returned by activity_summary
         '''
-        start = time()
-        print('Loading activity summary...')
-        file_path = filepath + 'activity_summary.csv'
-        df = pd.read_csv(file_path)
-        # TODO: for now, clear out all data of user - may optimize if there is time
-        # check for data before trying to delete
-        if db.session.query(ActivityData).filter(ActivityData.user_id==user_id).first() is not None:
-            db.session.query(ActivityData).filter(ActivityData.user_id==user_id).\
-                delete(synchronize_session=False)
-            db.session.commit()
-            db.session.close()
-        df['user_id'] = user_id
-        # grab user name from user table
-        user_name = User.query.filter_by(id=user_id).first().username
-        df['last_updated_by'] = user_name
-        df.to_sql(name='activity_data', con=db.engine, if_exists='append', index=False)
-        os.remove(file_path)
-
-        print('Loading workout data...')
-        file_path = filepath + 'workout.csv'
-        df = pd.read_csv(file_path)
-        # TODO: for now, clear out all data of user - may optimize if there is time
-        # check for data before trying to delete
-        if db.session.query(WorkoutData).filter(WorkoutData.user_id==user_id).first() is not None:
-            db.session.query(WorkoutData).filter(WorkoutData.user_id==user_id).\
-                delete(synchronize_session=False)
-            db.session.commit()
-            db.session.close()
-        df['user_id'] = user_id
-        # grab user name from user table
-        user_name = User.query.filter_by(id=user_id).first().username
-        df['last_updated_by'] = user_name
-        df.to_sql(name='workout_data', con=db.engine, if_exists='append', index=False)
-        os.remove(file_path)
-
-        print('Loading exercise time data...')
-        file_path = filepath + 'exercise_time.csv'
-        df = pd.read_csv(file_path)
-        # TODO: for now, clear out all data of user - may optimize if there is time
-        # check for data before trying to delete
-        if db.session.query(ExerciseTime).filter(ExerciseTime.user_id==user_id).first() is not None:
-            db.session.query(ExerciseTime).filter(ExerciseTime.user_id==user_id).\
-                delete(synchronize_session=False)
-            db.session.commit()
-            db.session.close()
-        df['user_id'] = user_id
         # grab user name from user table
-        user_name = User.query.filter_by(id=user_id).first().username
-        df['last_updated_by'] = user_name
-        df.to_sql(name='exercise_time', con=db.engine, if_exists='append', index=False)
-        os.remove(file_path)
-
-        '''
-        print('Loading heartrate data...')
-        file_path = filepath + 'heartrate.csv'
-        df = pd.read_csv(file_path)
-        # TODO: for now, clear out all data of user - may optimize if there is time
-        # check for data before trying to delete
-        if db.session.query(HeartRate).filter(HeartRate.user_id==user_id).first() is not None:
-            db.session.query(HeartRate).filter(HeartRate.user_id==user_id).\
-                delete(synchronize_session=False)
+        user_name = User.lookup_id(user_id).username
+        for model in LOADED_MODELS:
+            table = model.__tablename__
+            print(f'Loading {table}...')
+            df = frames[table]
+            query = db.session.query(model).filter(model.user_id==user_id)
+            if table in self.since:
+                query = query.filter(model.date >= self.since[table])
+            query.delete(synchronize_session=False)
             db.session.commit()
             db.session.close()
-        df['user_id'] = user_id
-        # grab user name from user table
-        user_name = User.query.filter_by(id=user_id).first().username
-        df['last_updated_by'] = user_name
-        df.to_sql(name='heart_rate', con=db.engine, if_exists='append', index=False)
-        os.remove(file_path)
+            df = df.assign(user_id=user_id, last_updated_by=user_name)
+            self.rows_loaded[table] = bulk_insert(
+                model, df, self.config('BULK_LOAD_BATCH_SIZE'))
+            self.report(rows_loaded=sum(self.rows_loaded.values()))
+
+    def update_rollups(self, user_id):
+        '''
+        Recomputes the graph rollups touched by the last load, from the
+        bucket holding each table's high-water mark onwards
         '''
-        
-        print('DB load time:')
-        print(time() - start)
+        # imported here, rollups imports the models defined in this module
+        from backend.rollups import update_rollups
+        update_rollups(user_id, self.since)
 
-    def activity_summary(self, file_path):
+    def activity_summary(self, file_path, source=None):
         '''
         Main XML parsing script, streams in file and proccesses each branch into
-        lists, which get converted to data frames and exported to csv files for database upload
-        '''
-        # activity data
-        date = []
-        energy_burned = []
-        energy_burned_goal = []
-        energy_burned_unit = []
-        exercise_time = []
-        exercise_time_goal = []
-        stand_hours = []
-        stand_hours_goal = []
-        file = file_path + '/apple_health_export/export.xml'
-
-        # exercise time
-        exercise_time_type = []
-        exercise_time_date = []
-        exercise_time_duration = []
-        exercise_time_durationUnit = []
-
-        # workout data
-        workoutActivityType = []
-        duration = []
-        durationUnit = []
-        totalDistance = []
-        totalDistanceUnit = []
-        totalEnergyBurned = []
-        totalEnergyBurnedUnit = []
-        sourceName = []
-        sourceVersion = []
-        device = []
-        creationDate = []
-        startDate = []
-        endDate = []
-
-        # heartrate data
-        record_type = []
-        record_unit = []
-        record_value = []
-        record_sourceName = []
-        record_sourceVersion = []
-        record_device = []
-        record_creationDate = []
-        record_startDate = []
-        record_endDate = []
-
-        for event, elem in ET.iterparse(file, events=("start", "end")):
-            if event == 'end':
-                # process the tag
-                if elem.tag == 'ActivitySummary':
-                    # import pdb;pdb.set_trace()
-                    for item in elem.items():
-                        if item[0] == 'dateComponents':
-                            date.append(item[1])
-                        elif item[0] == 'activeEnergyBurned':
-                            energy_burned.append(item[1])
-                        elif item[0] == 'activeEnergyBurnedGoal':
-                            energy_burned_goal.append(item[1])
-                        elif item[0] == 'activeEnergyBurnedUnit':
-                            energy_burned_unit.append(item[1])
-                        elif item[0] == 'appleExerciseTime':
-                            exercise_time.append(item[1])
-                        elif item[0] == 'appleExerciseTimeGoal':
-                            exercise_time_goal.append(item[1])
-                        elif item[0] == 'appleStandHours':
-                            stand_hours.append(item[1])
-                        elif item[0] == 'appleStandHoursGoal':
-                            stand_hours_goal.append(item[1])
-                if elem.tag == 'WorkoutEvent':
-                    for item in elem.items():
-                        if item[0] == 'type':
-                            exercise_time_type.append(item[1])
-                        elif item[0] == 'date':
-                            exercise_time_date.append(item[1])
-                        elif item[0] == 'duration':
-                            exercise_time_duration.append(item[1])
-                        elif item[0] == 'durationUnit':
-                            exercise_time_durationUnit.append(item[1])
-                if elem.tag == 'Workout':
-                    for item in elem.items():
-                        if item[0] == 'workoutActivityType':
-                            workoutActivityType.append(item[1])
-                        if item[0] == 'duration':
-                            duration.append(item[1])
-                        if item[0] == 'durationUnit':
-                            durationUnit.append(item[1])
-                        if item[0] == 'totalDistance':
-                            totalDistance.append(item[1])
-                        if item[0] == 'totalDistanceUnit':
-                            totalDistanceUnit.append(item[1])
-                        if item[0] == 'totalEnergyBurned':
-                            totalEnergyBurned.append(item[1])
-                        if item[0] == 'totalEnergyBurnedUnit':
-                            totalEnergyBurnedUnit.append(item[1])
-                        if item[0] == 'sourceName':
-                            sourceName.append(item[1])
-                        if item[0] == 'sourceVersion':
-                            sourceVersion.append(item[1])
-                        if item[0] == 'device':
-                            device.append(item[1])
-                        if item[0] == 'creationDate':
-                            creationDate.append(item[1])
-                        if item[0] == 'startDate':
-                            startDate.append(item[1])
-                        if item[0] == 'endDate':
-                            endDate.append(item[1])
-                '''
-                if elem.tag == 'Record':
-                    for item in elem.items():
-                        if item[0] == 'type':
-                            record_type.append(item[1])
-                        if item[0] == 'unit':
-                            record_unit.append(item[1])
-                        if item[0] == 'value':
-                            record_value.append(item[1])
-                        if item[0] == 'sourceName':
-                            record_sourceName.append(item[1])
-                        if item[0] == 'sourceVersion':
-                            record_sourceVersion.append(item[1])
-                        if item[0] == 'device':
-                            record_device.append(item[1])
-                        if item[0] == 'creationDate':
-                            record_creationDate.append(item[1])
-                        if item[0] == 'startDate':
-                            record_startDate.append(item[1])
-                        if item[0] == 'endDate':
-                            record_endDate.append(item[1])
-                '''
-                # this is the key to memory management on the server
-                elem.clear()
+        lists, which get converted to typed data frames for database upload
+
+        Parameters
+        ----------
+        file_path : str
+            Upload folder of the user, csv files are written next to it
+        source : str or file-like object, optional
+            Path or stream of export.xml, defaults to the extracted file in
+            file_path.  Paths are parsed by PARSE_WORKERS processes.
+
+        Returns
+        -------
+        frames : dict
+            {table name: DataFrame} for activity_data, exercise_time,
+            workout_data and heart_rate
+        '''
+        file = source
+        if file is None:
+            file = file_path + '/apple_health_export/export.xml'
+        backend = self.config('XML_PARSER_BACKEND', 'expat')
+        workers = self.config('PARSE_WORKERS', 1)
+        # incremental import - days before the high-water marks are skipped
+        # while scanning the XML
+        since = {table: day.isoformat() for table, day in self.since.items()}
+        # see EXPORT_SPECS for the tag -> column mapping of each table
+        if workers > 1 and isinstance(file, str):
+            data = extract_parallel(file, EXPORT_SPECS, backend=backend,
+                                    workers=workers, since=since)
+        else:
+            data = extract(file, EXPORT_SPECS, backend=backend, since=since)
+        frames = to_frames(data, EXPORT_SPECS)
 
         # create activity data data frame
         print('Creating activity data...')
-        li = list(zip(date, energy_burned, energy_burned_goal,
-                    energy_burned_unit, exercise_time,
-                    exercise_time_goal, stand_hours, stand_hours_goal))
-        df = pd.DataFrame(li, columns=['date',
-                                    'energy_burned',
-                                    'energy_burned_goal',
-                                    'energy_burned_unit',
-                                    'exercise_time',
-                                    'exercise_time_goal',
-                                    'stand_hours',
-                                    'stand_hours_goal'])
+        df = frames['activity_data']
         # remove dates before 2000-01-01
         df['datetime'] = pd.to_datetime(df['date'])
         df = df[df['datetime'] > '2000-01-01']
+        df['date'] = df['datetime'].dt.date
         # drop datetime column
         df = df.drop(['datetime'], axis=1)
         # add created_at, last_updated_by
@@ -440,16 +632,11 @@ class AppleParser():
 
         # create exercise time data frame
         print('Creating exercise time data...')
-        li = list(zip(exercise_time_date, exercise_time_type,
-                    exercise_time_duration, exercise_time_durationUnit))
-        exercise_time = pd.DataFrame(li,
-                                    columns=['date',
-                                            'exercise_time_type',
-                                            'exercise_time_duration',
-                                            'exercise_time_durationUnit'])
+        exercise_time = frames['exercise_time']
         # remove dates before 2000-01-01
         exercise_time['datetime'] = pd.to_datetime(exercise_time['date'])
         exercise_time = exercise_time[exercise_time['datetime'] > '2000-01-01']
+        exercise_time['date'] = exercise_time['datetime'].dt.date
         # drop datetime column
         exercise_time = exercise_time.drop(['datetime'], axis=1)
         # add created_at, last_updated_by
@@ -459,19 +646,7 @@ class AppleParser():
 
         # create workout data frame
         print('Creating workout data...')
-        li = list(zip(workoutActivityType, duration, durationUnit, totalDistance,
-                    totalDistanceUnit, totalEnergyBurned, totalEnergyBurnedUnit,
-                    sourceName, sourceVersion, device, creationDate, startDate,
-                    endDate))
-        workout = pd.DataFrame(li,
-                            columns=['activity_type', 'duration',
-                                        'duration_unit', 'total_distance',
-                                        'total_distance_unit',
-                                        'total_energy_burned',
-                                        'total_energy_burned_unit',
-                                        'source_name', 'source_version',
-                                        'device', 'creation_date',
-                                        'start_date', 'end_date'])
+        workout = frames['workout_data']
         # remove dates before 2000-01-01
         workout['creation_datetime'] = pd.to_datetime(workout['creation_date'])
         workout = workout[workout['creation_datetime'] > '2000-01-01']
@@ -502,58 +677,22 @@ class AppleParser():
                         'gadget', 'start_date', 'end_date', 'created_at',
                         'updated_at']]
 
-        '''
-        # create heartrate data frame
+        # create heartrate data frame, samples were already reduced to
+        # count/sum/min/max per date and gadget while parsing
         print('Creating heartrate data...')
-        li = list(zip(record_type, record_unit, record_value, record_sourceName,
-                    record_sourceVersion, record_device, record_creationDate,
-                    record_startDate, record_endDate))
-        record = pd.DataFrame(li,
-                            columns=['type', 'unit',
-                                    'value', 'source_name',
-                                    'source_version', 'device',
-                                    'creation_date', 'start_date',
-                                    'end_date'])
+        heartrate = frames['heart_rate']
         # remove dates before 2000-01-01
-        record['creation_datetime'] = pd.to_datetime(record['creation_date'])
-        record = record[record['creation_datetime'] > '2000-01-01']
-        record['start_datetime'] = pd.to_datetime(record['start_date'])
-        record = record[record['start_datetime'] > '2000-01-01']
-        record['end_datetime'] = pd.to_datetime(record['end_date'])
-        record = record[record['end_datetime'] > '2000-01-01']
-        record['date'] = record['start_datetime'].dt.strftime('%Y-%m-%d')
-
-        # drop datetime column
-        record = record.drop(['creation_datetime', 'start_datetime',
-                            'end_datetime'], axis=1)
-
-        # filter down to heartrate
-        record = record[record['type'] == 'HKQuantityTypeIdentifierHeartRate']
-        # clean up device data (look for Apple Watch, iPhone)
-        record['gadget'] = np.where(record['device'].str.contains('Apple Watch'),
-                                    'Apple Watch', 'iPhone')
-        # decrease columns to necessary info
-        record = record[['date', 'gadget', 'value']]
-        record['value'] = record['value'].astype(float)
-        # aggregate this before adding to db (max, min, avg)
-        record_avg = record.groupby(['date', 'gadget'], as_index=False).mean()
-        record_max = record.groupby(['date', 'gadget'], as_index=False).max()
-        record_min = record.groupby(['date', 'gadget'], as_index=False).min()
-        # combine these into a single df for record
-        record_avg.columns = ['date', 'gadget', 'avg']
-        record_max.columns = ['date', 'gadget', 'max']
-        record_min.columns = ['date', 'gadget', 'min']
-        heartrate = record_avg.merge(record_max, on=['date', 'gadget'])
-        heartrate = heartrate.merge(record_min, on=['date', 'gadget'])
+        heartrate['datetime'] = pd.to_datetime(heartrate['date'])
+        heartrate = heartrate[heartrate['datetime'] > '2000-01-01']
+        heartrate['date'] = heartrate['datetime'].dt.date
+        heartrate['avg'] = heartrate['sum'] / heartrate['count']
+        heartrate = heartrate[['date', 'gadget', 'avg', 'max', 'min']]
         # add created_at, last_updated_by
         heartrate['created_at'] = pd.to_datetime('now')
         heartrate['updated_at'] = pd.to_datetime('now')
         heartrate.fillna(0, inplace=True)
-        # import pdb; pdb.set_trace()
-        '''
-        # csv exports
-        df.to_csv(file_path + 'activity_summary.csv', index=False)
-        exercise_time.to_csv(file_path + 'exercise_time.csv', index=False)
-        workout.to_csv(file_path + 'workout.csv', index=False)
-        # heartrate.to_csv(file_path + 'heartrate.csv', index=False)
-        return df
+
+        return {'activity_data': df,
+                'exercise_time': exercise_time,
+                'workout_data': workout,
+                'heart_rate': heartrate}
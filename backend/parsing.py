@@ -0,0 +1,491 @@
+'''
+Table-driven extraction of Apple Health export.xml.  Each table is declared
+as a TableSpec mapping the attributes of one XML tag onto columns, and
+extract() streams the file once, collecting those attributes into lists.
+Tables too large to keep row by row (heart rate samples) are declared as an
+AggregateSpec instead and reduced to count/sum/min/max per key while
+streaming.
+The XML parser itself is pluggable (see BACKENDS), and extract_parallel()
+splits large files at top level element boundaries across processes.
+'''
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+import pandas as pd
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+
+class TableSpec():
+    '''
+    Maps the attributes of one XML tag onto the columns of a table
+
+    Parameters
+    ----------
+    table : str
+        Name of the table the rows belong to
+    tag : str
+        XML tag holding one row per element
+    columns : list of (str, str)
+        (attribute, column) pairs, in column order
+    date_attr : str
+        Attribute holding the row's date, used to skip rows older than the
+        `since` threshold of extract()
+    numeric : list of str
+        Columns converted to numbers when the table becomes a DataFrame
+    where : (str, str), optional
+        (attribute, value) - only elements whose attribute equals value are
+        collected, e.g. one Record type
+    '''
+    def __init__(self, table, tag, columns, date_attr=None, numeric=(),
+                 where=None):
+        self.table = table
+        self.tag = tag
+        self.columns = columns
+        self.date_attr = date_attr
+        self.numeric = numeric
+        self.where = where
+
+    def __repr__(self):
+        return '<TableSpec %r>' % self.table
+
+    def collector(self):
+        return {column: [] for _, column in self.columns}
+
+    def handler(self, table, threshold=None):
+        '''
+        Returns the callback extract() runs on each element of the tag, it
+        takes the element's attribute getter
+        '''
+        date_attr = self.date_attr if threshold else None
+        where_attr, where_value = self.where or (None, None)
+        appends = [(attribute, table[column].append)
+                   for attribute, column in self.columns]
+
+        def handle(get):
+            if where_attr is not None and get(where_attr) != where_value:
+                return
+            if date_attr is not None and get(date_attr, '') < threshold:
+                return
+            for attribute, append in appends:
+                append(get(attribute))
+        return handle
+
+    def merge(self, table, part):
+        for column, values in part.items():
+            table[column].extend(values)
+
+    def frame(self, table):
+        frame = pd.DataFrame(table,
+                             columns=[column for _, column in self.columns])
+        for column in self.numeric:
+            frame[column] = pd.to_numeric(frame[column], errors='coerce')
+        return frame
+
+
+class AggregateSpec():
+    '''
+    Reduces the numeric attribute of one XML tag to running count, sum, min
+    and max per key while streaming, so memory grows with the number of keys
+    (days x devices) instead of the number of elements
+
+    Parameters
+    ----------
+    table : str
+        Name of the table the aggregates belong to
+    tag : str
+        XML tag holding one sample per element
+    keys : list of (str, str, function)
+        (attribute, column, function) triples, the function maps the raw
+        attribute onto the key value.  Must be module level functions so
+        specs can be sent to extract_parallel's worker processes.
+    value : str
+        Attribute holding the sample, elements where it is not a number are
+        skipped
+    date_attr : str
+        Attribute compared against the `since` threshold of extract()
+    where : (str, str), optional
+        (attribute, value) filter, see TableSpec
+    '''
+    def __init__(self, table, tag, keys, value, date_attr=None, where=None):
+        self.table = table
+        self.tag = tag
+        self.keys = keys
+        self.value = value
+        self.date_attr = date_attr
+        self.where = where
+
+    def __repr__(self):
+        return '<AggregateSpec %r>' % self.table
+
+    def collector(self):
+        # {key tuple: [count, sum, min, max]}
+        return {}
+
+    def handler(self, table, threshold=None):
+        date_attr = self.date_attr if threshold else None
+        where_attr, where_value = self.where or (None, None)
+        keys = [(attribute, function) for attribute, _, function in self.keys]
+        value_attr = self.value
+
+        def handle(get):
+            if where_attr is not None and get(where_attr) != where_value:
+                return
+            if date_attr is not None and get(date_attr, '') < threshold:
+                return
+            try:
+                value = float(get(value_attr))
+            except (TypeError, ValueError):
+                return
+            key = tuple([function(get(attribute))
+                         for attribute, function in keys])
+            total = table.get(key)
+            if total is None:
+                table[key] = [1, value, value, value]
+            else:
+                total[0] += 1
+                total[1] += value
+                if value < total[2]:
+                    total[2] = value
+                elif value > total[3]:
+                    total[3] = value
+        return handle
+
+    def merge(self, table, part):
+        for key, (count, value_sum, low, high) in part.items():
+            total = table.get(key)
+            if total is None:
+                table[key] = [count, value_sum, low, high]
+            else:
+                total[0] += count
+                total[1] += value_sum
+                total[2] = min(total[2], low)
+                total[3] = max(total[3], high)
+
+    def frame(self, table):
+        columns = [column for _, column, _ in self.keys]
+        return pd.DataFrame([key + tuple(total)
+                             for key, total in sorted(table.items())],
+                            columns=columns + ['count', 'sum', 'min', 'max'])
+
+
+def day(timestamp):
+    '''
+    'YYYY-MM-DD hh:mm:ss +zzzz' -> 'YYYY-MM-DD'
+    '''
+    return timestamp[:10] if timestamp else None
+
+
+def gadget(device):
+    '''
+    Apple's HKDevice description -> Apple Watch or iPhone
+    '''
+    if device and 'Apple Watch' in device:
+        return 'Apple Watch'
+    return 'iPhone'
+
+
+TABLE_SPECS = [
+    TableSpec('activity_data', 'ActivitySummary', [
+        ('dateComponents', 'date'),
+        ('activeEnergyBurned', 'energy_burned'),
+        ('activeEnergyBurnedGoal', 'energy_burned_goal'),
+        ('activeEnergyBurnedUnit', 'energy_burned_unit'),
+        ('appleExerciseTime', 'exercise_time'),
+        ('appleExerciseTimeGoal', 'exercise_time_goal'),
+        ('appleStandHours', 'stand_hours'),
+        ('appleStandHoursGoal', 'stand_hours_goal'),
+    ], date_attr='dateComponents',
+       numeric=['energy_burned', 'energy_burned_goal', 'exercise_time',
+                'exercise_time_goal', 'stand_hours', 'stand_hours_goal']),
+    TableSpec('exercise_time', 'WorkoutEvent', [
+        ('date', 'date'),
+        ('type', 'exercise_time_type'),
+        ('duration', 'exercise_time_duration'),
+        ('durationUnit', 'exercise_time_durationUnit'),
+    ], date_attr='date', numeric=['exercise_time_duration']),
+    TableSpec('workout_data', 'Workout', [
+        ('workoutActivityType', 'activity_type'),
+        ('duration', 'duration'),
+        ('durationUnit', 'duration_unit'),
+        ('totalDistance', 'total_distance'),
+        ('totalDistanceUnit', 'total_distance_unit'),
+        ('totalEnergyBurned', 'total_energy_burned'),
+        ('totalEnergyBurnedUnit', 'total_energy_burned_unit'),
+        ('sourceName', 'source_name'),
+        ('sourceVersion', 'source_version'),
+        ('device', 'device'),
+        ('creationDate', 'creation_date'),
+        ('startDate', 'start_date'),
+        ('endDate', 'end_date'),
+    ], date_attr='startDate',
+       numeric=['duration', 'total_distance', 'total_energy_burned']),
+]
+
+HEART_RATE_SPEC = AggregateSpec('heart_rate', 'Record', [
+    ('startDate', 'date', day),
+    ('device', 'gadget', gadget),
+], 'value', date_attr='startDate',
+   where=('type', 'HKQuantityTypeIdentifierHeartRate'))
+
+# everything AppleParser loads from an export
+EXPORT_SPECS = TABLE_SPECS + [HEART_RATE_SPEC]
+
+
+def extract(source, specs=TABLE_SPECS, backend='etree', since=None):
+    '''
+    Streams export.xml and collects the attributes declared in specs
+
+    Parameters
+    ----------
+    source : str or file-like object
+        Path or stream of export.xml
+    specs : list of TableSpec or AggregateSpec
+        Tables to extract
+    backend : str
+        XML parser to use, one of BACKENDS (etree, expat or lxml)
+    since : dict, optional
+        {table: 'YYYY-MM-DD'} - elements whose date attribute sorts before
+        the threshold are skipped before any column is touched.  Apple's
+        timestamps start with the ISO date, so a string comparison is enough.
+
+    Returns
+    -------
+    columns : dict
+        {table: {column: list of str}}, missing attributes are None.
+        Aggregated tables are {key tuple: [count, sum, min, max]}.
+    '''
+    since = since or {}
+    columns = {}
+    # {tag: [handler, ...]}, several tables may read the same tag
+    targets = {}
+    for spec in specs:
+        table = spec.collector()
+        columns[spec.table] = table
+        targets.setdefault(spec.tag, []).append(
+            spec.handler(table, since.get(spec.table)))
+    BACKENDS[resolve_backend(backend)](source, targets)
+    return columns
+
+
+def to_frames(columns, specs=TABLE_SPECS):
+    '''
+    Converts the output of extract() into one typed DataFrame per table
+
+    Returns
+    -------
+    frames : dict
+        {table: DataFrame}, numeric columns are floats/ints (NaN if missing)
+    '''
+    return {spec.table: spec.frame(columns[spec.table]) for spec in specs}
+
+
+def resolve_backend(name):
+    '''
+    Checks that the backend exists, falling back to etree when lxml is
+    configured but not installed
+    '''
+    if name not in BACKENDS:
+        raise ValueError('Unknown XML parser backend: %r' % name)
+    if name == 'lxml' and lxml_etree is None:
+        print('lxml is not installed.  Falling back to etree.')
+        return 'etree'
+    return name
+
+
+def parse_etree(source, targets):
+    '''
+    Standard library ElementTree backend
+    '''
+    # only "end" events - attributes are complete by then and children
+    # (WorkoutEvent inside Workout) have already been handled
+    for _, elem in ET.iterparse(source):
+        handlers = targets.get(elem.tag)
+        if handlers is not None:
+            get = elem.attrib.get
+            for handle in handlers:
+                handle(get)
+        # this is the key to memory management on the server
+        elem.clear()
+
+
+def parse_expat(source, targets):
+    '''
+    SAX style backend on the raw expat parser.  Rows are read from the start
+    tag, so no Element objects are ever built.
+    '''
+    def start(tag, attrs):
+        handlers = targets.get(tag)
+        if handlers is not None:
+            get = attrs.get
+            for handle in handlers:
+                handle(get)
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = start
+    if isinstance(source, str):
+        with open(source, 'rb') as file:
+            parser.ParseFile(file)
+    else:
+        parser.ParseFile(source)
+
+
+def parse_lxml(source, targets):
+    '''
+    lxml backend, only target tags are handed back to Python
+    '''
+    for _, elem in lxml_etree.iterparse(source, events=('end',),
+                                        tag=list(targets), huge_tree=True):
+        get = elem.attrib.get
+        for handle in targets[elem.tag]:
+            handle(get)
+        elem.clear()
+        # lxml keeps skipped siblings (Record etc.) attached to the root,
+        # drop everything up to this element in one slice
+        parent = elem.getparent()
+        del parent[:parent.index(elem)]
+
+
+BACKENDS = {
+    'etree': parse_etree,
+    'expat': parse_expat,
+    'lxml': parse_lxml,
+}
+
+# top level elements of export.xml (Record, Workout, ActivitySummary, ...)
+# start on their own line indented by a single space, nested ones deeper
+BOUNDARY = re.compile(rb'\n <[A-Za-z]')
+ROOT_CLOSE = b'</HealthData>'
+# more chunks than workers so one slow chunk doesn't leave cores idle
+CHUNKS_PER_WORKER = 4
+
+
+def extract_parallel(path, specs=TABLE_SPECS, backend='etree', workers=None,
+                     since=None):
+    '''
+    Drop-in alternative to extract() for files on disk.  The file is cut into
+    byte ranges at top level element boundaries, the ranges are parsed in a
+    process pool and the column lists are concatenated in file order.
+
+    Parameters
+    ----------
+    path : str
+        Path of export.xml
+    specs : list of TableSpec or AggregateSpec
+        Tables to extract, aggregates of the ranges are merged
+    backend : str
+        XML parser used by each worker
+    workers : int, optional
+        Number of processes, defaults to the CPU count
+    since : dict, optional
+        Per table date thresholds, see extract()
+    '''
+    workers = workers or os.cpu_count()
+    if workers <= 1:
+        return extract(path, specs, backend, since)
+    ranges = split_ranges(path, workers * CHUNKS_PER_WORKER)
+    starts = [start for start, _ in ranges]
+    ends = [end for _, end in ranges]
+    columns = {spec.table: spec.collector() for spec in specs}
+    with ProcessPoolExecutor(workers) as pool:
+        for part in pool.map(extract_range, repeat(path), starts, ends,
+                             repeat(specs), repeat(backend), repeat(since)):
+            for spec in specs:
+                spec.merge(columns[spec.table], part[spec.table])
+    return columns
+
+
+def extract_range(path, start, end, specs, backend, since):
+    '''
+    Worker for extract_parallel, parses one byte range of the file
+    '''
+    with RangeReader(path, start, end) as source:
+        return extract(source, specs, backend, since)
+
+
+def split_ranges(path, chunks):
+    '''
+    Splits the body of export.xml (everything between the first and last top
+    level element) into roughly equal byte ranges that each start on a top
+    level element
+    '''
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        body_start = find_boundary(f, 0)
+        f.seek(max(0, size - 4096))
+        tail = f.read()
+        body_end = size - len(tail) + tail.rindex(ROOT_CLOSE)
+        if body_start is None or body_start >= body_end:
+            return []
+        step = max(1, (body_end - body_start) // chunks)
+        bounds = [body_start]
+        for target in range(body_start + step, body_end, step):
+            bound = find_boundary(f, target)
+            if bound is None or bound >= body_end:
+                break
+            if bound > bounds[-1]:
+                bounds.append(bound)
+    bounds.append(body_end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def find_boundary(f, offset, window=1 << 16):
+    '''
+    Returns the offset of the first top level element at or after offset
+    '''
+    # step back one byte so an element starting right at offset is found
+    pos = max(0, offset - 1)
+    f.seek(pos)
+    carry = b''
+    while True:
+        data = f.read(window)
+        if not data:
+            return None
+        buf = carry + data
+        match = BOUNDARY.search(buf)
+        if match:
+            return pos - len(carry) + match.start() + 1
+        carry = buf[-3:]
+        pos += len(data)
+
+
+class RangeReader():
+    '''
+    Read-only file object over one byte range of export.xml, wrapped in a
+    root element so it parses as a document of its own
+    '''
+    def __init__(self, path, start, end):
+        self.file = open(path, 'rb')
+        self.file.seek(start)
+        self.remaining = end - start
+        self.pending = [b'<HealthData>', None, b'</HealthData>']
+
+    def read(self, size=-1):
+        while self.pending:
+            if self.pending[0] is not None:
+                return self.pending.pop(0)
+            if self.remaining > 0:
+                if size is None or size < 0:
+                    size = self.remaining
+                data = self.file.read(min(size, self.remaining))
+                self.remaining -= len(data)
+                if data:
+                    return data
+            self.pending.pop(0)
+        return b''
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
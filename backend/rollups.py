@@ -0,0 +1,192 @@
+'''
+Materialized graph totals.  For every user, source table, aggregation level
+and metric the rollups table holds one row per bucket with the summed actual
+and goal values and their variance, so the graph endpoints read a handful of
+rows instead of grouping the user's whole history.
+
+AppleParser calls update_rollups() after each load and check_rollups()
+(`flask check-rollups`) recomputes them from the raw rows to find drift.
+'''
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import select
+
+from . import db
+from .api.aggregate import AGGREGATES, period_bounds
+from .api.columnar import Columns, select_rows
+from .api.metrics import Metric, SOURCES
+from .loader import bulk_insert
+from .models import Rollup, User
+
+
+# (actual, goal) column pairs per source table, goal is None when the table
+# has no goals
+ROLLUP_METRICS = {
+    name: [(metric.actual, metric.goal) for metric in source.metrics.values()]
+    for name, source in SOURCES.items()
+}
+ROLLUP_SOURCES = {name: source.model for name, source in SOURCES.items()}
+ROLLUP_COLUMNS = ['source', 'agg', 'date', 'metric', 'actual', 'goal',
+                  'var_num', 'var_pct']
+# relative difference tolerated by check_rollups (summation order)
+TOLERANCE = 1e-9
+
+
+def compute_rollups(source, rows):
+    '''
+    Rolls raw rows of one user up into all aggregation levels
+
+    Parameters
+    ----------
+    source : str
+        Source table name, one of ROLLUP_METRICS
+    rows : Columns
+        Raw rows holding the metric columns, see read_source
+
+    Returns
+    -------
+    rollups : dataframe
+        ROLLUP_COLUMNS, one row per agg, bucket and metric
+    '''
+    frames = []
+    for agg in AGGREGATES:
+        keys, _, sums = rows.sums(agg)
+        dates = keys.astype('datetime64[D]').astype(object)
+        for actual, goal in ROLLUP_METRICS[source]:
+            part = pd.DataFrame({'date': dates, 'actual': sums[actual]})
+            part['goal'] = sums[goal] if goal else np.nan
+            # zero goals give NaN, stored as NULL like a missing goal
+            part['var_num'], part['var_pct'] = Metric.variance(
+                part['actual'], part['goal'])
+            part['agg'] = agg
+            part['metric'] = actual
+            frames.append(part)
+    rollups = pd.concat(frames, ignore_index=True)
+    rollups['source'] = source
+    return rollups[ROLLUP_COLUMNS]
+
+
+def read_source(model, user_id, start=None):
+    '''
+    Raw rows of one user needed for the rollups, from start on if given
+    '''
+    table = model.__table__
+    columns = [column for pair in ROLLUP_METRICS[table.name]
+               for column in pair if column]
+    s = select_rows(table, columns).where(table.c.user_id == user_id)
+    if start is not None:
+        s = s.where(table.c.date >= start)
+    return Columns.read(s)
+
+
+def update_rollups(user_id, since=None, sources=ROLLUP_SOURCES):
+    '''
+    Replaces a user's rollups after a load
+
+    Parameters
+    ----------
+    user_id : int
+        Owner of the data
+    since : dict, optional
+        {table name: datetime.date} high-water marks of an incremental load.
+        Only buckets holding that day or later are recomputed.  Tables
+        without a mark, or for which the user has no rollups yet (data
+        loaded before the rollups table existed), are rebuilt completely.
+    sources : list of str, optional
+        Source tables to update, defaults to all of ROLLUP_SOURCES
+    '''
+    since = since or {}
+    for source in sources:
+        model = ROLLUP_SOURCES[source]
+        query = Rollup.query.filter(Rollup.user_id==user_id,
+                                    Rollup.source==source)
+        if source not in since or query.first() is None:
+            query.delete(synchronize_session=False)
+            db.session.commit()
+            rollups = compute_rollups(source, read_source(model, user_id))
+        else:
+            # first bucket touched by the load for each level, a week can
+            # start before the year holding the high-water mark
+            starts = {agg: period_bounds(since[source], agg)[0]
+                      for agg in AGGREGATES}
+            for agg, start in starts.items():
+                query.filter(Rollup.agg==agg, Rollup.date >= start).\
+                    delete(synchronize_session=False)
+            db.session.commit()
+            rollups = compute_rollups(
+                source, read_source(model, user_id, min(starts.values())))
+            keep = np.zeros(len(rollups.index), dtype=bool)
+            for agg, start in starts.items():
+                keep |= ((rollups['agg'] == agg) &
+                         (rollups['date'] >= start)).to_numpy()
+            rollups = rollups[keep]
+        db.session.close()
+        bulk_insert(Rollup, rollups.assign(user_id=user_id))
+
+
+def read_rollups(user_id, source):
+    s = select([Rollup.__table__.c[column] for column in ROLLUP_COLUMNS]).\
+        where(Rollup.user_id == user_id).where(Rollup.source == source)
+    return pd.read_sql(s, con=db.engine)
+
+
+def rollup_drift(user_id, source):
+    '''
+    Compares a user's stored rollups with ones recomputed from raw rows
+
+    Returns
+    -------
+    drift : dict
+        Number of buckets missing from, extra in and different in the
+        rollups table
+    '''
+    keys = ['agg', 'date', 'metric']
+    values = ['actual', 'goal', 'var_num', 'var_pct']
+    expected = compute_rollups(
+        source, read_source(ROLLUP_SOURCES[source], user_id))
+    stored = read_rollups(user_id, source)
+    stored['date'] = pd.to_datetime(stored['date']).dt.date
+    both = expected.merge(stored, on=keys, how='outer', indicator=True,
+                          suffixes=('', '_stored'))
+    matched = both[both['_merge'] == 'both']
+    changed = np.zeros(len(matched.index), dtype=bool)
+    for column in values:
+        a = matched[column].to_numpy(float)
+        b = matched[column + '_stored'].to_numpy(float)
+        changed |= ~(np.isclose(a, b, rtol=TOLERANCE, atol=TOLERANCE) |
+                     (np.isnan(a) & np.isnan(b)))
+    return {'missing': int((both['_merge'] == 'left_only').sum()),
+            'extra': int((both['_merge'] == 'right_only').sum()),
+            'changed': int(changed.sum())}
+
+
+def check_rollups(user_id=None, fix=False):
+    '''
+    Recomputes rollups from raw rows for one or all users and reports drift
+
+    Parameters
+    ----------
+    user_id : int, optional
+        Only check this user
+    fix : bool
+        Rebuild the rollups of every user/source that drifted
+
+    Returns
+    -------
+    drifted : list of (user_id, source, drift)
+    '''
+    if user_id is None:
+        user_ids = [user.id for user in User.query.all()]
+    else:
+        user_ids = [user_id]
+    drifted = []
+    for uid in user_ids:
+        for source in ROLLUP_SOURCES:
+            drift = rollup_drift(uid, source)
+            if any(drift.values()):
+                drifted.append((uid, source, drift))
+                if fix:
+                    update_rollups(uid, sources=[source])
+                    User.bump_data_version(uid)
+    return drifted
@@ -0,0 +1,392 @@
+'''
+Chunked, resumable uploads of export.zip.  A client opens an upload with the
+file's size (and optionally its SHA-256), appends chunks at the offset the
+server reports, and completes it, which checks the size and hash and queues
+the file for parsing.  Chunks are streamed from the request straight onto
+the end of the final file, nothing is buffered in temp files.  After a
+disconnect the client asks for the offset and resumes from there, bytes
+written before the disconnect are kept.
+
+Uploads are recorded in the job database, so any web process can take the
+next chunk.  Appends to one upload are serialized with a lease that the
+writer renews while the chunk streams in, and completing moves the upload
+out of 'uploading' with a compare-and-set, so only one request queues it.
+
+Config
+------
+UPLOAD_CHUNK_SIZE : largest chunk accepted, defaults to 8 MB
+UPLOAD_EXPIRY : seconds an unfinished upload is kept, defaults to a day
+'''
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from time import time
+
+from werkzeug.exceptions import ClientDisconnected
+
+from .exceptions import ValidationError
+
+
+# bytes copied from the request per read
+COPY_BLOCK = 1 << 20
+# seconds an append holds an upload without renewing, a writer that
+# crashed or stalled is taken over after
+LEASE = 60
+SHA256 = re.compile(r'[0-9a-fA-F]{64}')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS uploads (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT,
+    received INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    job_id TEXT,
+    holder TEXT,
+    lease REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+'''
+FIELDS = ('id', 'user_id', 'size', 'sha256', 'status', 'job_id', 'created_at',
+          'updated_at')
+
+
+def check_sha256(sha256):
+    '''
+    Raises ValidationError unless sha256 is None or a hex SHA-256 digest
+    '''
+    if sha256 is not None and (not isinstance(sha256, str) or
+                               not SHA256.fullmatch(sha256)):
+        raise ValidationError('sha256 must be 64 hex digits')
+
+
+class UploadConflict(Exception):
+    '''
+    A chunk that doesn't start at the upload's offset, or arrives while
+    another chunk is being written.  Carries the current offset.
+    '''
+    def __init__(self, message, offset):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadStore():
+    '''
+    Resumable uploads in a SQLite table next to the job queue, with the
+    files in <UPLOAD_FOLDER>/uploads
+    '''
+    def __init__(self, app=None):
+        self.path = None
+        self.folder = None
+        self.chunk_size = 8 << 20
+        self.expiry = 86400
+        # {upload_id: (offset, sha256 object)} of uploads appended to by
+        # this process, so completing doesn't read the file again
+        self.hashes = {}
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        upload_folder = config['UPLOAD_FOLDER']
+        self.folder = os.path.join(upload_folder, 'uploads')
+        os.makedirs(self.folder, exist_ok=True)
+        self.path = config.get('JOB_DATABASE') or \
+            os.path.join(upload_folder, 'jobs.sqlite')
+        self.chunk_size = config.get('UPLOAD_CHUNK_SIZE', 8 << 20)
+        self.expiry = config.get('UPLOAD_EXPIRY', 86400)
+        with self.connect() as conn:
+            conn.execute(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def create(self, user_id, size, sha256=None):
+        '''
+        Opens an upload of size bytes
+
+        Parameters
+        ----------
+        user_id : int
+            Owner of the upload
+        size : int
+            Total size of the file
+        sha256 : str, optional
+            Hex digest of the file, can also be given on completion
+
+        Returns
+        -------
+        upload : dict
+            See get
+        '''
+        if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+            raise ValidationError('size must be a positive integer')
+        check_sha256(sha256)
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(self.folder, upload_id + '.zip')
+        open(path, 'wb').close()
+        now = time()
+        with self.connect() as conn:
+            conn.execute('INSERT INTO uploads (id, user_id, path, size, '
+                         'sha256, status, created_at, updated_at) '
+                         "VALUES (?, ?, ?, ?, ?, 'uploading', ?, ?)",
+                         (upload_id, user_id, path, size,
+                          sha256 and sha256.lower(), now, now))
+        with self.lock:
+            self.hashes[upload_id] = (0, hashlib.sha256())
+        return self.get(upload_id)
+
+    def row(self, upload_id):
+        with self.connect() as conn:
+            row = conn.execute('SELECT * FROM uploads WHERE id = ?',
+                               (upload_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def get(self, upload_id):
+        '''
+        Returns the upload as a dict (id, user_id, size, sha256, offset,
+        status, job_id, created_at, updated_at), or None
+        '''
+        row = self.row(upload_id)
+        if row is None:
+            return None
+        upload = {name: row[name] for name in FIELDS}
+        upload['offset'] = row['received']
+        return upload
+
+    def append(self, upload_id, offset, stream, length):
+        '''
+        Writes a chunk read from stream at offset
+
+        Parameters
+        ----------
+        upload_id : str
+            Upload to append to
+        offset : int
+            Position of the chunk, has to be the upload's current offset
+        stream : file-like object
+            The request body
+        length : int
+            Bytes in the chunk
+
+        Returns
+        -------
+        offset : int
+            Offset after the chunk
+        '''
+        row = self.row(upload_id)
+        if row is None:
+            # expired or deleted since the endpoint looked it up
+            raise ValidationError('upload was removed')
+        if length is None or length <= 0:
+            raise ValidationError('chunks need a Content-Length')
+        if length > self.chunk_size:
+            raise ValidationError('chunks are at most %d bytes'
+                                  % self.chunk_size)
+        if offset + length > row['size']:
+            raise ValidationError('chunk ends past the upload size')
+        holder = self.acquire(row, offset)
+        renewed = time()
+        written = 0
+        hasher = None
+        try:
+            with open(row['path'], 'r+b') as f:
+                # drop bytes past the offset a crashed writer may have left
+                f.truncate(offset)
+                f.seek(offset)
+                hasher = self.hasher(upload_id, offset)
+                while written < length:
+                    block = stream.read(min(COPY_BLOCK, length - written))
+                    if not block:
+                        break
+                    # a slow client may have outlived the lease, never write
+                    # without at least half of it left
+                    if time() - renewed > LEASE / 2:
+                        if not self.renew(upload_id, holder):
+                            current = self.row(upload_id)
+                            if current is None:
+                                raise ValidationError('upload was removed')
+                            raise UploadConflict(
+                                'upload was taken over by another request',
+                                current['received'])
+                        renewed = time()
+                    f.write(block)
+                    if hasher is not None:
+                        hasher.update(block)
+                    written += len(block)
+        except ClientDisconnected:
+            # keep what arrived, the client resumes from there
+            pass
+        finally:
+            # a no-op if the lease was lost, the new holder owns the file
+            self.release(upload_id, holder, offset + written, hasher)
+        return offset + written
+
+    def acquire(self, row, offset):
+        '''
+        Leases the upload for one append at offset, raising UploadConflict
+        when the offset is wrong or another append holds it
+        '''
+        if row['status'] != 'uploading':
+            raise ValidationError('upload is %s' % row['status'])
+        now = time()
+        holder = uuid.uuid4().hex
+        with self.connect() as conn:
+            leased = conn.execute(
+                'UPDATE uploads SET holder = ?, lease = ?, updated_at = ? '
+                "WHERE id = ? AND status = 'uploading' AND received = ? "
+                'AND (lease IS NULL OR lease < ?)',
+                (holder, now + LEASE, now, row['id'], offset, now)).rowcount
+        if leased:
+            return holder
+        current = self.row(row['id'])
+        if current is None:
+            raise ValidationError('upload was removed')
+        if current['received'] != offset:
+            raise UploadConflict('upload is at offset %d'
+                                 % current['received'], current['received'])
+        raise UploadConflict('another chunk is being written',
+                             current['received'])
+
+    def renew(self, upload_id, holder):
+        '''
+        Extends the lease of holder, False if another append took it over
+        '''
+        now = time()
+        with self.connect() as conn:
+            return conn.execute(
+                'UPDATE uploads SET lease = ?, updated_at = ? '
+                'WHERE id = ? AND holder = ?',
+                (now + LEASE, now, upload_id, holder)).rowcount == 1
+
+    def release(self, upload_id, holder, offset, hasher):
+        '''
+        Records the new offset and frees the lease, if holder still has it
+        '''
+        with self.connect() as conn:
+            released = conn.execute(
+                'UPDATE uploads SET received = ?, holder = NULL, '
+                'lease = NULL, updated_at = ? WHERE id = ? AND holder = ?',
+                (offset, time(), upload_id, holder)).rowcount
+        if released and hasher is not None:
+            with self.lock:
+                self.hashes[upload_id] = (offset, hasher)
+
+    def hasher(self, upload_id, offset):
+        '''
+        This process' running hash of the upload if it covers exactly the
+        bytes before offset (else completing reads the file)
+        '''
+        with self.lock:
+            entry = self.hashes.pop(upload_id, None)
+        if entry is not None and entry[0] == offset:
+            return entry[1]
+        return None
+
+    def digest(self, upload_id, row):
+        hasher = self.hasher(upload_id, row['received'])
+        if hasher is None:
+            hasher = hashlib.sha256()
+            with open(row['path'], 'rb') as f:
+                for block in iter(lambda: f.read(COPY_BLOCK), b''):
+                    hasher.update(block)
+        return hasher.hexdigest()
+
+    def complete(self, upload_id, sha256=None):
+        '''
+        Checks an upload's size and hash and marks it complete
+
+        Parameters
+        ----------
+        upload_id : str
+            Upload to complete
+        sha256 : str, optional
+            Hex digest of the file, required unless given on creation
+
+        Returns
+        -------
+        path : str
+            The uploaded file, ready to be queued
+        '''
+        check_sha256(sha256)
+        row = self.row(upload_id)
+        if row is None:
+            raise ValidationError('upload was removed')
+        if row['status'] != 'uploading':
+            raise ValidationError('upload is %s' % row['status'])
+        if row['received'] != row['size']:
+            raise UploadConflict('upload is at offset %d of %d'
+                                 % (row['received'], row['size']),
+                                 row['received'])
+        expected = (sha256 or row['sha256'] or '').lower()
+        if not expected:
+            raise ValidationError('sha256 is required')
+        # only one of concurrent completions gets past here and queues it
+        with self.connect() as conn:
+            claimed = conn.execute(
+                "UPDATE uploads SET status = 'verifying', updated_at = ? "
+                "WHERE id = ? AND status = 'uploading' AND received = size "
+                'AND lease IS NULL', (time(), upload_id)).rowcount
+        if not claimed:
+            raise ValidationError('upload is %s' % self.row(upload_id)[
+                'status'])
+        if self.digest(upload_id, row) != expected:
+            # the bytes are bad, the client has to start over
+            self.delete(upload_id)
+            raise ValidationError('sha256 mismatch, upload discarded')
+        with self.connect() as conn:
+            completed = conn.execute(
+                "UPDATE uploads SET status = 'complete', sha256 = ?, "
+                "updated_at = ? WHERE id = ? AND status = 'verifying'",
+                (expected, time(), upload_id)).rowcount
+        if not completed:
+            raise ValidationError('upload was removed')
+        return row['path']
+
+    def set_job(self, upload_id, job_id):
+        with self.connect() as conn:
+            conn.execute('UPDATE uploads SET job_id = ?, updated_at = ? '
+                         'WHERE id = ?', (job_id, time(), upload_id))
+
+    def delete(self, upload_id):
+        '''
+        Removes an upload and its file
+        '''
+        row = self.row(upload_id)
+        with self.lock:
+            self.hashes.pop(upload_id, None)
+        with self.connect() as conn:
+            conn.execute('DELETE FROM uploads WHERE id = ?', (upload_id,))
+        if row is not None and os.path.exists(row['path']):
+            os.remove(row['path'])
+
+    def expire(self):
+        '''
+        Removes unfinished uploads untouched for longer than UPLOAD_EXPIRY,
+        and the records of completed ones (their files belong to the jobs)
+        '''
+        cutoff = time() - self.expiry
+        with self.connect() as conn:
+            rows = conn.execute("SELECT id FROM uploads WHERE status IN "
+                                "('uploading', 'verifying') "
+                                'AND updated_at < ?', (cutoff,)).fetchall()
+            conn.execute("DELETE FROM uploads WHERE status = 'complete' "
+                         'AND updated_at < ?', (cutoff,))
+        for row in rows:
+            self.delete(row['id'])
@@ -0,0 +1,102 @@
+'''
+Per request cost of basic auth with and without the verified-credential
+cache, against the same route without auth.  Each user polls a protected
+route after one warm-up request; uncached every request pays the PBKDF2
+check, cached only the warm-up does.  Also checks that wrong and changed
+passwords are rejected with the cache on.
+
+usage: python -m benchmarks.bench_auth [users] [requests per user]
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+from base64 import b64encode
+from time import time
+
+from flask import g, jsonify
+
+from backend import create_app, credential_cache, db
+from backend.api.authentication import auth
+from backend.models import User
+
+
+def basic(email, password):
+    token = b64encode(('%s:%s' % (email, password)).encode('utf-8'))
+    return {'Authorization': 'Basic ' + token.decode('ascii')}
+
+
+def whoami():
+    return jsonify(username=g.current_user.username)
+
+
+def anonymous():
+    return jsonify(username=None)
+
+
+def poll(client, url, users, repeat, password='secret'):
+    start = time()
+    for _ in range(repeat):
+        for user_id in range(1, users + 1):
+            response = client.get(url, headers=basic(
+                '%d@example.com' % user_id, password))
+            assert response.status_code == 200, response.status_code
+    return (time() - start) / repeat / users * 1000
+
+
+def main(users=10, repeat=20):
+    users, repeat = int(users), int(repeat)
+    workdir = tempfile.mkdtemp()
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+        workdir, 'bench.sqlite')
+    app.add_url_rule('/bench/whoami', view_func=auth.login_required(whoami))
+    app.add_url_rule('/bench/anonymous', view_func=anonymous)
+    try:
+        with app.app_context():
+            User.__table__.create(db.engine)
+            for user_id in range(1, users + 1):
+                db.session.add(User(id=user_id,
+                                    email='%d@example.com' % user_id,
+                                    username='user%d' % user_id,
+                                    password='secret'))
+            db.session.commit()
+            client = app.test_client()
+            print('%d users x %d requests' % (users, repeat))
+            print('%-14s %14s %9s' % ('auth', 'request (ms)', 'hit rate'))
+            elapsed = poll(client, '/bench/anonymous', users, repeat)
+            print('%-14s %14.2f %9s' % ('none', elapsed, '-'))
+            for name, enabled in (('basic', False), ('basic cached', True)):
+                app.config['AUTH_CACHE'] = enabled
+                credential_cache.init_app(app)
+                poll(client, '/bench/whoami', users, 1)
+                credential_cache.counters = dict.fromkeys(
+                    credential_cache.COUNTERS, 0)
+                elapsed = poll(client, '/bench/whoami', users, repeat)
+                hit_rate = credential_cache.stats()['hit_rate']
+                print('%-14s %14.2f %9s' % (
+                    name, elapsed,
+                    '-' if hit_rate is None else '%.2f' % hit_rate))
+
+            # the cache never lets a wrong or an old password through
+            response = client.get('/bench/whoami',
+                                  headers=basic('1@example.com', 'wrong'))
+            assert response.status_code == 401
+            user = db.session.get(User, 1)
+            user.password = 'changed'
+            db.session.commit()
+            response = client.get('/bench/whoami',
+                                  headers=basic('1@example.com', 'secret'))
+            assert response.status_code == 401
+            response = client.get('/bench/whoami',
+                                  headers=basic('1@example.com', 'changed'))
+            assert response.status_code == 200
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
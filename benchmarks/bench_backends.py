@@ -0,0 +1,46 @@
+'''
+Speed comparison of the XML parser backends, tests/test_parsing_backends.py
+checks that they return the same rows.
+
+usage: python -m benchmarks.bench_backends [export.xml size in MB]
+'''
+
+import os
+import sys
+import tempfile
+from time import time
+
+from backend.parsing import BACKENDS, extract, lxml_etree
+from benchmarks.synthetic import records_for_size, write_export_xml
+
+
+def available_backends():
+    return [name for name in BACKENDS if name != 'lxml' or lxml_etree]
+
+
+def main(size_mb=1024):
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'export.xml')
+    try:
+        size = write_export_xml(
+            path, records_per_day=records_for_size(size_mb << 20))
+        print('export.xml: %.1f MB' % (size / 2**20))
+        timings = {}
+        for name in available_backends():
+            start = time()
+            extract(path, backend=name)
+            timings[name] = time() - start
+        print('%-8s %9s %8s %8s' % ('backend', 'wall (s)', 'MB/sec',
+                                    'speedup'))
+        for name, elapsed in timings.items():
+            print('%-8s %9.2f %8.1f %7.2fx' % (name, elapsed,
+                                               size / 2**20 / elapsed,
+                                               timings['etree'] / elapsed))
+    finally:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,79 @@
+'''
+Dashboard load through twelve /activity_trend requests against one
+/activity_batch request for the same graphs, with the graph cache off so
+every load is computed.  Runs against the rollups and against the SQL
+GROUP BY path, and checks the batch returns the same graphs.
+
+usage: python -m benchmarks.bench_batch [users] [loads per user]
+'''
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+from time import time
+
+from backend import create_app, db, graph_cache
+from benchmarks.bench_cache import DASHBOARD, credentials, fill
+
+RECENT = 12
+
+
+def single(client, user_id):
+    graphs = []
+    for agg, kind in DASHBOARD:
+        response = client.post('/api/v1/activity_trend',
+                               headers=credentials(user_id), json={
+                                   'agg': agg, 'kind': kind, 'recent': RECENT})
+        assert response.status_code == 200
+        graphs.append(json.loads(response.data))
+    return graphs
+
+
+def batch(client, user_id):
+    response = client.post('/api/v1/activity_batch',
+                           headers=credentials(user_id), json={
+        'graphs': [[agg, kind, RECENT] for agg, kind in DASHBOARD]})
+    assert response.status_code == 200
+    return [item['graph'] for item in json.loads(response.data)['graphs']]
+
+
+def main(users=20, loads=5):
+    users, loads = int(users), int(loads)
+    workdir = tempfile.mkdtemp()
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+        workdir, 'bench.sqlite')
+    app.config['GRAPH_CACHE_BACKEND'] = 'none'
+    try:
+        with app.app_context():
+            fill(users)
+            graph_cache.init_app(app)
+            client = app.test_client()
+            print('%d users, %d graphs per dashboard' % (users,
+                                                         len(DASHBOARD)))
+            print('%-8s %-8s %10s %14s' % ('source', 'client', 'requests',
+                                           'load (ms)'))
+            for source, rollups in (('rollups', True), ('sql', False)):
+                app.config['GRAPH_ROLLUPS'] = rollups
+                for user_id in range(1, users + 1):
+                    assert single(client, user_id) == batch(client, user_id), \
+                        'batch and single graphs differ'
+                for name, load, requests in (('single', single, len(DASHBOARD)),
+                                             ('batch', batch, 1)):
+                    start = time()
+                    for _ in range(loads):
+                        for user_id in range(1, users + 1):
+                            load(client, user_id)
+                    elapsed = (time() - start) / loads / users
+                    print('%-8s %-8s %10d %14.2f' % (source, name, requests,
+                                                     elapsed * 1000))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
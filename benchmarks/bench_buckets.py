@@ -0,0 +1,68 @@
+'''
+Calendar bucketing throughput: the strftime/to_datetime round trip and
+timedelta series the graphs used against the datetime64 arithmetic of
+backend.api.buckets, over the daily rows of 10 years x users.  The string
+round trip is timed on a sample of the rows and its full time projected.
+
+usage: python -m benchmarks.bench_buckets [users] [sample rows]
+'''
+
+import sys
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from backend.api.buckets import bucket_days
+
+DAYS = 10 * 365
+
+
+def strftime_keys(dates, agg):
+    if agg == 'week_start':
+        return dates - pd.to_timedelta(dates.dt.dayofweek, unit='d')
+    if agg == 'month':
+        return pd.to_datetime(dates.dt.strftime('%Y-%m') + '-01')
+    return pd.to_datetime(dates.dt.strftime('%Y') + '-01-01')
+
+
+def epoch_days(dates):
+    '''
+    int32 days since the epoch of a datetime64 series, as Columns holds them
+    '''
+    return dates.to_numpy().astype('datetime64[D]').astype('int32')
+
+
+def timed(func, *args):
+    start = time()
+    result = func(*args)
+    return result, time() - start
+
+
+def main(users=10000, sample=1000000):
+    users, sample = int(users), int(sample)
+    days = np.arange(np.datetime64('2015-01-01'),
+                     np.datetime64('2015-01-01') + DAYS)
+    dates = pd.Series(np.tile(days, users).astype('datetime64[ns]'))
+    rows = len(dates)
+    head = dates.iloc[:sample]
+    days = epoch_days(dates)
+    print('%d users x %d days = %d rows, strftime sample %d rows'
+          % (users, DAYS, rows, len(head)))
+    print('%-16s %14s %14s %9s' % ('agg', 'strftime (s)', 'datetime64 (s)',
+                                   'speedup'))
+    for agg in ('week_start', 'month', 'year'):
+        old, elapsed = timed(strftime_keys, head, agg)
+        new = bucket_days(epoch_days(head), agg, 0)
+        assert (old.to_numpy() == new.astype('datetime64[D]')).all(), agg
+        projected = elapsed * rows / len(head)
+        _, elapsed = timed(bucket_days, days, agg, 0)
+        print('%-16s %14.2f %14.2f %8.1fx' % (agg, projected, elapsed,
+                                              projected / elapsed))
+    # weeks starting on Sunday, no string based equivalent
+    _, elapsed = timed(bucket_days, days, 'week_start', 6)
+    print('%-16s %14s %14.2f' % ('week (Sunday)', '-', elapsed))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
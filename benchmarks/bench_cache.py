@@ -0,0 +1,93 @@
+'''
+Dashboard refresh latency through the graph endpoints with each graph cache
+backend.  Every refresh posts move/exercise/stand at day/week/month/year to
+/activity_trend; the first refresh fills the cache, the rest are timed.
+
+usage: python -m benchmarks.bench_cache [users] [refreshes per user]
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+from functools import lru_cache
+from time import time
+
+from backend import create_app, db, graph_cache
+from backend.loader import bulk_insert
+from backend.models import ActivityData, Rollup, User
+from backend.rollups import update_rollups
+from benchmarks.bench_auth import basic
+from benchmarks.bench_load import activity_frame
+
+BACKENDS = ['none', 'memory', 'filesystem', 'sqlite']
+DASHBOARD = [(agg, kind) for agg in ('date', 'week_start', 'month', 'year')
+             for kind in ('move', 'exercise', 'stand')]
+
+
+@lru_cache(maxsize=None)
+def credentials(user_id):
+    '''
+    Token auth headers of a user, the graph endpoints serve the
+    authenticated user
+    '''
+    return basic(db.session.get(User, user_id).generate_auth_token(), '')
+
+
+def refresh(client, user_id):
+    for agg, kind in DASHBOARD:
+        response = client.post('/api/v1/activity_trend',
+                               headers=credentials(user_id), json={
+                                   'agg': agg, 'kind': kind, 'recent': 12})
+        assert response.status_code == 200
+
+
+def fill(users):
+    for model in (User, ActivityData, Rollup):
+        model.__table__.create(db.engine)
+    for user_id in range(1, users + 1):
+        db.session.add(User(id=user_id, email='%d@example.com' % user_id,
+                            username='user%d' % user_id))
+        bulk_insert(ActivityData,
+                    activity_frame(5 * 365).assign(user_id=user_id))
+        update_rollups(user_id, sources=['activity_data'])
+    db.session.commit()
+
+
+def main(users=20, refreshes=10):
+    users, refreshes = int(users), int(refreshes)
+    workdir = tempfile.mkdtemp()
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+        workdir, 'bench.sqlite')
+    try:
+        with app.app_context():
+            fill(users)
+            client = app.test_client()
+            print('%d users, %d graphs per refresh' % (users, len(DASHBOARD)))
+            print('%-11s %14s %9s' % ('backend', 'refresh (ms)', 'hit rate'))
+            for name in BACKENDS:
+                app.config['GRAPH_CACHE_BACKEND'] = name
+                app.config['GRAPH_CACHE_PATH'] = os.path.join(workdir, name)
+                graph_cache.init_app(app)
+                # first refresh fills the cache
+                for user_id in range(1, users + 1):
+                    refresh(client, user_id)
+                graph_cache.counters = dict.fromkeys(graph_cache.COUNTERS, 0)
+                start = time()
+                for _ in range(refreshes):
+                    for user_id in range(1, users + 1):
+                        refresh(client, user_id)
+                elapsed = (time() - start) / refreshes / users * 1000
+                hit_rate = graph_cache.stats()['hit_rate']
+                print('%-11s %14.2f %9s' % (
+                    name, elapsed,
+                    '-' if hit_rate is None else '%.2f' % hit_rate))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,109 @@
+'''
+Per request allocation and latency of the aggregation behind the graphs
+without a bucket expression: the original pipeline (every column read into a
+dataframe, grouped and given variance columns), a pandas groupby over only
+the needed columns, and the struct of arrays core of backend.api.columnar.
+Peak allocation is traced with tracemalloc, latency is timed untraced.
+
+usage: python -m benchmarks.bench_columnar [requests per case]
+'''
+
+import os
+import sys
+import tempfile
+import tracemalloc
+from time import time
+
+import pandas as pd
+from sqlalchemy.sql import select
+
+from backend import create_app, db
+from backend.api import metrics
+from backend.api.buckets import bucket_days
+from backend.api.metrics import ACTIVITY
+from backend.loader import bulk_insert
+from backend.models import ActivityData
+from benchmarks.bench_load import activity_frame
+from benchmarks.bench_metrics import original_graph
+
+YEARS = [1, 10, 20]
+CASES = [('date', 30), ('week_start', 12), ('month', 12)]
+COLUMNS = ACTIVITY.metrics['move'].columns
+
+
+def original(user_id, recent, agg):
+    return original_graph(user_id, recent, agg, 'move')
+
+
+def groupby(user_id, recent, agg):
+    '''
+    Only the graph's columns read into pandas, summed by groupby
+    '''
+    table = ActivityData.__table__
+    s = select([table.c.date] + [table.c[column] for column in COLUMNS]).\
+        where(table.c.user_id == user_id).order_by(table.c.date)
+    df = pd.read_sql(s, con=db.engine, parse_dates=['date'])
+    days = df['date'].to_numpy().astype('datetime64[D]').astype('int32')
+    keys = pd.Series(bucket_days(days, agg).astype('datetime64[D]'),
+                     name='date').astype('datetime64[ns]')
+    frame = df[COLUMNS].groupby(keys).sum().reset_index()
+    return metrics.last_buckets(frame, recent)
+
+
+def columnar(user_id, recent, agg):
+    return metrics.columnar_frame(ACTIVITY, user_id, agg, COLUMNS, recent)
+
+
+def peak(func, *args):
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def latency(func, args, repeat):
+    start = time()
+    for _ in range(repeat):
+        frame = func(*args)
+    return (time() - start) / repeat * 1000, frame.reset_index(drop=True)
+
+
+def main(repeat=20):
+    repeat = int(repeat)
+    fd, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    paths = [('original', original), ('groupby', groupby),
+             ('columnar', columnar)]
+    try:
+        with app.app_context():
+            ActivityData.__table__.create(db.engine)
+            for user_id, years in enumerate(YEARS, 1):
+                bulk_insert(ActivityData,
+                            activity_frame(years * 365).assign(user_id=user_id))
+            print('%-6s %-11s %-9s %10s %12s' % ('years', 'agg', 'path',
+                                                 'ms', 'peak KB'))
+            for user_id, years in enumerate(YEARS, 1):
+                for agg, recent in CASES:
+                    expected = None
+                    for name, func in paths:
+                        elapsed, frame = latency(func, (user_id, recent, agg),
+                                                 repeat)
+                        if expected is None:
+                            expected = frame
+                        pd.testing.assert_frame_equal(frame, expected,
+                                                      check_dtype=False)
+                        size = peak(func, user_id, recent, agg)
+                        print('%-6d %-11s %-9s %10.2f %12.1f' % (
+                            years, agg, name, elapsed, size / 1024))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
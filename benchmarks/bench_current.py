@@ -0,0 +1,85 @@
+'''
+Latency of the current period graph (/activity_current) against years of
+history: the old pandas path, grouping all buckets in SQL and keeping the
+newest, and reading only the rows of the latest bucket (current_period).
+
+usage: python -m benchmarks.bench_current [requests per case]
+'''
+
+import os
+import sys
+import tempfile
+from time import time
+
+import pandas as pd
+
+from backend import create_app, db
+from backend.api.activity import activity_graph
+from backend.api.aggregate import current_period
+from backend.loader import bulk_insert
+from backend.models import ActivityData
+from benchmarks.bench_graphs import pandas_graph
+from benchmarks.bench_load import activity_frame
+
+YEARS = [1, 5, 10, 20]
+AGGREGATES = ['date', 'week_start', 'month', 'year']
+
+
+def pandas_current(user_id, agg):
+    graph = pandas_graph(user_id, 1, agg, 'move')
+    return graph[graph['date'] == graph['date'].max()]
+
+
+def sql_current(user_id, agg):
+    return activity_graph(user_id, 1, agg, 'move')
+
+
+def period_current(user_id, agg):
+    period = current_period(ActivityData, user_id, agg)
+    return activity_graph(user_id, 1, agg, 'move', period)
+
+
+PATHS = [('pandas', pandas_current), ('sql', sql_current),
+         ('period', period_current)]
+
+
+def timed(func, user_id, agg, repeat):
+    start = time()
+    for _ in range(repeat):
+        frame = func(user_id, agg)
+    return (time() - start) / repeat * 1000, frame.reset_index(drop=True)
+
+
+def main(repeat=20):
+    repeat = int(repeat)
+    fd, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    # the live GROUP BY path, not the rollups table
+    app.config['GRAPH_ROLLUPS'] = False
+    try:
+        with app.app_context():
+            ActivityData.__table__.create(db.engine)
+            for user_id, years in enumerate(YEARS, 1):
+                bulk_insert(ActivityData,
+                            activity_frame(years * 365).assign(user_id=user_id))
+            print('%-6s %-11s' % ('years', 'agg') +
+                  ''.join('%13s' % ('%s (ms)' % name) for name, _ in PATHS))
+            for user_id, years in enumerate(YEARS, 1):
+                for agg in AGGREGATES:
+                    results = [timed(func, user_id, agg, repeat)
+                               for _, func in PATHS]
+                    for _, frame in results[1:]:
+                        pd.testing.assert_frame_equal(frame, results[0][1],
+                                                      check_dtype=False)
+                    print('%-6d %-11s' % (years, agg) +
+                          ''.join('%13.2f' % elapsed for elapsed, _ in results))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
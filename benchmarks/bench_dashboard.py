@@ -0,0 +1,122 @@
+'''
+Cold dashboard load (login, then the twelve graphs) with the graph
+endpoints bound to the authenticated user against the flow before: login,
+/users/get_id to turn the email into a user_id, then graphs naming that
+user_id without credentials (replayed through the unprotected view).  The
+graph, credential and identity caches are cleared before every load.
+
+usage: python -m benchmarks.bench_dashboard [users] [loads per user]
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+from time import time
+
+from flask import g, request
+
+from backend import create_app, credential_cache, db, graph_cache, \
+    identity_cache
+from backend.api.activity import pull_activity_trend
+from backend.models import User
+from benchmarks.bench_auth import basic
+from benchmarks.bench_cache import DASHBOARD, fill
+
+RECENT = 12
+
+
+def unprotected(view):
+    '''
+    A graph view without auth.login_required, graphing the user_id of the
+    request like the endpoints used to
+    '''
+    def legacy_view():
+        g.current_user = User(id=request.get_json()['user_id'])
+        return view.__wrapped__()
+    return legacy_view
+
+
+def graphs(client, url, headers=None, user_id=None):
+    for agg, kind in DASHBOARD:
+        data = {'agg': agg, 'kind': kind, 'recent': RECENT}
+        if user_id is not None:
+            data['user_id'] = user_id
+        response = client.post(url, headers=headers, json=data)
+        assert response.status_code == 200, response.status_code
+
+
+def login(client, email):
+    response = client.post('/auth/login', json={'email': email,
+                                                 'password': 'secret'})
+    data = response.get_json()
+    assert data['registered']
+    return data
+
+
+def before(client, email):
+    login(client, email)
+    response = client.post('/api/v1/users/get_id', json={'email': email})
+    user_id = response.get_json()['user_id']
+    graphs(client, '/bench/activity_trend', user_id=user_id)
+    return 2 + len(DASHBOARD)
+
+
+def after_token(client, email):
+    token = login(client, email)['token']
+    graphs(client, '/api/v1/activity_trend', basic(token, ''))
+    return 1 + len(DASHBOARD)
+
+
+def after_basic(client, email):
+    login(client, email)
+    graphs(client, '/api/v1/activity_trend', basic(email, 'secret'))
+    return 1 + len(DASHBOARD)
+
+
+def main(users=10, loads=3):
+    users, loads = int(users), int(loads)
+    workdir = tempfile.mkdtemp()
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+        workdir, 'bench.sqlite')
+    app.add_url_rule('/bench/activity_trend', methods=['POST'],
+                     view_func=unprotected(pull_activity_trend))
+    try:
+        with app.app_context():
+            fill(users)
+            password_hash = User(password='secret').password_hash
+            User.query.update({User.password_hash: password_hash})
+            db.session.commit()
+            client = app.test_client()
+            emails = ['%d@example.com' % user_id
+                      for user_id in range(1, users + 1)]
+            # without credentials the graphs are refused
+            response = client.post('/api/v1/activity_trend', json={
+                'user_id': 1, 'agg': 'month', 'kind': 'move', 'recent': 12})
+            assert response.status_code == 401
+            print('%d users, cold dashboard of %d graphs' % (users,
+                                                             len(DASHBOARD)))
+            print('%-22s %10s %12s' % ('flow', 'requests', 'load (ms)'))
+            for name, flow in (('before: get_id', before),
+                               ('after: token', after_token),
+                               ('after: basic auth', after_basic)):
+                elapsed = 0
+                for _ in range(loads):
+                    for email in emails:
+                        graph_cache.clear()
+                        credential_cache.clear()
+                        identity_cache.clear()
+                        start = time()
+                        requests = flow(client, email)
+                        elapsed += time() - start
+                print('%-22s %10d %12.2f' % (
+                    name, requests, elapsed / loads / users * 1000))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
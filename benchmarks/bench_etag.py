@@ -0,0 +1,86 @@
+'''
+Bytes sent and server CPU of a polling dashboard client, plain GETs versus
+conditional GETs that send back the last ETag (If-None-Match).  Runs with
+the graph cache off and on; the data doesn't change while polling, so every
+conditional request after the first should be a 304.
+
+usage: python -m benchmarks.bench_etag [users] [polls per user]
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+from time import process_time
+
+from backend import create_app, db, graph_cache
+from benchmarks.bench_cache import DASHBOARD, credentials, fill
+
+RECENT = 12
+
+
+def poll(client, user_id, etags):
+    '''
+    One dashboard refresh, returns the bytes received and the number of
+    304 responses
+    '''
+    received = not_modified = 0
+    for agg, kind in DASHBOARD:
+        url = ('/api/v1/activity_trend?agg=%s&kind=%s&recent=%d'
+               % (agg, kind, RECENT))
+        # the same url graphs whichever user authenticates
+        key = (user_id, url)
+        headers = dict(credentials(user_id))
+        if etags is not None and key in etags:
+            headers['If-None-Match'] = etags[key]
+        response = client.get(url, headers=headers)
+        assert response.status_code in (200, 304)
+        if etags is not None:
+            etags[key] = response.headers['ETag']
+        received += len(response.data)
+        not_modified += response.status_code == 304
+    return received, not_modified
+
+
+def main(users=20, polls=10):
+    users, polls = int(users), int(polls)
+    workdir = tempfile.mkdtemp()
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+        workdir, 'bench.sqlite')
+    try:
+        with app.app_context():
+            fill(users)
+            client = app.test_client()
+            print('%d users x %d polls of %d graphs' % (users, polls,
+                                                         len(DASHBOARD)))
+            print('%-8s %-12s %12s %16s' % ('cache', 'client', 'KB sent',
+                                            'CPU/poll (ms)'))
+            for backend in ('none', 'memory'):
+                app.config['GRAPH_CACHE_BACKEND'] = backend
+                graph_cache.init_app(app)
+                for name, conditional in (('plain', False),
+                                          ('conditional', True)):
+                    etags = {} if conditional else None
+                    received = not_modified = 0
+                    start = process_time()
+                    for _ in range(polls):
+                        for user_id in range(1, users + 1):
+                            sent, unchanged = poll(client, user_id, etags)
+                            received += sent
+                            not_modified += unchanged
+                    # only the first poll of each graph renders a body
+                    assert not_modified == (
+                        (polls - 1) * users * len(DASHBOARD)
+                        if conditional else 0)
+                    cpu = (process_time() - start) / polls / users * 1000
+                    print('%-8s %-12s %12.1f %16.2f' % (
+                        backend, name, received / 1024, cpu))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,78 @@
+'''
+Latency and response size of the activity graph endpoints against years of
+history, grouping in SQL (activity_graph) versus reading every row into
+pandas first (the old activity_summary path).  Both must return the same
+graph, up to float summation order.
+
+usage: python -m benchmarks.bench_graphs [requests per case]
+'''
+
+import os
+import sys
+import tempfile
+from time import time
+
+import pandas as pd
+from sqlalchemy.sql import select
+
+from backend import create_app, db
+from backend.api.activity import activity_graph
+from backend.loader import bulk_insert
+from backend.models import ActivityData
+from benchmarks.bench_load import activity_frame
+from benchmarks.bench_metrics import activity_summary
+
+YEARS = [1, 5, 10]
+CASES = [('week_start', 12), ('month', 12), ('year', 5)]
+
+
+def pandas_graph(user_id, recent, agg, kind):
+    s = select([ActivityData]).where(ActivityData.user_id==user_id)
+    df = pd.read_sql(s, con=db.engine, parse_dates=['date'])
+    return activity_summary(df, recent, agg, kind)
+
+
+def timed(graph, user_id, recent, agg, repeat):
+    start = time()
+    for _ in range(repeat):
+        frame = graph(user_id, recent, agg, 'move')
+        body = frame.to_json(date_format='iso', index=False, orient='table')
+    return (time() - start) / repeat * 1000, frame, len(body)
+
+
+def main(repeat=20):
+    repeat = int(repeat)
+    fd, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    # the live GROUP BY path, not the rollups table
+    app.config['GRAPH_ROLLUPS'] = False
+    try:
+        with app.app_context():
+            ActivityData.__table__.create(db.engine)
+            for user_id, years in enumerate(YEARS, 1):
+                bulk_insert(ActivityData,
+                            activity_frame(years * 365).assign(user_id=user_id))
+            print('%-6s %-11s %6s %12s %12s %8s' % (
+                'years', 'agg', 'recent', 'pandas (ms)', 'sql (ms)',
+                'bytes'))
+            for user_id, years in enumerate(YEARS, 1):
+                for agg, recent in CASES:
+                    old, expected, _ = timed(pandas_graph, user_id, recent,
+                                             agg, repeat)
+                    new, graph, size = timed(activity_graph, user_id, recent,
+                                             agg, repeat)
+                    pd.testing.assert_frame_equal(
+                        graph.reset_index(drop=True),
+                        expected.reset_index(drop=True), check_dtype=False)
+                    print('%-6d %-11s %6d %12.2f %12.2f %8d' % (
+                        years, agg, recent, old, new, size))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
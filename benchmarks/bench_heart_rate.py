@@ -0,0 +1,93 @@
+'''
+Peak RSS of heart rate ingestion: the streaming per (date, gadget)
+aggregator against collecting every sample into lists and grouping them
+with pandas afterwards (the old, commented out Record path).  Each mode
+runs in a fresh process so the peaks don't mask each other.
+
+usage: python -m benchmarks.bench_heart_rate [heart rate records] [backend]
+'''
+
+import os
+import resource
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from backend.parsing import HEART_RATE_SPEC, TableSpec, extract, to_frames
+from benchmarks.synthetic import write_export_xml
+
+DAYS = 365
+
+SAMPLES_SPEC = TableSpec('heart_rate', 'Record', [
+    ('startDate', 'start_date'),
+    ('device', 'device'),
+    ('value', 'value'),
+], numeric=['value'], where=HEART_RATE_SPEC.where)
+
+
+def aggregate(path, backend):
+    frame = to_frames(extract(path, [HEART_RATE_SPEC], backend),
+                      [HEART_RATE_SPEC])['heart_rate']
+    return frame[['date', 'gadget', 'count', 'min', 'max']]
+
+
+def lists(path, backend):
+    record = to_frames(extract(path, [SAMPLES_SPEC], backend),
+                       [SAMPLES_SPEC])['heart_rate']
+    record['date'] = record['start_date'].str[:10]
+    record['gadget'] = np.where(record['device'].str.contains('Apple Watch'),
+                                'Apple Watch', 'iPhone')
+    return record.groupby(['date', 'gadget'])['value'].agg(
+        ['count', 'min', 'max']).reset_index()
+
+
+def measure(mode, path, backend):
+    '''
+    Runs in a worker process, returns wall time, peak RSS and the result
+    '''
+    start = time()
+    frame = MODES[mode](path, backend)
+    elapsed = time() - start
+    # ru_maxrss is in KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss << 10
+    return elapsed, peak, frame
+
+
+MODES = {
+    'aggregate': aggregate,
+    'lists': lists,
+}
+
+
+def main(records=5000000, backend='expat'):
+    records = int(records)
+    fd, path = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+    try:
+        size = write_export_xml(path, days=DAYS, heart_rate_share=1.0,
+                                records_per_day=-(-records // DAYS))
+        print('export.xml: %.1f MB, %d heart rate records, backend: %s'
+              % (size / 2**20, -(-records // DAYS) * DAYS, backend))
+        print('%-10s %9s %10s %6s' % ('mode', 'wall (s)', 'peak (MB)',
+                                      'rows'))
+        results = {}
+        for mode in MODES:
+            # fresh process per mode, ru_maxrss never goes down
+            with ProcessPoolExecutor(1) as pool:
+                elapsed, peak, frame = pool.submit(measure, mode, path,
+                                                   backend).result()
+            results[mode] = frame
+            print('%-10s %9.2f %10.1f %6d' % (mode, elapsed, peak / 2**20,
+                                              len(frame.index)))
+        pd.testing.assert_frame_equal(results['aggregate'], results['lists'],
+                                      check_dtype=False)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
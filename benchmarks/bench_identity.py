@@ -0,0 +1,119 @@
+'''
+Latency of the email -> user lookups with the identity cache off and on:
+/users/get_id per email, the /users/lookup batch endpoint for all of them,
+and basic auth (credential cache on).  Also checks that registrations and
+password changes are seen through the cache.
+
+usage: python -m benchmarks.bench_identity [users] [rounds]
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+from time import time
+
+from backend import create_app, db, identity_cache
+from backend.api.authentication import auth
+from backend.models import User
+from benchmarks.bench_auth import basic, whoami
+
+
+def timed(func, rounds):
+    start = time()
+    for _ in range(rounds):
+        func()
+    return (time() - start) / rounds * 1000
+
+
+def main(users=200, rounds=5):
+    users, rounds = int(users), int(rounds)
+    workdir = tempfile.mkdtemp()
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+        workdir, 'bench.sqlite')
+    app.add_url_rule('/bench/whoami', view_func=auth.login_required(whoami))
+    app.config['ADMIN_USERS'] = [1]
+    try:
+        with app.app_context():
+            User.__table__.create(db.engine)
+            emails = ['%d@example.com' % user_id
+                      for user_id in range(1, users + 1)]
+            # one hash for all users, only the lookups are measured
+            password_hash = User(password='secret').password_hash
+            for user_id, email in enumerate(emails, 1):
+                db.session.add(User(id=user_id, email=email,
+                                    username='user%d' % user_id,
+                                    password_hash=password_hash))
+            db.session.commit()
+            client = app.test_client()
+            admin = basic(emails[0], 'secret')
+
+            def get_ids():
+                for user_id, email in enumerate(emails, 1):
+                    response = client.post('/api/v1/users/get_id',
+                                           json={'email': email})
+                    assert response.get_json()['user_id'] == user_id
+
+            def lookup():
+                response = client.post('/api/v1/users/lookup', headers=admin,
+                                       json={'emails': emails + ['nobody']})
+                found = response.get_json()['users']
+                assert found['nobody'] is None
+                assert found[emails[-1]]['user_id'] == users
+
+            def logins():
+                for email in emails[:50]:
+                    response = client.get('/bench/whoami',
+                                          headers=basic(email, 'secret'))
+                    assert response.status_code == 200
+
+            print('%d users, ms per round' % users)
+            print('%-9s %12s %12s %14s %9s' % (
+                'identity', 'get_id x%d' % users, 'lookup x1',
+                'basic auth x50', 'hit rate'))
+            for name, enabled in (('off', False), ('on', True)):
+                app.config['IDENTITY_CACHE'] = enabled
+                identity_cache.init_app(app)
+                # warm-up, fills the caches
+                get_ids()
+                logins()
+                identity_cache.counters = dict.fromkeys(
+                    identity_cache.COUNTERS, 0)
+                times = [timed(get_ids, rounds), timed(lookup, rounds),
+                         timed(logins, rounds)]
+                hit_rate = identity_cache.stats()['hit_rate']
+                print('%-9s %12.2f %12.2f %14.2f %9s' % (
+                    name, *times,
+                    '-' if hit_rate is None else '%.2f' % hit_rate))
+
+            # registrations and password changes are seen at once
+            response = client.post('/auth/register', json={
+                'email': 'new@example.com', 'username': 'new',
+                'password1': 'secret', 'password2': 'secret'})
+            assert response.get_json()['registered']
+            response = client.post('/api/v1/users/get_user',
+                                   json={'email': 'new@example.com'})
+            assert response.get_json()['username'] == 'new'
+            user = db.session.get(User, 2)
+            user.password = 'changed'
+            db.session.commit()
+            assert client.get('/bench/whoami', headers=basic(
+                emails[1], 'secret')).status_code == 401
+            assert client.get('/bench/whoami', headers=basic(
+                emails[1], 'changed')).status_code == 200
+            # the batch endpoint is for admins only
+            response = client.post('/api/v1/users/lookup',
+                                   json={'emails': emails})
+            assert response.status_code == 401
+            response = client.post('/api/v1/users/lookup', json={
+                'emails': emails}, headers=basic(emails[2], 'secret'))
+            assert response.status_code == 403
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
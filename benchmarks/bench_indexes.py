@@ -0,0 +1,126 @@
+'''
+Query plans and latency of the per user queries on SQLite with and without
+the (user_id, date) indexes.  The plan of every query shape the API and the
+upload path run is asserted to use the matching index before anything is
+timed.
+
+usage: python -m benchmarks.bench_indexes [users] [days per user]
+'''
+
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+from time import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, func
+from sqlalchemy.sql import select
+
+from backend.loader import bulk_insert
+from backend.models import LOADED_MODELS, ActivityData, HeartRate, \
+    WorkoutData
+from benchmarks.bench_load import activity_frame, workout_frame
+
+START = date(2015, 1, 1)
+REPEAT = 50
+
+
+def query_shapes(user_id, since):
+    '''
+    (name, statement, expected index) for the queries run per user, the
+    expected index may be a prefix of its name
+    '''
+    shapes = []
+    for model in LOADED_MODELS:
+        table = model.__table__
+        index = 'ix_%s_user_id_date' % table.name
+        shapes += [
+            # any (user_id, ...) index serves this, SQLite picks one
+            ('%s select' % table.name,
+             select([table]).where(table.c.user_id == user_id),
+             'ix_%s_user_id_' % table.name),
+            ('%s high-water' % table.name,
+             select([func.max(table.c.date)]).
+             where(table.c.user_id == user_id), index),
+            ('%s delete' % table.name,
+             table.delete().where(table.c.user_id == user_id).
+             where(table.c.date >= since), index),
+        ]
+    workout = WorkoutData.__table__
+    shapes.append(('workout_data start_date range',
+                   select([workout]).where(workout.c.user_id == user_id).
+                   where(workout.c.start_date >= since),
+                   'ix_workout_data_user_id_start_date'))
+    return shapes
+
+
+def query_plan(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect)
+    params = tuple(str(value) if isinstance(value, date) else value
+                   for value in (compiled.params[name]
+                                 for name in compiled.positiontup))
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled),
+                                params).fetchall()
+    return ' | '.join(row[-1] for row in rows)
+
+
+def fill(engine, users, days):
+    for model in LOADED_MODELS:
+        model.__table__.create(engine)
+    activity = activity_frame(days)
+    workout = workout_frame(days)
+    heart_rate = pd.DataFrame({
+        'date': activity['date'], 'gadget': 'Apple Watch',
+        'avg': np.random.default_rng(2).uniform(60, 90, days),
+        'max': 160.0, 'min': 50.0})
+    for user_id in range(1, users + 1):
+        for model, df in ((ActivityData, activity), (WorkoutData, workout),
+                          (HeartRate, heart_rate)):
+            bulk_insert(model, df.assign(user_id=user_id), engine=engine)
+
+
+def latency(engine, user_id):
+    '''
+    Milliseconds per API select of one user's activity data
+    '''
+    table = ActivityData.__table__
+    statement = select([table]).where(table.c.user_id == user_id)
+    start = time()
+    for _ in range(REPEAT):
+        with engine.connect() as conn:
+            conn.execute(statement).fetchall()
+    return (time() - start) / REPEAT * 1000
+
+
+def main(users=1000, days=365):
+    users, days = int(users), int(days)
+    fd, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    engine = create_engine('sqlite:///' + path)
+    try:
+        fill(engine, users, days)
+        user_id = users // 2
+        since = START + timedelta(days=days - 1)
+        with engine.connect() as conn:
+            for name, statement, index in query_shapes(user_id, since):
+                plan = query_plan(conn, statement)
+                assert index in plan, '%s does not use %s: %s' % (
+                    name, index, plan)
+        print('query plans: all per user queries use their index')
+        indexed = latency(engine, user_id)
+        for model in LOADED_MODELS:
+            for index in model.__table__.indexes:
+                index.drop(engine)
+        scan = latency(engine, user_id)
+        print('%d users x %d days' % (users, days))
+        print('%-10s %12s' % ('indexes', 'select (ms)'))
+        print('%-10s %12.2f' % ('none', scan))
+        print('%-10s %12.2f' % ('user_date', indexed))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,100 @@
+'''
+Compares the legacy save -> extractall -> iterparse ingest with streaming
+export.xml straight out of the uploaded zip.  Reports wall time and the peak
+disk usage of the upload folder for each path.
+
+usage: python -m benchmarks.bench_ingest [export.xml size in MB]
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from time import time
+
+from backend.models import AppleParser
+from benchmarks.synthetic import records_for_size, write_export_zip
+
+
+class DiskMonitor(threading.Thread):
+    '''
+    Polls the size of a folder in the background and keeps the peak
+    '''
+    def __init__(self, path, interval=0.005):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, folder_size(self.path))
+            self._done.wait(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.peak = max(self.peak, folder_size(self.path))
+
+
+def folder_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def legacy(zip_path, folder):
+    parser = AppleParser(None, 1)
+    # file.save() in upload_file
+    shutil.copy(zip_path, os.path.join(folder, 'export.zip'))
+    parser.unzip_file(folder)
+    parser.activity_summary(folder)
+
+
+def stream(zip_path, folder):
+    parser = AppleParser(None, 1)
+    with parser.open_export(zip_path) as export:
+        parser.activity_summary(folder, export)
+
+
+def run(name, func, zip_path, workdir):
+    folder = os.path.join(workdir, name, '1')
+    os.makedirs(folder)
+    monitor = DiskMonitor(os.path.join(workdir, name))
+    monitor.start()
+    start = time()
+    func(zip_path, folder)
+    elapsed = time() - start
+    monitor.stop()
+    shutil.rmtree(os.path.join(workdir, name))
+    return elapsed, monitor.peak
+
+
+def main(size_mb=200):
+    workdir = tempfile.mkdtemp()
+    try:
+        zip_path = os.path.join(workdir, 'upload.zip')
+        xml_size = write_export_zip(
+            zip_path, records_per_day=records_for_size(size_mb << 20))
+        zip_size = os.path.getsize(zip_path)
+        print('export.xml: %.1f MB, export.zip: %.1f MB'
+              % (xml_size / 2**20, zip_size / 2**20))
+        results = {}
+        for name, func in [('legacy', legacy), ('stream', stream)]:
+            results[name] = run(name, func, zip_path, workdir)
+        print('%-8s %10s %14s' % ('path', 'wall (s)', 'peak disk (MB)'))
+        for name, (elapsed, peak) in results.items():
+            print('%-8s %10.2f %14.1f' % (name, elapsed, peak / 2**20))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,112 @@
+'''
+Rows/sec of DataFrame.to_sql (the old loader) against loader.bulk_insert for
+each dialect path.  SQLite always runs against a temp file; PostgreSQL runs
+when BENCH_POSTGRES_URL points at a scratch database.
+
+usage: python -m benchmarks.bench_load [rows]
+'''
+
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+from time import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, func
+from sqlalchemy.sql import select
+
+from backend.loader import bulk_insert
+from backend.models import ActivityData, WorkoutData
+
+
+def activity_frame(rows):
+    rng = np.random.default_rng(0)
+    start = date(2015, 1, 1)
+    return pd.DataFrame({
+        'user_id': 1,
+        'date': [start + timedelta(days=i) for i in range(rows)],
+        'energy_burned': rng.uniform(100, 900, rows),
+        'energy_burned_goal': 450,
+        'energy_burned_unit': 'Cal',
+        'exercise_time': rng.integers(0, 90, rows),
+        'exercise_time_goal': 30,
+        'stand_hours': rng.integers(0, 16, rows),
+        'stand_hours_goal': 12,
+        'created_at': pd.Timestamp.now(),
+        'updated_at': pd.Timestamp.now(),
+        'last_updated_by': 'bench',
+    })
+
+
+def workout_frame(rows):
+    rng = np.random.default_rng(1)
+    start = date(2015, 1, 1)
+    days = [start + timedelta(days=i) for i in range(rows)]
+    return pd.DataFrame({
+        'user_id': 1,
+        'date': days,
+        'activity': 'Running',
+        'duration': rng.uniform(20, 60, rows),
+        'duration_unit': 'min',
+        'total_distance': rng.uniform(1, 6, rows),
+        'total_distance_unit': 'mi',
+        'total_energy_burned': rng.uniform(150, 600, rows),
+        'total_energy_burned_unit': 'Cal',
+        'gadget': 'Apple Watch',
+        'start_date': ['%s 07:00:00 -0700' % day for day in days],
+        'end_date': ['%s 07:45:00 -0700' % day for day in days],
+        'created_at': pd.Timestamp.now(),
+        'updated_at': pd.Timestamp.now(),
+        'last_updated_by': 'bench',
+    })
+
+
+def run(engine, model, df):
+    table = model.__table__
+    results = []
+    for name in ('to_sql', 'bulk_insert'):
+        table.drop(engine, checkfirst=True)
+        table.create(engine)
+        start = time()
+        if name == 'to_sql':
+            df.to_sql(name=table.name, con=engine, if_exists='append',
+                      index=False)
+        else:
+            bulk_insert(model, df, engine=engine)
+        elapsed = time() - start
+        with engine.connect() as conn:
+            count = conn.execute(
+                select([func.count()]).select_from(table)).scalar()
+        assert count == len(df.index), '%s lost rows' % name
+        results.append((name, elapsed))
+    table.drop(engine)
+    return results
+
+
+def main(rows=200000):
+    engines = []
+    fd, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    engines.append(('sqlite', create_engine('sqlite:///' + path)))
+    if os.environ.get('BENCH_POSTGRES_URL'):
+        engines.append(('postgresql',
+                        create_engine(os.environ['BENCH_POSTGRES_URL'])))
+    try:
+        print('%-11s %-14s %-12s %9s %10s' % ('dialect', 'table', 'loader',
+                                             'wall (s)', 'rows/sec'))
+        for dialect, engine in engines:
+            for model, frame in ((ActivityData, activity_frame),
+                                 (WorkoutData, workout_frame)):
+                df = frame(rows)
+                for name, elapsed in run(engine, model, df):
+                    print('%-11s %-14s %-12s %9.2f %10.0f'
+                          % (dialect, model.__tablename__, name, elapsed,
+                             rows / elapsed))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
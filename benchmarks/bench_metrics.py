@@ -0,0 +1,170 @@
+'''
+Parity and latency of the metric engine against the original activity path
+(every row read into pandas, then activity_summary with its strftime
+buckets), for each of the engine's paths: the rollups table, GROUP BY in
+SQL, and the NumPy fallback.  Workouts had no working original path, so
+their paths are checked against each other and the activity/gadget
+breakdowns against the totals.
+
+usage: python -m benchmarks.bench_metrics [requests per case]
+'''
+
+import os
+import sys
+import tempfile
+from time import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import select
+
+from backend import create_app, db
+from backend.api import metrics
+from backend.api.metrics import ACTIVITY, WORKOUT
+from backend.loader import bulk_insert
+from backend.models import ActivityData, Rollup, WorkoutData
+from backend.rollups import update_rollups
+from benchmarks.bench_load import activity_frame, workout_frame
+
+YEARS = [1, 5, 10]
+CASES = [('date', 30), ('week_start', 12), ('month', 12), ('year', 5)]
+KINDS = ['move', 'exercise', 'stand']
+
+
+def activity_summary(df, recent, agg, kind):
+    '''
+    The activity graph pipeline before the metric engine, trimmed to the
+    columns a graph returns
+    '''
+    if agg == 'week_start':
+        df['week_start'] = (df['date'] - pd.to_timedelta
+                            (df['date'].dt.dayofweek, unit='d'))
+        df = df.groupby(['week_start'], as_index=False).sum()
+        df['date'] = df['week_start']
+    elif agg == 'month':
+        df['month'] = pd.to_datetime(df['date'].dt.strftime('%Y-%m') + '-01')
+        df = df.groupby(['month'], as_index=False).sum()
+        df['date'] = df['month']
+    elif agg == 'year':
+        df['year'] = pd.to_datetime(df['date'].dt.strftime('%Y') + '-01-01')
+        df = df.groupby(['year'], as_index=False).sum()
+        df['date'] = df['year']
+    return df[['date'] + ACTIVITY.metrics[kind].columns].tail(recent)
+
+
+def original_graph(user_id, recent, agg, kind):
+    s = select([ActivityData]).where(ActivityData.user_id==user_id)
+    df = pd.read_sql(s, con=db.engine, parse_dates=['date'])
+    return activity_summary(df, recent, agg, kind)
+
+
+def numpy_graph(source, user_id, recent, agg, kind, by=None):
+    '''
+    The engine's fallback for databases without a bucket expression
+    '''
+    return metrics.columnar_frame(source, user_id, agg,
+                                  source.metrics[kind].columns, recent,
+                                  by=[by] if by else [])
+
+
+def engine_graph(app, rollups):
+    def graph(source, user_id, recent, agg, kind, by=None):
+        app.config['GRAPH_ROLLUPS'] = rollups
+        return metrics.graph(source, user_id, recent, agg, kind, by=by)
+    return graph
+
+
+def timed(graph, args, repeat):
+    start = time()
+    for _ in range(repeat):
+        frame = graph(*args)
+    return (time() - start) / repeat * 1000, frame.reset_index(drop=True)
+
+
+def same(a, b):
+    pd.testing.assert_frame_equal(a, b, check_dtype=False)
+
+
+def workouts(days):
+    '''
+    Two workouts a day on different gadgets, with changing activities
+    '''
+    runs = workout_frame(days)
+    rides = workout_frame(days).assign(gadget='iPhone')
+    rides['activity'] = np.where(np.arange(days) % 3, 'Cycling', 'Walking')
+    rides['duration'] = rides['duration'] / 2
+    return pd.concat([runs, rides], ignore_index=True)
+
+
+def main(repeat=10):
+    repeat = int(repeat)
+    fd, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    try:
+        with app.app_context():
+            for model in (ActivityData, WorkoutData, Rollup):
+                model.__table__.create(db.engine)
+            for user_id, years in enumerate(YEARS, 1):
+                bulk_insert(ActivityData,
+                            activity_frame(years * 365).assign(user_id=user_id))
+                bulk_insert(WorkoutData,
+                            workouts(years * 365).assign(user_id=user_id))
+                update_rollups(user_id)
+            paths = [('rollups', engine_graph(app, True)),
+                     ('sql', engine_graph(app, False)),
+                     ('numpy', numpy_graph)]
+            print('activity, move graph (ms); every kind checked for parity')
+            print('%-6s %-11s %6s %9s %9s %9s %9s' % (
+                'years', 'agg', 'recent', 'original', *[name for name, _
+                                                         in paths]))
+            for user_id, years in enumerate(YEARS, 1):
+                for agg, recent in CASES:
+                    for kind in KINDS:
+                        expected = original_graph(user_id, recent, agg,
+                                                  kind).reset_index(drop=True)
+                        for _, graph in paths:
+                            same(graph(ACTIVITY, user_id, recent, agg, kind),
+                                 expected)
+                    times = [timed(original_graph,
+                                   (user_id, recent, agg, 'move'), repeat)[0]]
+                    times += [timed(graph, (ACTIVITY, user_id, recent, agg,
+                                            'move'), repeat)[0]
+                              for _, graph in paths]
+                    print('%-6d %-11s %6d %9.2f %9.2f %9.2f %9.2f' % (
+                        years, agg, recent, *times))
+
+            print('\nworkouts, 10 years, energy by activity/gadget (ms)')
+            print('%-11s %-9s %9s %9s' % ('agg', 'by', *[name for name, _
+                                                       in paths[1:]]))
+            user_id = len(YEARS)
+            for agg, recent in CASES:
+                for kind in WORKOUT.metrics:
+                    total = paths[0][1](WORKOUT, user_id, recent, agg, kind)
+                    for _, graph in paths[1:]:
+                        same(graph(WORKOUT, user_id, recent, agg, kind),
+                             total)
+                    column = WORKOUT.metrics[kind].actual
+                    for by in WORKOUT.groups:
+                        broken = paths[1][1](WORKOUT, user_id, recent, agg,
+                                             kind, by)
+                        same(broken, paths[2][1](WORKOUT, user_id, recent,
+                                                 agg, kind, by))
+                        summed = broken.groupby('date', as_index=False)[
+                            column].sum()
+                        same(summed, total)
+                for by in WORKOUT.groups:
+                    # rollups hold no breakdowns, those are read from SQL
+                    times = [timed(graph, (WORKOUT, user_id, recent, agg,
+                                           'move', by), repeat)[0]
+                             for _, graph in paths[1:]]
+                    print('%-11s %-9s %9.2f %9.2f' % (agg, by, *times))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,44 @@
+'''
+Scaling of extract_parallel over 1/2/4/8/16 worker processes.  The merged
+result of every run is checked against a single process extract().
+
+usage: python -m benchmarks.bench_parallel [export.xml size in MB] [backend]
+'''
+
+import os
+import sys
+import tempfile
+from time import time
+
+from backend.parsing import extract, extract_parallel
+from benchmarks.synthetic import records_for_size, write_export_xml
+
+WORKERS = [1, 2, 4, 8, 16]
+
+
+def main(size_mb=1024, backend='expat'):
+    fd, path = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+    try:
+        size = write_export_xml(
+            path, records_per_day=records_for_size(int(size_mb) << 20))
+        print('export.xml: %.1f MB, backend: %s, cpus: %d'
+              % (size / 2**20, backend, os.cpu_count()))
+        start = time()
+        expected = extract(path, backend=backend)
+        baseline = time() - start
+        print('%-8s %9s %8s' % ('workers', 'wall (s)', 'speedup'))
+        print('%-8s %9.2f %7.2fx' % ('extract', baseline, 1))
+        for workers in WORKERS:
+            start = time()
+            columns = extract_parallel(path, backend=backend, workers=workers)
+            elapsed = time() - start
+            assert columns == expected, \
+                '%d workers disagree with extract()' % workers
+            print('%-8d %9.2f %7.2fx' % (workers, elapsed, baseline / elapsed))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
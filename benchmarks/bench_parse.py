@@ -0,0 +1,100 @@
+'''
+Parse throughput of the table-driven extractor against the original
+per-attribute if/elif cascade (start + end events).  Reports elements/sec
+and MB/sec on a synthetic export.xml.
+
+usage: python -m benchmarks.bench_parse [export.xml size in MB]
+'''
+
+import os
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+from time import time
+
+from backend.parsing import TABLE_SPECS, extract
+from benchmarks.synthetic import records_for_size, write_export_xml
+
+
+def cascade(file):
+    '''
+    The original AppleParser.activity_summary loop, trimmed to ActivitySummary
+    and Workout with the same string comparisons per attribute
+    '''
+    columns = {spec.table: {column: [] for _, column in spec.columns}
+               for spec in TABLE_SPECS}
+    activity = columns['activity_data']
+    workout = columns['workout_data']
+    exercise = columns['exercise_time']
+    for event, elem in ET.iterparse(file, events=('start', 'end')):
+        if event == 'end':
+            if elem.tag == 'ActivitySummary':
+                for item in elem.items():
+                    if item[0] == 'dateComponents':
+                        activity['date'].append(item[1])
+                    elif item[0] == 'activeEnergyBurned':
+                        activity['energy_burned'].append(item[1])
+                    elif item[0] == 'activeEnergyBurnedGoal':
+                        activity['energy_burned_goal'].append(item[1])
+                    elif item[0] == 'activeEnergyBurnedUnit':
+                        activity['energy_burned_unit'].append(item[1])
+                    elif item[0] == 'appleExerciseTime':
+                        activity['exercise_time'].append(item[1])
+                    elif item[0] == 'appleExerciseTimeGoal':
+                        activity['exercise_time_goal'].append(item[1])
+                    elif item[0] == 'appleStandHours':
+                        activity['stand_hours'].append(item[1])
+                    elif item[0] == 'appleStandHoursGoal':
+                        activity['stand_hours_goal'].append(item[1])
+            if elem.tag == 'WorkoutEvent':
+                for item in elem.items():
+                    if item[0] == 'type':
+                        exercise['exercise_time_type'].append(item[1])
+                    elif item[0] == 'date':
+                        exercise['date'].append(item[1])
+                    elif item[0] == 'duration':
+                        exercise['exercise_time_duration'].append(item[1])
+                    elif item[0] == 'durationUnit':
+                        exercise['exercise_time_durationUnit'].append(item[1])
+            if elem.tag == 'Workout':
+                for item in elem.items():
+                    for attribute, column in TABLE_SPECS[2].columns:
+                        if item[0] == attribute:
+                            workout[column].append(item[1])
+            elem.clear()
+    return columns
+
+
+def count_elements(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return (data.count(b'<') - data.count(b'</') - data.count(b'<!')
+            - data.count(b'<?'))
+
+
+def main(size_mb=200):
+    fd, path = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+    try:
+        size = write_export_xml(path,
+                                records_per_day=records_for_size(size_mb << 20))
+        elements = count_elements(path)
+        print('export.xml: %.1f MB, %d elements' % (size / 2**20, elements))
+        results = {}
+        for name, func in [('cascade', cascade), ('extract', extract)]:
+            start = time()
+            results[name] = (func(path), time() - start)
+        assert results['cascade'][0] == results['extract'][0], \
+            'extractors disagree'
+        print('%-8s %9s %14s %8s' % ('engine', 'wall (s)', 'elements/sec',
+                                     'MB/sec'))
+        for name, (_, elapsed) in results.items():
+            print('%-8s %9.2f %14.0f %8.1f' % (name, elapsed,
+                                               elements / elapsed,
+                                               size / 2**20 / elapsed))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,81 @@
+'''
+Graph latency reading the rollups table against grouping raw rows in SQL,
+and the cost of maintaining the rollups at load time (full rebuild versus
+the incremental update after a one day upload).
+
+usage: python -m benchmarks.bench_rollups [requests per case]
+'''
+
+import os
+import sys
+import tempfile
+from time import time
+
+import pandas as pd
+
+from backend import create_app, db
+from backend.api.activity import activity_graph
+from backend.loader import bulk_insert
+from backend.models import ActivityData, Rollup, WorkoutData
+from backend.rollups import check_rollups, update_rollups
+from benchmarks.bench_load import activity_frame, workout_frame
+
+YEARS = [1, 10, 20]
+CASES = [('date', 30), ('week_start', 12), ('month', 12), ('year', 5)]
+
+
+def timed(app, rollups, user_id, agg, recent, repeat):
+    app.config['GRAPH_ROLLUPS'] = rollups
+    start = time()
+    for _ in range(repeat):
+        frame = activity_graph(user_id, recent, agg, 'move')
+    return (time() - start) / repeat * 1000, frame
+
+
+def main(repeat=20):
+    repeat = int(repeat)
+    fd, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    try:
+        with app.app_context():
+            for model in (ActivityData, WorkoutData, Rollup):
+                model.__table__.create(db.engine)
+            print('%-6s %12s %14s' % ('years', 'full (s)', 'one day (s)'))
+            for user_id, years in enumerate(YEARS, 1):
+                days = years * 365
+                bulk_insert(ActivityData,
+                            activity_frame(days).assign(user_id=user_id))
+                bulk_insert(WorkoutData,
+                            workout_frame(days).assign(user_id=user_id))
+                start = time()
+                update_rollups(user_id)
+                full = time() - start
+                last_day = activity_frame(days)['date'].iloc[-1]
+                start = time()
+                update_rollups(user_id, {'activity_data': last_day,
+                                         'workout_data': last_day})
+                print('%-6d %12.3f %14.3f' % (years, full, time() - start))
+            for user_id in range(1, len(YEARS) + 1):
+                assert not check_rollups(user_id), 'rollups drifted'
+            print()
+            print('%-6s %-11s %6s %10s %13s' % ('years', 'agg', 'recent',
+                                              'sql (ms)', 'rollups (ms)'))
+            for user_id, years in enumerate(YEARS, 1):
+                for agg, recent in CASES:
+                    live, expected = timed(app, False, user_id, agg, recent,
+                                           repeat)
+                    rolled, graph = timed(app, True, user_id, agg, recent,
+                                          repeat)
+                    pd.testing.assert_frame_equal(graph, expected)
+                    print('%-6d %-11s %6d %10.2f %13.2f' % (
+                        years, agg, recent, live, rolled))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
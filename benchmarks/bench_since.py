@@ -0,0 +1,60 @@
+'''
+Cost of re-uploading an unchanged export with and without the date
+high-water marks pushed into the XML scan.  Reports wall time and peak
+Python memory (tracemalloc) of extract() for a full scan and for a scan
+that only keeps the last day.
+
+usage: python -m benchmarks.bench_since [export.xml size in MB] [backend]
+'''
+
+import os
+import sys
+import tempfile
+import tracemalloc
+from datetime import date, timedelta
+from time import time
+
+from backend.parsing import extract
+from benchmarks.synthetic import records_for_size, write_export_xml
+
+DAYS = 730
+
+
+def measure(path, backend, since):
+    start = time()
+    extract(path, backend=backend, since=since)
+    elapsed = time() - start
+    # second pass for memory, tracemalloc slows parsing down
+    tracemalloc.start()
+    columns = extract(path, backend=backend, since=since)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows = sum(len(next(iter(table.values()))) for table in columns.values())
+    return elapsed, peak, rows
+
+
+def main(size_mb=200, backend='expat'):
+    fd, path = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+    start_day = date(2017, 1, 1)
+    try:
+        size = write_export_xml(
+            path, days=DAYS, start=start_day,
+            records_per_day=records_for_size(int(size_mb) << 20, DAYS))
+        last_day = (start_day + timedelta(days=DAYS - 1)).isoformat()
+        print('export.xml: %.1f MB, %d days, backend: %s'
+              % (size / 2**20, DAYS, backend))
+        print('%-10s %9s %10s %8s' % ('scan', 'wall (s)', 'peak (MB)', 'rows'))
+        for name, since in [('full', None),
+                            ('last day', {'activity_data': last_day,
+                                          'exercise_time': last_day,
+                                          'workout_data': last_day})]:
+            elapsed, peak, rows = measure(path, backend, since)
+            print('%-10s %9.2f %10.1f %8d' % (name, elapsed, peak / 2**20,
+                                              rows))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,93 @@
+'''
+Requests per second on a protected route with token auth against basic
+auth (with and without the verified-credential cache), counting the SQL
+statements each request runs.  tests/test_tokens.py checks renewal, expiry
+and key rotation.
+
+usage: python -m benchmarks.bench_tokens [users] [requests per user]
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+from time import time
+
+from sqlalchemy import event
+
+from backend import create_app, credential_cache, db
+from backend.api.authentication import auth
+from backend.models import User
+from benchmarks.bench_auth import basic, whoami
+
+
+class StatementCounter():
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self.counted)
+
+    def counted(self, *args):
+        self.count += 1
+
+
+def poll(client, credentials, repeat):
+    '''
+    Requests/sec over repeat rounds of one request per credential
+    '''
+    start = time()
+    for _ in range(repeat):
+        for email_or_token, password in credentials:
+            response = client.get('/bench/whoami',
+                                  headers=basic(email_or_token, password))
+            assert response.status_code == 200, response.status_code
+    return repeat * len(credentials) / (time() - start)
+
+
+def main(users=10, repeat=20):
+    users, repeat = int(users), int(repeat)
+    workdir = tempfile.mkdtemp()
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+        workdir, 'bench.sqlite')
+    app.add_url_rule('/bench/whoami', view_func=auth.login_required(whoami))
+    try:
+        with app.app_context():
+            User.__table__.create(db.engine)
+            for user_id in range(1, users + 1):
+                db.session.add(User(id=user_id,
+                                    email='%d@example.com' % user_id,
+                                    username='user%d' % user_id,
+                                    password='secret'))
+            db.session.commit()
+            client = app.test_client()
+            passwords = [('%d@example.com' % user_id, 'secret')
+                         for user_id in range(1, users + 1)]
+            tokens = []
+            for email, password in passwords:
+                response = client.post('/api/v1/tokens',
+                                       headers=basic(email, password))
+                tokens.append((response.get_json()['token'], ''))
+
+            statements = StatementCounter(db.engine)
+            print('%d users x %d requests' % (users, repeat))
+            print('%-14s %12s %14s' % ('auth', 'requests/s', 'SQL/request'))
+            for name, credentials, cached in (
+                    ('basic', passwords, False),
+                    ('basic cached', passwords, True),
+                    ('token', tokens, True)):
+                app.config['AUTH_CACHE'] = cached
+                credential_cache.init_app(app)
+                # warm-up, fills the credential cache
+                poll(client, credentials, 1)
+                statements.count = 0
+                rate = poll(client, credentials, repeat)
+                print('%-14s %12.1f %14.2f' % (
+                    name, rate, statements.count / repeat / users))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,98 @@
+'''
+Upload throughput of the single-shot multipart /auth/upload against the
+chunked /api/v1/uploads protocol, up to the queued job (no workers run, only
+the transfer is measured).  tests/test_uploads.py checks resuming, the
+append lease and the hash checks.
+
+usage: python -m benchmarks.bench_uploads [MB] [chunk MB] [repeats]
+'''
+
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+from time import time
+
+from backend import create_app, db, job_queue, upload_store
+from backend.models import User
+from benchmarks.bench_auth import basic
+
+
+def single_shot(client, data):
+    response = client.post('/auth/upload', data={
+        'email': '1@example.com',
+        'file': (io.BytesIO(data), 'export.zip')})
+    assert response.get_json()['status'] == 'Queued'
+
+
+def open_upload(client, headers, data):
+    response = client.post('/api/v1/uploads', headers=headers, json={
+        'size': len(data), 'filename': 'export.zip',
+        'sha256': hashlib.sha256(data).hexdigest()})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def put(client, headers, upload_id, data, offset, chunk):
+    return client.put('/api/v1/uploads/%s?offset=%d' % (upload_id, offset),
+                      headers=headers, data=data[offset:offset + chunk],
+                      content_type='application/octet-stream')
+
+
+def complete(client, headers, upload_id):
+    return client.post('/api/v1/uploads/%s/complete' % upload_id,
+                       headers=headers, json={})
+
+
+def chunked(client, headers, data, chunk):
+    upload_id = open_upload(client, headers, data)
+    offset = 0
+    while offset < len(data):
+        response = put(client, headers, upload_id, data, offset, chunk)
+        offset = response.get_json()['offset']
+    response = complete(client, headers, upload_id)
+    assert response.get_json()['status'] == 'Queued', response.get_json()
+
+
+def main(megabytes=64, chunk_megabytes=8, repeat=3):
+    size = int(megabytes) << 20
+    chunk = int(chunk_megabytes) << 20
+    repeat = int(repeat)
+    workdir = tempfile.mkdtemp()
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(
+        workdir, 'bench.sqlite'), UPLOAD_FOLDER=workdir, JOB_WORKERS=0,
+        UPLOAD_CHUNK_SIZE=chunk)
+    job_queue.init_app(app)
+    upload_store.init_app(app)
+    try:
+        with app.app_context():
+            User.__table__.create(db.engine)
+            db.session.add(User(id=1, email='1@example.com',
+                                username='user1', password='secret'))
+            db.session.commit()
+            client = app.test_client()
+            headers = basic('1@example.com', 'secret')
+            data = os.urandom(size)
+            print('%d MB upload, %d MB chunks' % (size >> 20, chunk >> 20))
+            print('%-12s %10s %10s' % ('protocol', 'seconds', 'MB/s'))
+            for name, upload in (
+                    ('single-shot', lambda: single_shot(client, data)),
+                    ('chunked', lambda: chunked(client, headers, data,
+                                                chunk))):
+                start = time()
+                for _ in range(repeat):
+                    upload()
+                elapsed = (time() - start) / repeat
+                print('%-12s %10.2f %10.1f' % (name, elapsed,
+                                               size / elapsed / (1 << 20)))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,143 @@
+'''
+Generates synthetic Apple Health exports for the benchmark scripts.  The
+layout mirrors a real export.xml: one element per line, top level elements
+indented by a single space, WorkoutEvents nested inside their Workout.
+'''
+
+import os
+import random
+import zipfile
+from datetime import date, timedelta
+
+
+HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE HealthData [
+<!ELEMENT HealthData (ExportDate,Me,(Record|Correlation|Workout|ActivitySummary)*)>
+<!ATTLIST HealthData locale CDATA #REQUIRED>
+]>
+<HealthData locale="en_US">
+ <ExportDate value="2019-04-21 14:11:11 -0700"/>
+ <Me HKCharacteristicTypeIdentifierDateOfBirth="1985-01-01"/>
+'''
+FOOTER = '</HealthData>\n'
+
+DEVICES = [
+    '&lt;&lt;HKDevice: 0x280e4c4b0&gt;, name:Apple Watch, manufacturer:Apple '
+    'Inc., model:Watch, hardware:Watch3,4, software:5.2&gt;',
+    '&lt;&lt;HKDevice: 0x280e4c4b1&gt;, name:iPhone, manufacturer:Apple Inc., '
+    'model:iPhone, hardware:iPhone10,6, software:12.2&gt;',
+]
+RECORD_TYPES = [
+    ('HKQuantityTypeIdentifierStepCount', 'count'),
+    ('HKQuantityTypeIdentifierDistanceWalkingRunning', 'mi'),
+    ('HKQuantityTypeIdentifierActiveEnergyBurned', 'Cal'),
+    ('HKQuantityTypeIdentifierBasalEnergyBurned', 'Cal'),
+]
+HEART_RATE = 'HKQuantityTypeIdentifierHeartRate'
+
+
+def record(day, i, rtype, unit, value, device):
+    stamp = '%s %02d:%02d:%02d -0700' % (day, (i // 3600) % 24,
+                                         (i // 60) % 60, i % 60)
+    return (' <Record type="%s" sourceName="Apple Watch" sourceVersion="5.2" '
+            'device="%s" unit="%s" creationDate="%s" startDate="%s" '
+            'endDate="%s" value="%s"/>\n'
+            % (rtype, device, unit, stamp, stamp, stamp, value))
+
+
+def workout(day, rng):
+    start = '%s 07:00:00 -0700' % day
+    end = '%s 07:45:00 -0700' % day
+    lines = [' <Workout workoutActivityType="HKWorkoutActivityTypeRunning" '
+             'duration="%.4f" durationUnit="min" totalDistance="%.4f" '
+             'totalDistanceUnit="mi" totalEnergyBurned="%.1f" '
+             'totalEnergyBurnedUnit="Cal" sourceName="Apple Watch" '
+             'sourceVersion="5.2" device="%s" creationDate="%s" '
+             'startDate="%s" endDate="%s">\n'
+             % (rng.uniform(20, 60), rng.uniform(1, 6), rng.uniform(150, 600),
+                DEVICES[0], end, start, end)]
+    for kind in ('HKWorkoutEventTypePause', 'HKWorkoutEventTypeResume'):
+        lines.append('  <WorkoutEvent type="%s" date="%s" duration="%.4f" '
+                     'durationUnit="min"/>\n'
+                     % (kind, start, rng.uniform(0, 5)))
+    lines.append('  <MetadataEntry key="HKIndoorWorkout" value="0"/>\n')
+    lines.append(' </Workout>\n')
+    return ''.join(lines)
+
+
+def activity_summary(day, rng):
+    return (' <ActivitySummary dateComponents="%s" activeEnergyBurned="%.3f" '
+            'activeEnergyBurnedGoal="450" activeEnergyBurnedUnit="Cal" '
+            'appleExerciseTime="%d" appleExerciseTimeGoal="30" '
+            'appleStandHours="%d" appleStandHoursGoal="12"/>\n'
+            % (day, rng.uniform(100, 900), rng.randint(0, 90),
+               rng.randint(0, 16)))
+
+
+def iter_export(days=365, records_per_day=200, heart_rate_share=0.5,
+                start=date(2017, 1, 1), seed=0):
+    '''
+    Yields export.xml text in line sized pieces
+
+    Parameters
+    ----------
+    days : int
+        Number of days of history to generate
+    records_per_day : int
+        Record elements per day - these dominate real exports
+    heart_rate_share : float
+        Fraction of the records that are heart rate samples
+    '''
+    rng = random.Random(seed)
+    yield HEADER
+    for n in range(days):
+        day = (start + timedelta(days=n)).isoformat()
+        for i in range(records_per_day):
+            device = DEVICES[i % 2]
+            if rng.random() < heart_rate_share:
+                yield record(day, i * 60, HEART_RATE, 'count/min',
+                             rng.randint(50, 170), device)
+            else:
+                rtype, unit = RECORD_TYPES[i % len(RECORD_TYPES)]
+                yield record(day, i * 60, rtype, unit,
+                             round(rng.uniform(0, 100), 3), device)
+        if n % 2 == 0:
+            yield workout(day, rng)
+        yield activity_summary(day, rng)
+    yield FOOTER
+
+
+def records_for_size(size, days=365):
+    '''
+    Rough records_per_day needed for an export.xml of `size` bytes
+    '''
+    return max(1, int(size / days / 330))
+
+
+def write_export_xml(path, **kwargs):
+    '''
+    Writes a synthetic export.xml to path and returns its size in bytes
+    '''
+    with open(path, 'w') as f:
+        for piece in iter_export(**kwargs):
+            f.write(piece)
+    return os.path.getsize(path)
+
+
+def write_export_zip(path, extra_files=20, extra_size=1 << 20, **kwargs):
+    '''
+    Writes a synthetic export.zip to path, including route/ECG style side files
+    that the parser never reads.  Returns the uncompressed size of export.xml.
+    '''
+    size = 0
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        with zip_ref.open('apple_health_export/export.xml', 'w',
+                          force_zip64=True) as f:
+            for piece in iter_export(**kwargs):
+                data = piece.encode('utf-8')
+                size += len(data)
+                f.write(data)
+        for i in range(extra_files):
+            zip_ref.writestr('apple_health_export/workout-routes/route_%d.gpx'
+                             % i, os.urandom(extra_size))
+    return size
@@ -1,4 +1,5 @@
 import os
+import click
 from backend import create_app, db
 from backend.models import User, ActivityData
 from flask_migrate import Migrate
@@ -15,4 +16,18 @@ def test():
     '''Run the unit tests'''
     import unittest
     tests = unittest.TestLoader().discover('tests')
-    unittest.TextTestRunner(verbosity=2).run(tests)
\ No newline at end of file
+    unittest.TextTestRunner(verbosity=2).run(tests)
+
+@app.cli.command()
+@click.option('--user', 'user_id', type=int, help='Only check this user id')
+@click.option('--fix', is_flag=True, help='Rebuild rollups that drifted')
+def check_rollups(user_id, fix):
+    '''Recompute graph rollups from raw rows and report drift'''
+    from backend.rollups import check_rollups
+    drifted = check_rollups(user_id, fix)
+    for uid, source, drift in drifted:
+        print('user %d %s: %d missing, %d extra, %d changed%s' % (
+            uid, source, drift['missing'], drift['extra'], drift['changed'],
+            ' (rebuilt)' if fix else ''))
+    if not drifted:
+        print('Rollups match the raw data')
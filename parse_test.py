@@ -7,152 +7,33 @@ Created on Sun Apr 21 14:11:11 2019
 """
 
 import os
-import xml.etree.ElementTree as ET
 import numpy as np
 import pandas as pd
+from backend.parsing import TABLE_SPECS, TableSpec, extract
 
+# etree, expat or lxml - see backend.parsing.BACKENDS
+BACKEND = 'expat'
 
-def activity_summary(file_path):
-
-    # activity data
-    date = []
-    energy_burned = []
-    energy_burned_goal = []
-    energy_burned_unit = []
-    exercise_time = []
-    exercise_time_goal = []
-    stand_hours = []
-    stand_hours_goal = []
-    file = file_path + '/apple_health_export/export.xml'
-
-    # exercise time
-    exercise_time_type = []
-    exercise_time_date = []
-    exercise_time_duration = []
-    exercise_time_durationUnit = []
+RECORD_SPEC = TableSpec('record', 'Record', [
+    ('type', 'type'),
+    ('unit', 'unit'),
+    ('value', 'value'),
+    ('sourceName', 'source_name'),
+    ('sourceVersion', 'source_version'),
+    ('device', 'device'),
+    ('creationDate', 'creation_date'),
+    ('startDate', 'start_date'),
+    ('endDate', 'end_date'),
+])
 
-    # workout data
-    workoutActivityType = []
-    duration = []
-    durationUnit = []
-    totalDistance = []
-    totalDistanceUnit = []
-    totalEnergyBurned = []
-    totalEnergyBurnedUnit = []
-    sourceName = []
-    sourceVersion = []
-    device = []
-    creationDate = []
-    startDate = []
-    endDate = []
 
-    # heartrate data
-    record_type = []
-    record_unit = []
-    record_value = []
-    record_sourceName = []
-    record_sourceVersion = []
-    record_device = []
-    record_creationDate = []
-    record_startDate = []
-    record_endDate = []
-
-    for event, elem in ET.iterparse(file, events=("start", "end")):
-        if event == 'end':
-            # process the tag
-            if elem.tag == 'ActivitySummary':
-                # import pdb;pdb.set_trace()
-                for item in elem.items():
-                    if item[0] == 'dateComponents':
-                        date.append(item[1])
-                    elif item[0] == 'activeEnergyBurned':
-                        energy_burned.append(item[1])
-                    elif item[0] == 'activeEnergyBurnedGoal':
-                        energy_burned_goal.append(item[1])
-                    elif item[0] == 'activeEnergyBurnedUnit':
-                        energy_burned_unit.append(item[1])
-                    elif item[0] == 'appleExerciseTime':
-                        exercise_time.append(item[1])
-                    elif item[0] == 'appleExerciseTimeGoal':
-                        exercise_time_goal.append(item[1])
-                    elif item[0] == 'appleStandHours':
-                        stand_hours.append(item[1])
-                    elif item[0] == 'appleStandHoursGoal':
-                        stand_hours_goal.append(item[1])
-            if elem.tag == 'WorkoutEvent':
-                for item in elem.items():
-                    if item[0] == 'type':
-                        exercise_time_type.append(item[1])
-                    elif item[0] == 'date':
-                        exercise_time_date.append(item[1])
-                    elif item[0] == 'duration':
-                        exercise_time_duration.append(item[1])
-                    elif item[0] == 'durationUnit':
-                        exercise_time_durationUnit.append(item[1])
-            if elem.tag == 'Workout':
-                for item in elem.items():
-                    if item[0] == 'workoutActivityType':
-                        workoutActivityType.append(item[1])
-                    if item[0] == 'duration':
-                        duration.append(item[1])
-                    if item[0] == 'durationUnit':
-                        durationUnit.append(item[1])
-                    if item[0] == 'totalDistance':
-                        totalDistance.append(item[1])
-                    if item[0] == 'totalDistanceUnit':
-                        totalDistanceUnit.append(item[1])
-                    if item[0] == 'totalEnergyBurned':
-                        totalEnergyBurned.append(item[1])
-                    if item[0] == 'totalEnergyBurnedUnit':
-                        totalEnergyBurnedUnit.append(item[1])
-                    if item[0] == 'sourceName':
-                        sourceName.append(item[1])
-                    if item[0] == 'sourceVersion':
-                        sourceVersion.append(item[1])
-                    if item[0] == 'device':
-                        device.append(item[1])
-                    if item[0] == 'creationDate':
-                        creationDate.append(item[1])
-                    if item[0] == 'startDate':
-                        startDate.append(item[1])
-                    if item[0] == 'endDate':
-                        endDate.append(item[1])
-            if elem.tag == 'Record':
-                for item in elem.items():
-                    if item[0] == 'type':
-                        record_type.append(item[1])
-                    if item[0] == 'unit':
-                        record_unit.append(item[1])
-                    if item[0] == 'value':
-                        record_value.append(item[1])
-                    if item[0] == 'sourceName':
-                        record_sourceName.append(item[1])
-                    if item[0] == 'sourceVersion':
-                        record_sourceVersion.append(item[1])
-                    if item[0] == 'device':
-                        record_device.append(item[1])
-                    if item[0] == 'creationDate':
-                        record_creationDate.append(item[1])
-                    if item[0] == 'startDate':
-                        record_startDate.append(item[1])
-                    if item[0] == 'endDate':
-                        record_endDate.append(item[1])
+def activity_summary(file_path):
 
-            # this is the key to memory management
-            elem.clear()
+    file = file_path + '/apple_health_export/export.xml'
+    data = extract(file, TABLE_SPECS + [RECORD_SPEC], backend=BACKEND)
 
     # create activity data data frame
-    li = list(zip(date, energy_burned, energy_burned_goal,
-                  energy_burned_unit, exercise_time,
-                  exercise_time_goal, stand_hours, stand_hours_goal))
-    df = pd.DataFrame(li, columns=['date',
-                                   'energy_burned',
-                                   'energy_burned_goal',
-                                   'energy_burned_unit',
-                                   'exercise_time',
-                                   'exercise_time_goal',
-                                   'stand_hours',
-                                   'stand_hours_goal'])
+    df = pd.DataFrame(data['activity_data'])
     # remove dates before 2000-01-01
     df['datetime'] = pd.to_datetime(df['date'])
     df = df[df['datetime'] > '2000-01-01']
@@ -164,13 +45,7 @@ def activity_summary(file_path):
     df.fillna(0, inplace=True)
 
     # create exercise time data frame
-    li = list(zip(exercise_time_date, exercise_time_type,
-                  exercise_time_duration, exercise_time_durationUnit))
-    exercise_time = pd.DataFrame(li,
-                                 columns=['date',
-                                          'exercise_time_type',
-                                          'exercise_time_duration',
-                                          'exercise_time_durationUnit'])
+    exercise_time = pd.DataFrame(data['exercise_time'])
     # remove dates before 2000-01-01
     exercise_time['datetime'] = pd.to_datetime(exercise_time['date'])
     exercise_time = exercise_time[exercise_time['datetime'] > '2000-01-01']
@@ -182,19 +57,7 @@ def activity_summary(file_path):
     exercise_time.fillna(0, inplace=True)
 
     # create workout data frame
-    li = list(zip(workoutActivityType, duration, durationUnit, totalDistance,
-                  totalDistanceUnit, totalEnergyBurned, totalEnergyBurnedUnit,
-                  sourceName, sourceVersion, device, creationDate, startDate,
-                  endDate))
-    workout = pd.DataFrame(li,
-                           columns=['activity_type', 'duration',
-                                    'duration_unit', 'total_distance',
-                                    'total_distance_unit',
-                                    'total_energy_burned',
-                                    'total_energy_burned_unit',
-                                    'source_name', 'source_version',
-                                    'device', 'creation_date',
-                                    'start_date', 'end_date'])
+    workout = pd.DataFrame(data['workout_data'])
     # remove dates before 2000-01-01
     workout['creation_datetime'] = pd.to_datetime(workout['creation_date'])
     workout = workout[workout['creation_datetime'] > '2000-01-01']
@@ -228,15 +91,7 @@ def activity_summary(file_path):
     # workout = workout.drop(['device', 'activity_type'], axis=1)
 
     # create record data frame
-    li = list(zip(record_type, record_unit, record_value, record_sourceName,
-                  record_sourceVersion, record_device, record_creationDate,
-                  record_startDate, record_endDate))
-    record = pd.DataFrame(li,
-                          columns=['type', 'unit',
-                                   'value', 'source_name',
-                                   'source_version', 'device',
-                                   'creation_date', 'start_date',
-                                   'end_date'])
+    record = pd.DataFrame(data['record'])
     # remove dates before 2000-01-01
     record['creation_datetime'] = pd.to_datetime(record['creation_date'])
     record = record[record['creation_datetime'] > '2000-01-01']
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import unittest
+from base64 import b64encode
+
+from backend import create_app, credential_cache, db, graph_cache, \
+    identity_cache, job_queue, upload_store
+from backend.models import User
+
+
+def basic(email, password):
+    token = b64encode(('%s:%s' % (email, password)).encode('utf-8'))
+    return {'Authorization': 'Basic ' + token.decode('ascii')}
+
+
+class AppTestCase(unittest.TestCase):
+    '''
+    App on a fresh SQLite database and upload folder for every test, with
+    users 1 and 2 (password secret) and no job workers
+    '''
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.app = create_app('testing')
+        self.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(
+                self.workdir, 'test.sqlite'),
+            UPLOAD_FOLDER=self.workdir, JOB_WORKERS=0)
+        for extension in (job_queue, upload_store, graph_cache,
+                          credential_cache, identity_cache):
+            extension.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        for user_id in (1, 2):
+            db.session.add(User(id=user_id, email='%d@example.com' % user_id,
+                                username='user%d' % user_id,
+                                password='secret'))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+        shutil.rmtree(self.workdir)
+
+    def headers(self, user_id):
+        return basic('%d@example.com' % user_id, 'secret')
@@ -0,0 +1,40 @@
+from tests.base import AppTestCase
+
+
+class GraphRequestTestCase(AppTestCase):
+    def get(self, url):
+        return self.client.get(url, headers=self.headers(1))
+
+    def post(self, url, data):
+        return self.client.post(url, headers=self.headers(1), json=data)
+
+    def test_recent_must_be_positive(self):
+        for recent in (0, -1, 'x', None, 10 ** 6):
+            response = self.post('/api/v1/activity_trend', {
+                'agg': 'month', 'kind': 'move', 'recent': recent})
+            self.assertEqual(response.status_code, 400, recent)
+            response = self.get('/api/v1/workout_trend?agg=month&kind='
+                                'distance&recent=%s' % recent)
+            self.assertEqual(response.status_code, 400, recent)
+
+    def test_batch_recent_must_be_positive(self):
+        for recent in (0, -3, 10 ** 6):
+            response = self.post('/api/v1/activity_batch', {
+                'graphs': [['month', 'move', 12], ['week', 'move', recent]]})
+            self.assertEqual(response.status_code, 400, recent)
+            response = self.get('/api/v1/workout_batch?graph=month,'
+                                'distance,%s' % recent)
+            self.assertEqual(response.status_code, 400, recent)
+
+    def test_batch_size_is_capped(self):
+        response = self.post('/api/v1/activity_batch', {
+            'graphs': [['month', 'move', 12]] * 65})
+        self.assertEqual(response.status_code, 400)
+
+    def test_valid_request(self):
+        response = self.post('/api/v1/activity_trend', {
+            'agg': 'month', 'kind': 'move', 'recent': 12})
+        self.assertEqual(response.status_code, 200)
+        response = self.post('/api/v1/activity_batch', {
+            'graphs': [['month', 'move', 12], ['day', 'move', 1]]})
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,59 @@
+import os
+
+from sqlalchemy import func
+
+from backend import db
+from backend.models import LOADED_MODELS, AppleParser
+from benchmarks.synthetic import write_export_zip
+from tests.base import AppTestCase
+
+RECORDS_PER_DAY = 20
+
+
+class IncrementalImportTestCase(AppTestCase):
+    '''
+    A second export overlapping the first, as the phone exports the full
+    history every time
+    '''
+    def export(self, days):
+        path = os.path.join(self.workdir, 'export%d.zip' % days)
+        write_export_zip(path, extra_files=0, days=days,
+                         records_per_day=RECORDS_PER_DAY)
+        return path
+
+    def load(self, days, user_id=1):
+        parser = AppleParser(self.export(days), user_id)
+        parser.parse_activity()
+        return parser
+
+    def rows(self, model, user_id=1):
+        return dict(db.session.query(model.date, func.count()).
+                    filter(model.user_id == user_id).group_by(model.date))
+
+    def ids(self, model, before, user_id=1):
+        return {row.id for row in model.query.filter(
+            model.user_id == user_id, model.date < before)}
+
+    def test_overlapping_export(self):
+        self.load(10)
+        marks = AppleParser(None, 1).high_water_marks(1)
+        self.assertEqual(set(marks), {model.__tablename__
+                                      for model in LOADED_MODELS})
+        kept = {model: self.ids(model, marks[model.__tablename__])
+                for model in LOADED_MODELS}
+        parser = self.load(15)
+        self.assertEqual(parser.since, marks)
+        # the same export loaded in one go by another user
+        self.load(15, user_id=2)
+        for model in LOADED_MODELS:
+            mark = marks[model.__tablename__]
+            rows = self.rows(model)
+            self.assertEqual(rows, self.rows(model, user_id=2),
+                             model.__tablename__)
+            self.assertGreater(max(rows), mark)
+            # rows before the mark were not deleted and loaded again, the
+            # mark's own day was replaced rather than duplicated
+            self.assertTrue(kept[model])
+            self.assertEqual(self.ids(model, mark), kept[model])
+            self.assertLess(parser.rows_loaded[model.__tablename__],
+                            sum(rows.values()))
@@ -0,0 +1,29 @@
+import unittest
+from datetime import date
+
+from sqlalchemy import create_engine
+
+from backend.models import LOADED_MODELS
+from benchmarks.bench_indexes import query_plan, query_shapes
+
+
+class IndexesTestCase(unittest.TestCase):
+    '''
+    The per user queries of the API and the upload path have to use the
+    (user_id, date) indexes instead of scanning the tables
+    '''
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        for model in LOADED_MODELS:
+            model.__table__.create(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_query_plans(self):
+        with self.engine.connect() as conn:
+            for name, statement, index in query_shapes(1, date(2019, 1, 1)):
+                with self.subTest(name):
+                    plan = query_plan(conn, statement)
+                    self.assertIn('USING', plan)
+                    self.assertIn(index, plan)
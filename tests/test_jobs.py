@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+
+from backend import job_queue
+from backend import jobs
+from tests.base import AppTestCase
+
+
+class JobQueueTestCase(AppTestCase):
+    def enqueue(self, user_id=1):
+        path = os.path.join(self.workdir, 'export%d.zip' % time.time_ns())
+        with open(path, 'wb') as f:
+            f.write(b'not a zip')
+        return job_queue.enqueue(user_id, path)
+
+    def age(self, job_id, seconds):
+        '''
+        Moves the job's last heartbeat seconds into the past
+        '''
+        with job_queue.connect() as conn:
+            conn.execute('UPDATE jobs SET updated_at = updated_at - ? '
+                         'WHERE id = ?', (seconds, job_id))
+
+    def test_claim_order(self):
+        first = self.enqueue(1)
+        second = self.enqueue(1)
+        other = self.enqueue(2)
+        self.assertEqual(job_queue.claim()['id'], first)
+        # the user's next job waits for the running one
+        self.assertEqual(job_queue.claim()['id'], other)
+        self.assertIsNone(job_queue.claim())
+        job_queue.update(first, status='done')
+        self.assertEqual(job_queue.claim()['id'], second)
+
+    def test_lost_job_is_failed(self):
+        lost = self.enqueue(1)
+        later = self.enqueue(1)
+        path = job_queue.claim()['path']
+        self.assertIsNone(job_queue.claim())
+        # the worker died, no heartbeat for longer than the lease
+        self.age(lost, job_queue.lease + 1)
+        self.assertEqual(job_queue.claim()['id'], later)
+        job = job_queue.get(lost)
+        self.assertEqual((job['status'], job['error']),
+                         ('failed', 'worker lost'))
+        self.assertFalse(os.path.exists(path))
+
+    def test_running_job_within_its_lease(self):
+        running = self.enqueue(1)
+        self.enqueue(1)
+        self.assertEqual(job_queue.claim()['id'], running)
+        self.age(running, job_queue.lease - 10)
+        self.assertIsNone(job_queue.claim())
+        self.assertEqual(job_queue.get(running)['status'], 'running')
+
+    def test_heartbeat(self):
+        job_id = self.enqueue(1)
+        job_queue.claim()
+        self.age(job_id, job_queue.lease + 1)
+        interval = jobs.HEARTBEAT_INTERVAL
+        jobs.HEARTBEAT_INTERVAL = 0.01
+        stop = threading.Event()
+        try:
+            beat = threading.Thread(target=job_queue.heartbeat,
+                                    args=(job_id, stop))
+            beat.start()
+            time.sleep(0.1)
+        finally:
+            stop.set()
+            beat.join()
+            jobs.HEARTBEAT_INTERVAL = interval
+        self.assertGreater(job_queue.get(job_id)['updated_at'],
+                           time.time() - job_queue.lease)
+        self.assertIsNone(job_queue.claim())
+        self.assertEqual(job_queue.get(job_id)['status'], 'running')
+
+    def test_failed_parse(self):
+        job_id = self.enqueue(1)
+        claimed = job_queue.claim()
+        job_queue.run(claimed)
+        job = job_queue.get(job_id)
+        self.assertEqual(job['status'], 'failed')
+        self.assertTrue(job['error'])
+        self.assertFalse(os.path.exists(claimed['path']))
+
+    def test_status_only_for_the_owner(self):
+        job_id = self.enqueue(1)
+        url = '/api/v1/jobs/' + job_id
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.assertEqual(self.client.get(url, headers=self.headers(2)).
+                         status_code, 404)
+        response = self.client.get(url, headers=self.headers(1))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['status'], 'queued')
+        response = self.client.get('/api/v1/jobs/unknown',
+                                   headers=self.headers(1))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,46 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from backend.parsing import EXPORT_SPECS, extract, lxml_etree
+from benchmarks.synthetic import write_export_xml
+
+
+class ParsingBackendsTestCase(unittest.TestCase):
+    '''
+    Every backend has to return exactly the rows etree does
+    '''
+    @classmethod
+    def setUpClass(cls):
+        cls.workdir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.workdir, 'export.xml')
+        write_export_xml(cls.path, days=90, records_per_day=40)
+        cls.expected = extract(cls.path, EXPORT_SPECS, backend='etree')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.workdir)
+
+    def check_backend(self, name):
+        self.assertEqual(extract(self.path, EXPORT_SPECS, backend=name),
+                         self.expected)
+        with open(self.path, 'rb') as f:
+            stream = io.BufferedReader(f)
+            self.assertEqual(extract(stream, EXPORT_SPECS, backend=name),
+                             self.expected)
+
+    def test_export_has_every_table(self):
+        for table, columns in self.expected.items():
+            self.assertTrue(any(columns.values()), table)
+
+    def test_etree_stream(self):
+        self.check_backend('etree')
+
+    def test_expat(self):
+        self.check_backend('expat')
+
+    @unittest.skipUnless(lxml_etree, 'lxml is not installed')
+    def test_lxml(self):
+        self.check_backend('lxml')
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from backend.api.activity import activity_graph
+from backend.loader import bulk_insert
+from backend.models import ActivityData, Rollup, WorkoutData
+from backend.rollups import check_rollups, update_rollups
+from benchmarks.bench_load import activity_frame, workout_frame
+from tests.base import AppTestCase
+
+DAYS = 400
+CASES = [('date', 30), ('week_start', 12), ('month', 12), ('year', 2)]
+
+
+class RollupsTestCase(AppTestCase):
+    '''
+    Users whose data was loaded before the rollups table existed
+    '''
+    def setUp(self):
+        super().setUp()
+        bulk_insert(ActivityData, activity_frame(DAYS))
+        bulk_insert(WorkoutData, workout_frame(DAYS))
+
+    def graphs(self, rollups):
+        self.app.config['GRAPH_ROLLUPS'] = rollups
+        return [activity_graph(1, recent, agg, 'move')
+                for agg, recent in CASES]
+
+    def test_graphs_without_rollups(self):
+        self.assertEqual(Rollup.query.count(), 0)
+        for graph, expected in zip(self.graphs(True), self.graphs(False)):
+            self.assertFalse(graph.empty)
+            pd.testing.assert_frame_equal(graph, expected)
+
+    def test_incremental_load_builds_all_rollups(self):
+        last_day = activity_frame(DAYS)['date'].iloc[-1]
+        update_rollups(1, {'activity_data': last_day,
+                           'workout_data': last_day})
+        self.assertEqual(check_rollups(1), [])
+        for graph, expected in zip(self.graphs(True), self.graphs(False)):
+            pd.testing.assert_frame_equal(graph, expected)
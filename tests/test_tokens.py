@@ -0,0 +1,74 @@
+from flask import g, jsonify
+from sqlalchemy import event
+
+from backend import db
+from backend.api.authentication import auth
+from backend.models import User
+from tests.base import AppTestCase, basic
+
+
+def whoami():
+    return jsonify(id=g.current_user.id, username=g.current_user.username)
+
+
+class TokenTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.add_url_rule('/test/whoami',
+                              view_func=auth.login_required(whoami))
+
+    def token(self, user_id=1):
+        response = self.client.post('/api/v1/tokens',
+                                    headers=self.headers(user_id))
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()['token']
+
+    def status(self, token):
+        return self.client.get('/test/whoami',
+                               headers=basic(token, '')).status_code
+
+    def test_token_auth(self):
+        response = self.client.get('/test/whoami',
+                                   headers=basic(self.token(2), ''))
+        self.assertEqual(response.get_json(), {'id': 2, 'username': 'user2'})
+
+    def test_token_auth_runs_no_sql(self):
+        token = self.token()
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *args: statements.append(args[2]))
+        self.assertEqual(self.status(token), 200)
+        self.assertEqual(statements, [])
+
+    def test_no_renewal_with_a_token(self):
+        response = self.client.post('/api/v1/tokens',
+                                    headers=basic(self.token(), ''))
+        self.assertEqual(response.status_code, 401)
+
+    def test_expired_token(self):
+        expired = db.session.get(User, 1).generate_auth_token(-1)
+        self.assertEqual(self.status(expired), 401)
+        response = self.client.post('/api/v1/tokens',
+                                    headers=basic(expired, ''))
+        self.assertEqual(response.status_code, 401)
+
+    def test_bad_token(self):
+        self.assertEqual(self.status(self.token() + 'x'), 401)
+
+    def test_key_rotation(self):
+        old = self.token()
+        self.app.config['AUTH_TOKEN_KEYS'] = [self.app.config['SECRET_KEY'],
+                                              'new']
+        new = self.token()
+        # tokens of every listed key are accepted
+        self.assertEqual(self.status(old), 200)
+        self.assertEqual(self.status(new), 200)
+        # retiring a key revokes its tokens
+        self.app.config['AUTH_TOKEN_KEYS'] = ['new']
+        self.assertEqual(self.status(old), 401)
+        self.assertEqual(self.status(new), 200)
+
+    def test_login_hands_out_a_token(self):
+        response = self.client.post('/auth/login', json={
+            'email': '1@example.com', 'password': 'secret'})
+        self.assertEqual(self.status(response.get_json()['token']), 200)
@@ -0,0 +1,180 @@
+import hashlib
+import io
+import os
+
+from werkzeug.exceptions import ClientDisconnected
+
+from backend import job_queue, upload_store
+from backend import uploads
+from backend.exceptions import ValidationError
+from backend.uploads import UploadConflict
+from tests.base import AppTestCase
+
+CHUNK = 2 << 20
+
+
+class DroppedStream():
+    '''
+    Request body whose connection drops after limit bytes
+    '''
+    def __init__(self, data, limit):
+        self.stream = io.BytesIO(data[:limit])
+
+    def read(self, size=-1):
+        block = self.stream.read(size)
+        if not block:
+            raise ClientDisconnected()
+        return block
+
+
+class StalledStream():
+    '''
+    Request body that stalls after its first block, long enough for
+    another request to take the upload over
+    '''
+    def __init__(self, data, upload_id, offset):
+        self.stream = io.BytesIO(data)
+        self.upload_id = upload_id
+        self.offset = offset
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        if self.reads == 2:
+            upload_store.acquire(upload_store.row(self.upload_id),
+                                 self.offset)
+        return self.stream.read(size)
+
+
+class UploadTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = os.urandom(2 * CHUNK + CHUNK // 2)
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+
+    def open_upload(self, sha256=True, user_id=1):
+        response = self.client.post('/api/v1/uploads',
+                                    headers=self.headers(user_id), json={
+            'size': len(self.data), 'filename': 'export.zip',
+            'sha256': self.sha256 if sha256 else None})
+        self.assertEqual(response.status_code, 201)
+        return response.get_json()['id']
+
+    def put(self, upload_id, offset, data=None, user_id=1):
+        data = self.data if data is None else data
+        return self.client.put(
+            '/api/v1/uploads/%s?offset=%d' % (upload_id, offset),
+            headers=self.headers(user_id), data=data[offset:offset + CHUNK],
+            content_type='application/octet-stream')
+
+    def put_all(self, upload_id, offset=0, data=None):
+        while offset < len(self.data):
+            response = self.put(upload_id, offset, data)
+            self.assertEqual(response.status_code, 200)
+            offset = response.get_json()['offset']
+        return offset
+
+    def complete(self, upload_id, sha256=None):
+        return self.client.post('/api/v1/uploads/%s/complete' % upload_id,
+                                headers=self.headers(1),
+                                json={'sha256': sha256})
+
+    def offset(self, upload_id):
+        return self.client.get('/api/v1/uploads/' + upload_id,
+                               headers=self.headers(1)).get_json()['offset']
+
+    def test_upload_is_queued(self):
+        upload_id = self.open_upload()
+        self.put_all(upload_id)
+        response = self.complete(upload_id)
+        self.assertEqual(response.get_json()['status'], 'Queued')
+        job = job_queue.get(response.get_json()['job_id'])
+        self.assertEqual((job['status'], job['user_id']), ('queued', 1))
+        with open(upload_store.row(upload_id)['path'], 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_resent_chunk_gets_the_offset(self):
+        upload_id = self.open_upload()
+        self.assertEqual(self.put(upload_id, 0).status_code, 200)
+        response = self.put(upload_id, 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['offset'], CHUNK)
+
+    def test_resume_after_disconnect(self):
+        upload_id = self.open_upload()
+        offset = upload_store.append(upload_id, 0, DroppedStream(
+            self.data, CHUNK // 2), CHUNK)
+        self.assertEqual(offset, CHUNK // 2)
+        self.assertEqual(self.offset(upload_id), CHUNK // 2)
+        # completing too early is refused
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['offset'], CHUNK // 2)
+        self.put_all(upload_id, CHUNK // 2)
+        self.assertEqual(self.complete(upload_id).status_code, 200)
+
+    def test_stalled_writer_loses_its_lease(self):
+        upload_id = self.open_upload()
+        lease = uploads.LEASE
+        uploads.LEASE = 0
+        try:
+            with self.assertRaises(UploadConflict) as context:
+                upload_store.append(upload_id, 0, StalledStream(
+                    b'x' * CHUNK, upload_id, 0), CHUNK)
+        finally:
+            uploads.LEASE = lease
+        # the offset is left to the new holder, which truncates the file
+        self.assertEqual(context.exception.offset, 0)
+        self.assertEqual(self.offset(upload_id), 0)
+        self.put_all(upload_id)
+        self.assertEqual(self.complete(upload_id).status_code, 200)
+        with open(upload_store.row(upload_id)['path'], 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_rehash_without_the_running_hash(self):
+        upload_id = self.open_upload(sha256=False)
+        self.put_all(upload_id)
+        # as if another process took the last chunks
+        upload_store.hashes.clear()
+        self.assertEqual(self.complete(upload_id).status_code, 400)
+        response = self.complete(upload_id, self.sha256)
+        self.assertEqual(response.get_json()['status'], 'Queued')
+
+    def test_sha256_mismatch_discards_the_upload(self):
+        upload_id = self.open_upload()
+        self.put_all(upload_id, data=b'x' + self.data[1:])
+        self.assertEqual(self.complete(upload_id).status_code, 400)
+        response = self.client.get('/api/v1/uploads/' + upload_id,
+                                   headers=self.headers(1))
+        self.assertEqual(response.status_code, 404)
+
+    def test_completed_once(self):
+        upload_id = self.open_upload()
+        self.put_all(upload_id)
+        self.assertEqual(self.complete(upload_id).status_code, 200)
+        self.assertEqual(self.complete(upload_id).status_code, 400)
+
+    def test_invalid_sha256(self):
+        for sha256 in (5, 'abc', ['x'], 'g' * 64):
+            response = self.client.post('/api/v1/uploads',
+                                        headers=self.headers(1), json={
+                'size': 10, 'sha256': sha256})
+            self.assertEqual(response.status_code, 400, sha256)
+        upload_id = self.open_upload(sha256=False)
+        self.put_all(upload_id)
+        self.assertEqual(self.complete(upload_id, 5).status_code, 400)
+
+    def test_removed_upload(self):
+        upload_id = self.open_upload()
+        upload_store.delete(upload_id)
+        with self.assertRaises(ValidationError):
+            upload_store.append(upload_id, 0, io.BytesIO(self.data), CHUNK)
+        with self.assertRaises(ValidationError):
+            upload_store.complete(upload_id)
+
+    def test_other_users_upload(self):
+        upload_id = self.open_upload()
+        self.assertEqual(self.put(upload_id, 0, user_id=2).status_code, 404)
+        response = self.client.get('/api/v1/uploads/' + upload_id,
+                                   headers=self.headers(2))
+        self.assertEqual(response.status_code, 404)